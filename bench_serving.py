@@ -0,0 +1,268 @@
+""" Measures how rfeed feeds behave when they are served over HTTP and polled concurrently.
+
+The harness starts a local WSGI server with a few representative feeds (a large archive, a podcast and many small
+category feeds) and drives it with a built-in load generator. For every serving mode it reports the throughput, the
+p50/p95/p99 latencies and the memory allocated by a single request:
+
+	plain -- The feed is rendered with Feed.rss() and sent as a whole.
+	streaming -- The feed is rendered with Feed.write() straight into the response, in chunks.
+	cached -- The feed is rendered once and served from a FeedCache afterwards.
+
+The feeds served here share their items (category feeds are subfeeds of the archive), and they are rendered by as many
+threads as there are concurrent requests.
+
+Everything runs on localhost:
+
+	% python bench_serving.py --concurrency 16 --duration 10
+"""
+
+import argparse
+import datetime
+import gc
+import http.client
+import math
+import sys
+import threading
+import time
+import tracemalloc
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from rfeed import *
+
+_modes = ["plain", "streaming", "cached"]
+
+def build_feeds(archive_items = 5000, podcast_items = 300, categories = 50):
+	""" Returns a dictionary mapping paths to the feeds served by the harness.
+	"""
+	date = datetime.datetime(2014, 12, 1)
+	paragraph = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore. " * 5
+
+	items = [Item(
+		title = "Article %d" % i,
+		link = "http://www.example.com/articles/%d" % i,
+		description = "<p>%s</p>" % paragraph,
+		author = "author%d@example.com" % (i % 20),
+		guid = Guid("http://www.example.com/articles/%d" % i),
+		pubDate = date - datetime.timedelta(hours = i),
+		categories = ["Category %d" % (i % categories)]) for i in range(archive_items)]
+
+	archive = Feed("Archive", "http://www.example.com", "Every article", lastBuildDate = date, ttl = 60, items = items)
+
+	episodes = [Item(
+		title = "Episode %d" % i,
+		link = "http://www.example.com/episodes/%d" % i,
+		description = paragraph,
+		guid = Guid("http://www.example.com/episodes/%d" % i),
+		pubDate = date - datetime.timedelta(days = i),
+		enclosure = Enclosure("http://www.example.com/episodes/%d.mp3" % i, 24986239, "audio/mpeg"),
+		extensions = [iTunesItem(author = "Host", duration = "01:11:02", explicit = "clean", summary = paragraph)])
+		for i in range(podcast_items)]
+
+	podcast = Feed("Podcast", "http://www.example.com/podcast", "A podcast", lastBuildDate = date, ttl = 60, items = episodes,
+		extensions = [iTunes(author = "Host", summary = "A podcast", image = "http://www.example.com/artwork.jpg",
+			categories = iTunesCategory("Technology", "Software How-To"), owner = iTunesOwner("Host", "host@example.com"))])
+
+	feeds = {"/archive": archive, "/podcast": podcast}
+	for i in range(categories):
+		feeds["/category/%d" % i] = archive.subfeed("Category %d" % i, title = "Category %d" % i)
+
+	return feeds
+
+class _ChunkedOutput(object):
+	""" A file object that hands the rendered feed to the WSGI write callable in chunks.
+	"""
+	def __init__(self, write, size = 64 * 1024):
+		self.write_chunk = write
+		self.size = size
+		self.chunks = []
+		self.length = 0
+
+	def write(self, data):
+		self.chunks.append(data)
+		self.length += len(data)
+		if self.length >= self.size:
+			self.flush()
+
+	def flush(self):
+		if self.chunks:
+			self.write_chunk(b"".join(self.chunks))
+			self.chunks = []
+			self.length = 0
+
+def application(feeds, mode):
+	""" Returns a WSGI application serving the feeds in the specified mode.
+	"""
+	cache = FeedCache()
+
+	def serve(environ, start_response):
+		feed = feeds.get(environ["PATH_INFO"])
+		if feed is None:
+			start_response("404 Not Found", [("Content-Type", "text/plain")])
+			return [b"Not found"]
+
+		headers = [("Content-Type", "application/rss+xml; charset=utf-8")]
+
+		if mode == "streaming":
+			output = _ChunkedOutput(start_response("200 OK", headers))
+			feed.write(output)
+			output.flush()
+			return []
+
+		if mode == "cached":
+			rss = cache.get_or_render(environ["PATH_INFO"], lambda: feed)
+		else:
+			rss = feed.rss()
+
+		body = rss.encode("utf-8")
+
+		start_response("200 OK", headers + [("Content-Length", str(len(body)))])
+		return [body]
+
+	return serve
+
+class _Server(ThreadingMixIn, WSGIServer):
+	daemon_threads = True
+	request_queue_size = 128
+
+class _QuietHandler(WSGIRequestHandler):
+	def log_message(self, *args):
+		pass
+
+def _paths(feeds):
+	# Aggregators poll the small category feeds far more often than the big ones.
+	categories = sorted(path for path in feeds if path.startswith("/category/"))
+	return ["/archive", "/podcast"] + categories * 2
+
+def run_load(port, paths, concurrency, duration):
+	""" Requests the paths from the server with the specified number of threads for a number of seconds. Returns the
+	latency of every request in seconds, and the number of failed requests.
+	"""
+	latencies = []
+	errors = [0]
+	lock = threading.Lock()
+	deadline = time.time() + duration
+
+	def worker(offset):
+		local = []
+		failures = 0
+		index = offset
+
+		while time.time() < deadline:
+			path = paths[index % len(paths)]
+			index += 1
+
+			start = time.perf_counter()
+			try:
+				connection = http.client.HTTPConnection("127.0.0.1", port, timeout = 30)
+				connection.request("GET", path)
+				response = connection.getresponse()
+				response.read()
+				connection.close()
+				if response.status != 200:
+					failures += 1
+					continue
+			except (OSError, http.client.HTTPException):
+				failures += 1
+				continue
+
+			local.append(time.perf_counter() - start)
+
+		with lock:
+			latencies.extend(local)
+			errors[0] += failures
+
+	threads = [threading.Thread(target = worker, args = (i * 7,)) for i in range(concurrency)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	return latencies, errors[0]
+
+def request_memory(app, paths):
+	""" Returns the average peak memory (in bytes) allocated while handling a single request for each of the paths.
+	"""
+	def start_response(status, headers):
+		return lambda data: None
+
+	peaks = []
+	tracemalloc.start()
+	try:
+		for path in paths:
+			gc.collect()
+			tracemalloc.reset_peak()
+			base = tracemalloc.get_traced_memory()[0]
+
+			for chunk in app({"PATH_INFO": path, "REQUEST_METHOD": "GET"}, start_response):
+				pass
+
+			peaks.append(tracemalloc.get_traced_memory()[1] - base)
+	finally:
+		tracemalloc.stop()
+
+	return sum(peaks) / len(peaks)
+
+def percentile(values, fraction):
+	""" Returns the value at the specified fraction (between 0 and 1) of the sorted values, using the nearest rank.
+	"""
+	if not values:
+		return float("nan")
+
+	# The rank is rounded first, so 0.07 * 100 (7.000000000000001) is rank 7 and not 8.
+	values = sorted(values)
+	return values[min(len(values) - 1, max(0, int(math.ceil(round(fraction * len(values), 9))) - 1))]
+
+def benchmark(feeds, mode, concurrency, duration):
+	app = application(feeds, mode)
+	paths = _paths(feeds)
+
+	# Warm up the cache (and measure memory once it's warm), so the cached mode reports its steady state.
+	memory = request_memory(app, paths[:2] + paths[2:4])
+	if mode == "cached":
+		memory = request_memory(app, paths[:2] + paths[2:4])
+
+	server = make_server("127.0.0.1", 0, app, server_class = _Server, handler_class = _QuietHandler)
+	thread = threading.Thread(target = server.serve_forever)
+	thread.daemon = True
+	thread.start()
+
+	try:
+		latencies, errors = run_load(server.server_address[1], paths, concurrency, duration)
+	finally:
+		server.shutdown()
+		server.server_close()
+
+	return {
+		"mode": mode,
+		"requests": len(latencies),
+		"errors": errors,
+		"throughput": len(latencies) / duration,
+		"p50": percentile(latencies, 0.50),
+		"p95": percentile(latencies, 0.95),
+		"p99": percentile(latencies, 0.99),
+		"memory": memory}
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+	parser.add_argument("--modes", nargs = "+", choices = _modes, default = _modes, help = "the serving modes to measure")
+	parser.add_argument("--concurrency", type = int, default = 16, help = "the number of concurrent clients")
+	parser.add_argument("--duration", type = float, default = 5, help = "the number of seconds to run each mode")
+	parser.add_argument("--archive-items", type = int, default = 5000, help = "the number of items of the archive feed")
+	parser.add_argument("--podcast-items", type = int, default = 300, help = "the number of episodes of the podcast feed")
+	parser.add_argument("--categories", type = int, default = 50, help = "the number of category feeds")
+	arguments = parser.parse_args(argv)
+
+	feeds = build_feeds(arguments.archive_items, arguments.podcast_items, arguments.categories)
+
+	print("%-10s %9s %7s %10s %9s %9s %9s %12s" % ("mode", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms", "KB/request"))
+	for mode in arguments.modes:
+		result = benchmark(feeds, mode, arguments.concurrency, arguments.duration)
+		print("%-10s %9d %7d %10.1f %9.2f %9.2f %9.2f %12.1f" % (result["mode"], result["requests"], result["errors"],
+			result["throughput"], 1000 * result["p50"], 1000 * result["p95"], 1000 * result["p99"], result["memory"] / 1024.0))
+		sys.stdout.flush()
+
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
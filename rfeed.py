@@ -1,23 +1,296 @@
 __name__ = "rfeed"
-__version__ = (1, 0, 0)
+__version__ = (2, 0, 0)
 __author__ = "Santiago L. Valdarrama - https://blog.svpino.com"
 _generator = __name__ + " v" + ".".join(map(str, __version__))
 _docs = "https://github.com/svpino/rfeed/blob/master/README.md"
 
+import argparse
+import array
+import asyncio
+import bisect
+import codecs
+import copy
+import csv
+import datetime
+import errno
+import hashlib
+import importlib
+import inspect
+import io
 import itertools
+import json
+import mimetypes
+import mmap
+import os
+import re
+import struct
 import sys
+import tempfile
+import threading
+import time
+import wave
+import weakref
+from collections import OrderedDict, deque
+from multiprocessing.pool import ThreadPool
+from xml.parsers import expat
 from xml.sax import saxutils
 
-if sys.version_info[0] == 3:
-	basestring = str
-	from io import StringIO
-else:
-	try:
-		from cStringIO import StringIO
-	except ImportError:
-		from StringIO import StringIO
+from io import StringIO
+from urllib.parse import urlencode, urlsplit
+
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+_weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+_months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+_cdata_begin = "<![CDATA["
+_cdata_end = "]]>"
+_chunk_size = 64 * 1024
+_illegal_characters = re.compile(u"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+_replacement_character = u"\ufffd"
+
+def _read_chunks(stream):
+	while True:
+		chunk = stream.read(_chunk_size)
+		if not chunk:
+			break
+
+		yield chunk
+
+def _decode_chunks(chunks):
+	# Decodes chunks of UTF-8 bytes (text chunks are left as they are), including whatever the decoder still holds once
+	# the last chunk is read, so a truncated character is reported instead of dropped.
+	decoder = None
+	for chunk in chunks:
+		if not isinstance(chunk, str):
+			decoder = decoder or codecs.getincrementaldecoder("utf-8")()
+			chunk = decoder.decode(chunk)
+
+		yield chunk
+
+	if decoder is not None:
+		yield decoder.decode(b"", True)
+
+def _new_hash():
+	return hashlib.blake2b(digest_size = 20)
+
+def _fingerprint(value, hash):
+	""" Feeds a stable representation of the specified value into the hash. Serializable objects are represented by
+	their class and the values of the fields their constructor takes.
+	"""
+	if callable(value) and not isinstance(value, type):
+		value = value()
+
+	if value is None:
+		hash.update(b"N")
+	elif isinstance(value, str):
+		data = value.encode("utf-8")
+		hash.update(b"S" + str(len(data)).encode("ascii") + b":" + data)
+	elif isinstance(value, (bool, int, float)):
+		hash.update(("V" + type(value).__name__ + ":" + repr(value) + ";").encode("ascii"))
+	elif isinstance(value, (datetime.date, datetime.time)):
+		hash.update(("D" + value.isoformat() + ";").encode("ascii"))
+	elif isinstance(value, Serializable):
+		hash.update(("O" + type(value).__module__ + "." + type(value).__name__ + "{").encode("utf-8"))
+		for field in value._fields():
+			hash.update(field.encode("utf-8") + b"=")
+			_fingerprint(getattr(value, field, None), hash)
+		hash.update(b"}")
+	elif hasattr(value, "read") or hasattr(value, "__next__"):
+		raise TypeError("Values streamed from files or iterators can't be fingerprinted")
+	elif isinstance(value, dict):
+		hash.update(b"M" + str(len(value)).encode("ascii") + b"{")
+		for key in sorted(value):
+			_fingerprint(key, hash)
+			_fingerprint(value[key], hash)
+		hash.update(b"}")
+	elif hasattr(value, "__iter__"):
+		hash.update(b"L[")
+		for element in value:
+			_fingerprint(element, hash)
+		hash.update(b"]")
+	else:
+		_fingerprint(repr(value), hash)
+
+def _sanitize_table(replacement):
+	table = dict((code, replacement) for code in list(range(0x00, 0x09)) + [0x0b, 0x0c] + list(range(0x0e, 0x20)) +
+		list(range(0xd800, 0xe000)) + [0xfffe, 0xffff])
+	table.update({ord("&"): u"&amp;", ord("<"): u"&lt;", ord(">"): u"&gt;"})
+	return table
+
+_sanitize_tables = {"strip": _sanitize_table(None), "replace": _sanitize_table(_replacement_character)}
+
+class _Writer(saxutils.XMLGenerator):
+	""" The handler used to render feeds. On top of the regular XMLGenerator methods, it can write markup that has already
+	been rendered, so fragments that don't change can be cached and reused.
+	Writing markup as it is relies on private attributes of XMLGenerator, which are listed in _internals and only used
+	by _write_markup.
+	"""
+	_internals = ("_write", "_pending_start_element", "_finish_pending_start_element")
+
+	def __init__(self, out, encoding = "UTF-8", **options):
+		saxutils.XMLGenerator.__init__(self, out, encoding)
+		self.encoding = encoding
+
+		self.options = dict((name, value) for name, value in options.items() if value is not None)
+		self.mode = tuple(sorted(self.options.items()))
+		self.fragments = None
+
+		sanitize = options.get("sanitize")
+		if sanitize is not None:
+			if sanitize not in ("strip", "replace"):
+				raise ValueError("Unsupported sanitize mode: " + str(sanitize))
+
+			self._replacement = _replacement_character if sanitize == "replace" else u""
+			self._translation = _sanitize_tables[sanitize]
+
+			self.characters = self._sanitized_characters
+			self.ignorableWhitespace = self._sanitized_whitespace
+
+		self.canonical = bool(options.get("canonical"))
+		if sanitize is not None or self.canonical:
+			self.startElement = self._filtered_start_element
+
+	def _sanitized_characters(self, content):
+		# Clean text is escaped as usual, and text with illegal characters is cleaned and escaped in a single translation.
+		if content and _illegal_characters.search(content) is not None:
+			self._write_markup(content.translate(self._translation))
+		else:
+			saxutils.XMLGenerator.characters(self, content)
+
+	def _sanitized_whitespace(self, content):
+		saxutils.XMLGenerator.ignorableWhitespace(self, _illegal_characters.sub(self._replacement, content))
+
+	def _filtered_start_element(self, name, attrs):
+		if self.options.get("sanitize") is not None:
+			for value in attrs.values():
+				if _illegal_characters.search(value) is not None:
+					attrs = dict((key, _illegal_characters.sub(self._replacement, value)) for key, value in attrs.items())
+					break
+
+		if self.canonical and len(attrs) > 1:
+			attrs = OrderedDict(sorted(attrs.items()))
+
+		saxutils.XMLGenerator.startElement(self, name, attrs)
+
+	def raw(self, markup):
+		""" Writes the specified markup as it is.
+		"""
+		self._write_markup(markup)
+
+	def fragment(self):
+		""" Returns a new handler (using the same options as this one) that renders into a string, along with the output
+		object holding that string.
+		"""
+		output = StringIO()
+		return type(self)(output, self.encoding, **self.options), output
+
+	def _write_markup(self, markup):
+		# Closes the start tag XMLGenerator may be holding back (to write empty elements as short tags) and writes to its
+		# output, so the markup ends up exactly where the next element would.
+		if self._pending_start_element:
+			self._finish_pending_start_element()
+
+		self._write(markup)
+
+class _Field(object):
+	""" A field whose value is normalized once, when it's assigned, instead of every time the object is rendered.
+	"""
+	def __init__(self, name, normalize = None, text = False):
+		""" Keyword arguments:
+		name -- The name of the attribute.
+		normalize -- Optional. A function returning the normalized value to store.
+		text -- Optional. Whether to also store the value as a string (in an attribute named _<name>_text) ready to be
+		used as the value of an XML attribute.
+		"""
+		self.name = name
+		self.normalize = normalize
+		self.text = "_" + name + "_text" if text else None
+
+	def __get__(self, obj, cls):
+		if obj is None:
+			return self
+
+		try:
+			return obj.__dict__[self.name]
+		except KeyError:
+			raise AttributeError(self.name)
+
+	def __set__(self, obj, value):
+		obj.__dict__[self.name] = value if self.normalize is None else self.normalize(value)
+
+		if self.text is not None:
+			obj.__dict__[self.text] = value if value is None or callable(value) or isinstance(value, str) else str(value)
+
+def _cache_key(*values):
+	for value in values:
+		if value is not None and not isinstance(value, str):
+			return None
+
+	return values
+
+def _is_integer(value, minimum = 0, maximum = None):
+	if isinstance(value, bool):
+		return False
+	if isinstance(value, str):
+		if not value.isdigit():
+			return False
+		value = int(value)
+	elif not isinstance(value, int):
+		return False
+
+	return value >= minimum and (maximum is None or value <= maximum)
+
+def _flag(value):
+	if isinstance(value, str):
+		return value.lower() == "yes"
+
+	return value if value is None or callable(value) else value is True
+
+class _CategoryList(list):
+	""" A list of categories that turns the names added to it (by any means) into category objects of its class.
+	"""
+	def __init__(self, cls, categories = ()):
+		self.cls = cls
+		list.__init__(self, self._normalize(categories))
+
+	def _normalize(self, categories):
+		return [self.cls(category) if isinstance(category, str) else category for category in categories]
+
+	def append(self, category):
+		list.append(self, self._normalize([category])[0])
+
+	def insert(self, index, category):
+		list.insert(self, index, self._normalize([category])[0])
+
+	def extend(self, categories):
+		list.extend(self, self._normalize(categories))
+
+	def __iadd__(self, categories):
+		self.extend(categories)
+		return self
+
+	def __setitem__(self, index, value):
+		list.__setitem__(self, index, self._normalize(value) if isinstance(index, slice) else self._normalize([value])[0])
+
+def _categories(value, cls):
+	if value is None:
+		return _CategoryList(cls)
+	if isinstance(value, (cls, str)):
+		value = [value]
+
+	return _CategoryList(cls, value)
 
-class Serializable:
+def _rss_categories(value):
+	return _categories(value, Category)
+
+def _itunes_categories(value):
+	return _categories(value, iTunesCategory)
+
+class Serializable(object):
 	""" Represents an object that can be serialized as part of the feed.
 	"""
 	def __init__(self):
@@ -29,16 +302,85 @@ class Serializable:
 	def publish(self, handler):
 		""" This method produces the XML representation of the object to be included in the feed. In your implementation,
 		make sure you always call this base class method before adding your own code.
+		The handler is also kept in self.handler, which is what _write_element writes to. Objects that may be rendered by
+		several threads at once (see publish_many) should write to the handler they are given instead, with
+		self._element(handler, name, value, attributes), like the built-in classes do.
 		Keyword arguments:
 		handler -- An xml.sax.saxutils.XMLGenerator instance that you can use to create the XML representation of the object.
 		"""
 		self.handler = handler
 
-	def _date(self, date):
+	@classmethod
+	def _fields(cls):
+		""" Returns the names of the fields of this class, which are the arguments its constructor takes.
+		"""
+		fields = cls.__dict__.get("_field_names")
+		if fields is None:
+			try:
+				fields = tuple(inspect.getfullargspec(cls.__init__).args[1:])
+			except TypeError:
+				fields = ()
+
+			cls._field_names = fields
+
+		return fields
+
+	def _write_cached(self, handler, key, write):
+		""" Writes the markup produced by the specified function (which takes the handler to write to), reusing the markup
+		rendered last time if the key (built from the values of the object) hasn't changed since. The markup is only cached
+		for objects shared through an InternPool (which are rendered many times), when the handler is able to write it
+		back, and the key is None when some value can't be cached.
+		"""
+		if key is None or not self.__dict__.get("_interned") or not hasattr(handler, "raw"):
+			write(handler)
+			return
+
+		key = (handler.mode, key)
+		cache = self.__dict__.get("_markup")
+		if cache is None or cache[0] != key:
+			fragment, output = handler.fragment()
+			write(fragment)
+			cache = self._markup = (key, output.getvalue())
+
+		handler.raw(cache[1])
+
+	def validate(self):
+		""" Checks the values of the object, and those of every object it includes, raising an ElementValueError for the
+		first one that doesn't follow the specification. Values are normalized when they are assigned, so rendering never
+		checks them again; this method also normalizes again any list changed in place since. Values given as functions
+		are not checked. Returns the object itself.
+		"""
+		for cls in type(self).__mro__:
+			for name, attribute in vars(cls).items():
+				if isinstance(attribute, _Field) and name in self.__dict__:
+					setattr(self, name, self.__dict__[name])
+
+		for field in self._fields():
+			value = getattr(self, field, None)
+			if isinstance(value, Serializable):
+				value.validate()
+			elif isinstance(value, (list, tuple)):
+				for element in value:
+					if isinstance(element, Serializable):
+						element.validate()
+
+		return self
+
+	def fingerprint(self):
+		""" Returns a hash of the content of the object (and every object it includes) computed without rendering it.
+		Two objects with the same content always have the same fingerprint, even across processes.
+		"""
+		hash = _new_hash()
+		_fingerprint(self, hash)
+		return hash.hexdigest()
+
+	def _date(self, date, handler = None):
 		""" Converts a datetime into an RFC 2822 formatted date.
 		Returns None if None is provided as an argument.
 		Keyword arguments:
 		date -- A datetime object in GMT format.
+		handler -- Optional. The handler the date is written to. Dates with a time zone are converted to GMT when it
+		renders in canonical form.
 		"""
 
 		# Alright, I admit it: this method looks hideous. The thing is that RFC 822 requires a specific format for dates, and strftime is
@@ -49,42 +391,154 @@ class Serializable:
 		#
 		# So, not having a better solution, I went ahead and used the original method from the PyRSS2Gen library.
 
+		date = self._resolve(date)
 		if date is None:
 			return None
 
-		return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][date.weekday()], date.day,
-			["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"][date.month-1], date.year, date.hour, date.minute, date.second)
+		if getattr(handler, "canonical", False):
+			if not isinstance(date, datetime.datetime):
+				date = datetime.datetime.combine(date, datetime.time())
+			elif date.utcoffset() is not None:
+				date = (date - date.utcoffset()).replace(tzinfo = None)
+
+		return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (_weekdays[date.weekday()], date.day, _months[date.month-1], date.year,
+			date.hour, date.minute, date.second)
+
+	def _resolve(self, value):
+		""" Returns the actual value of a field. Fields can be given as functions taking no arguments (or Lazy objects), in
+		which case they are only called when the element is about to be rendered.
+		"""
+		return value() if callable(value) else value
+
+	def _text(self, value):
+		return value if isinstance(value, str) else str(value)
 
 	def _write_element(self, name, value, attributes = {}):
-		def parse_cdata(string):
-			cdata_begin = string.find("<![CDATA[")
-			if cdata_begin != -1:
-				cdata_end = string[cdata_begin:].find("]]>")
-				if cdata_end != -1:
-					return {"begin": cdata_begin,
-							"end": cdata_begin + cdata_end + 3}
-				else:
-					return None
-			else:
-				return None
+		self._element(self.handler, name, value, attributes)
+
+	def _element(self, handler, name, value, attributes = {}):
+		""" Writes an element with the specified text and attributes to the handler. Nothing is written when there's
+		neither a value nor attributes.
+		Values streamed from a file object or an iterator are consumed while they are written, so they can only be
+		rendered once; rendering the same stream again raises a ValueError. To render a streamed value several times,
+		give a function that opens a new stream every time it's called instead.
+		"""
+		value = self._resolve(value)
+		for attribute in attributes.values():
+			if callable(attribute):
+				attributes = dict((key, self._text(self._resolve(attribute))) for key, attribute in attributes.items())
+				break
 
 		if value is not None or attributes != {}:
-			self.handler.startElement(name, attributes)
+			handler.startElement(name, attributes)
 
 			if value is not None:
-				str_value = value if isinstance(value, basestring) else str(value)
-				while len(str_value):
-					cdata_section = parse_cdata(str_value)
-					if cdata_section is not None:
-						self.handler.characters(str_value[:cdata_section["begin"]])
-						self.handler.ignorableWhitespace(
-								str_value[cdata_section["begin"]:cdata_section["end"]])
-						str_value = str_value[cdata_section["end"]:]
-					else:
-						self.handler.characters(str_value)
+				if hasattr(value, "read") or hasattr(value, "__next__"):
+					self._write_stream(handler, name, value)
+				else:
+					self._write_characters(handler, self._text(value))
+
+			handler.endElement(name)
+
+	def _write_stream(self, handler, name, stream):
+		# The last stream of every element is remembered (which also keeps it from being collected, so its id can't be
+		# reused), so rendering it again fails instead of silently writing an empty element.
+		streamed = self.__dict__.setdefault("_streamed", {})
+		if streamed.get(name) is stream:
+			raise ValueError("The value of the %s element was streamed from a file or iterator, so it can only be rendered once" % name)
+
+		streamed[name] = stream
+		self._write_chunks(handler, _read_chunks(stream) if hasattr(stream, "read") else stream)
+
+	def _write_characters(self, handler, value):
+		""" Writes the specified text escaping everything except for complete CDATA sections, which are written as they are.
+		"""
+		position = 0
+		while True:
+			cdata_begin = value.find(_cdata_begin, position)
+			if cdata_begin == -1:
+				break
+
+			cdata_end = value.find(_cdata_end, cdata_begin)
+			if cdata_end == -1:
+				break
+
+			cdata_end += len(_cdata_end)
+			handler.characters(value[position:cdata_begin])
+			handler.ignorableWhitespace(value[cdata_begin:cdata_end])
+			position = cdata_end
+
+		handler.characters(value[position:] if position else value)
+
+	def _write_chunks(self, handler, chunks):
+		""" Writes text that comes in chunks (from a file object or an iterator) without ever joining it, exactly like
+		_write_characters writes the whole text. CDATA sections are detected across chunk boundaries. Since a section
+		that is never closed is escaped like the rest of the text, the contents of a section are held until it's closed.
+		"""
+		tail = ""
+		cdata = None
+
+		for chunk in _decode_chunks(chunks):
+			if not chunk:
+				continue
+
+			text = tail + chunk if tail else chunk
+			position = 0
+			while True:
+				if cdata is not None:
+					cdata_end = text.find(_cdata_end, position)
+					if cdata_end == -1:
+						# Keep the last characters around in case the end of the section is split between chunks.
+						safe = max(position, len(text) - len(_cdata_end) + 1)
+						cdata.append(text[position:safe])
+						position = safe
+						break
+
+					cdata_end += len(_cdata_end)
+					cdata.append(text[position:cdata_end])
+					handler.ignorableWhitespace("".join(cdata))
+					position = cdata_end
+					cdata = None
+				else:
+					cdata_begin = text.find(_cdata_begin, position)
+					if cdata_begin == -1:
+						safe = max(position, len(text) - len(_cdata_begin) + 1)
+						handler.characters(text[position:safe])
+						position = safe
 						break
 
-			self.handler.endElement(name)
+					handler.characters(text[position:cdata_begin])
+					position = cdata_begin + len(_cdata_begin)
+					cdata = [_cdata_begin]
+
+			tail = text[position:]
+
+		handler.characters("".join(cdata) + tail if cdata is not None else tail)
+
+class Lazy(object):
+	""" A Lazy object wraps a function that produces the value of a field, so the value is only computed if the element
+	is actually rendered. Unlike a plain function, the value is computed at most once and reused by any later render.
+	"""
+	def __init__(self, function):
+		""" Keyword arguments:
+		function -- A function taking no arguments that returns the value of the field.
+		"""
+		self.function = function
+		self.computed = False
+		self.value = None
+
+	def __call__(self):
+		if not self.computed:
+			self.value = self.function()
+			self.computed = True
+
+		return self.value
+
+	def reset(self):
+		""" Forgets the computed value, so the function is called again the next time the field is rendered.
+		"""
+		self.computed = False
+		self.value = None
 
 class Extension(Serializable):
 	def get_namespace(self):
@@ -94,13 +548,20 @@ class Extension(Serializable):
 		"""
 		pass
 
+_extensions_versions = itertools.count(1)
+
 class Host(Serializable):
 	""" Represents an object that can be host to other extensions.
 	"""
+	# Changes whenever an extension is added to any host, so feeds (and containers of items) know that the namespaces of
+	# items they already hold may have changed.
+	_extensions_version = 0
+
 	def __init__(self, extensions = None):
 		Serializable.__init__(self)
 
 		self.extensions = [] if extensions is None else extensions
+		self._declared_namespaces = {}
 
 	def add_extension(self, extension):
 		""" You can use this method to add new extensions to the feed.
@@ -110,6 +571,19 @@ class Host(Serializable):
 			raise TypeError("The provided extension should be a subclass of the Serializable class")
 
 		self.extensions.append(extension)
+		Host._extensions_version = next(_extensions_versions)
+
+	@property
+	def _namespaces(self):
+		# Namespaces are taken from the extensions every time, so extensions added to (or removed from) the list directly
+		# are accounted for too.
+		namespaces = {}
+		for extension in self.extensions:
+			if isinstance(extension, Extension):
+				namespaces.update(extension.get_namespace() or {})
+
+		namespaces.update(self._declared_namespaces)
+		return namespaces
 
 class Category(Serializable):
 	""" A Category object specifies one or more categories that the channel or item belongs to.
@@ -131,12 +605,15 @@ class Category(Serializable):
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self._write_element("category", self.category, { "domain": self.domain } if self.domain is not None else {})
+		self._write_cached(handler, _cache_key(self.category, self.domain),
+			lambda handler: self._element(handler, "category", self.category, { "domain": self.domain } if self.domain is not None else {}))
 
 class Cloud(Serializable):
 	""" A Cloud object specifies a web service that supports the rssCloud interface which can be implemented in HTTP-POST, XML-RPC or SOAP 1.1.
 	More information at http://cyber.law.harvard.edu/rss/rss.html#ltcloudgtSubelementOfLtchannelgt
 	"""
+	port = _Field("port", text = True)
+
 	def __init__(self, domain, port, path, registerProcedure, protocol):
 		""" Keyword arguments:
 		domain -- The domain name or IP address of the cloud.
@@ -160,10 +637,18 @@ class Cloud(Serializable):
 		self.registerProcedure = registerProcedure
 		self.protocol = protocol
 
+	def validate(self):
+		Serializable.validate(self)
+
+		if not callable(self.port) and not _is_integer(self.port, 1, 65535):
+			raise ElementValueError("port", self.port, "an integer between 1 and 65535")
+
+		return self
+
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self._write_element("cloud", None, { "domain": self.domain, "port": str(self.port), "path": self.path, "registerProcedure": self.registerProcedure, "protocol": self.protocol })
+		self._element(handler, "cloud", None, { "domain": self.domain, "port": self._port_text, "path": self.path, "registerProcedure": self.registerProcedure, "protocol": self.protocol })
 
 class Image(Serializable):
 	""" An Image object specifies a GIF, JPEG or PNG image that can be displayed with the channel.
@@ -194,16 +679,16 @@ class Image(Serializable):
 
 	def publish(self, handler):
 		Serializable.publish(self, handler)
-		self.handler.startElement("image", {})
+		handler.startElement("image", {})
 
-		self._write_element("url", self.url)
-		self._write_element("title", self.title)
-		self._write_element("link", self.link)
-		self._write_element("width", self.width)
-		self._write_element("height", self.height)
-		self._write_element("description", self.description)
+		self._element(handler, "url", self.url)
+		self._element(handler, "title", self.title)
+		self._element(handler, "link", self.link)
+		self._element(handler, "width", self.width)
+		self._element(handler, "height", self.height)
+		self._element(handler, "description", self.description)
 
-		self.handler.endElement("image")
+		handler.endElement("image")
 
 class TextInput(Serializable):
 	""" A TextInput object specifies a text input box that can be displayed with the channel.
@@ -231,14 +716,14 @@ class TextInput(Serializable):
 
 	def publish(self, handler):
 		Serializable.publish(self, handler)
-		self.handler.startElement("textInput", {})
+		handler.startElement("textInput", {})
 
-		self._write_element("title", self.title)
-		self._write_element("description", self.description)
-		self._write_element("name", self.name)
-		self._write_element("link", self.link)
+		self._element(handler, "title", self.title)
+		self._element(handler, "description", self.description)
+		self._element(handler, "name", self.name)
+		self._element(handler, "link", self.link)
 
-		self.handler.endElement("textInput")
+		handler.endElement("textInput")
 
 class SkipHours(Serializable):
 	""" A SkipHours object is a hint for aggregators telling them which hours they can skip.
@@ -255,16 +740,31 @@ class SkipHours(Serializable):
 
 		self.hours = hours
 
+	def validate(self):
+		Serializable.validate(self)
+
+		if len(self.hours) > 24:
+			raise ElementValueError("hours", self.hours, "a list of up to 24 values")
+
+		for hour in self.hours:
+			if not callable(hour) and not _is_integer(hour, 0, 23):
+				raise ElementValueError("hour", hour, "an integer between 0 and 23")
+
+		if len(set(self.hours)) != len(self.hours):
+			raise ElementValueError("hours", self.hours, "a list without repeated values")
+
+		return self
+
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
 		if self.hours:
-			self.handler.startElement("skipHours", {})
+			handler.startElement("skipHours", {})
 
 			for hour in self.hours:
-				self._write_element("hour", hour)
+				self._element(handler, "hour", hour)
 
-			self.handler.endElement("skipHours")
+			handler.endElement("skipHours")
 
 class SkipDays(Serializable):
 	""" A SkipDays object is a hint for aggregators telling them which days they can skip.
@@ -281,21 +781,38 @@ class SkipDays(Serializable):
 
 		self.days = days
 
+	def validate(self):
+		Serializable.validate(self)
+
+		if len(self.days) > 7:
+			raise ElementValueError("days", self.days, "a list of up to 7 values")
+
+		for day in self.days:
+			if not callable(day) and day not in _days:
+				raise ElementValueError("day", day, "one of " + ", ".join(_days))
+
+		if len(set(self.days)) != len(self.days):
+			raise ElementValueError("days", self.days, "a list without repeated values")
+
+		return self
+
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
 		if self.days:
-			self.handler.startElement("skipDays", {})
+			handler.startElement("skipDays", {})
 
 			for day in self.days:
-				self._write_element("day", day)
+				self._element(handler, "day", day)
 
-			self.handler.endElement("skipDays")
+			handler.endElement("skipDays")
 
 class Enclosure(Serializable):
 	""" An Enclosure object describes a media object that is attached to the item.
 	More information at http://cyber.law.harvard.edu/rss/rss.html#ltenclosuregtSubelementOfLtitemgt
 	"""
+	length = _Field("length", text = True)
+
 	def __init__(self, url, length, type):
 		""" Keyword arguments:
 		url -- Indicates where the enclosure is located.
@@ -312,10 +829,18 @@ class Enclosure(Serializable):
 		self.length = length
 		self.type = type
 
+	def validate(self):
+		Serializable.validate(self)
+
+		if not callable(self.length) and not _is_integer(self.length):
+			raise ElementValueError("length", self.length, "a non-negative integer")
+
+		return self
+
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self._write_element("enclosure", None, { "url": self.url, "length": str(self.length), "type": self.type })
+		self._element(handler, "enclosure", None, { "url": self.url, "length": self._length_text, "type": self.type })
 
 class Guid(Serializable):
 	""" A Guid object represents a string that uniquely identifies the item.
@@ -336,7 +861,7 @@ class Guid(Serializable):
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self._write_element("guid", self.guid, { "isPermaLink": "true" if self.isPermaLink else "false" })
+		self._element(handler, "guid", self.guid, { "isPermaLink": "true" if self._resolve(self.isPermaLink) else "false" })
 
 class Source(Serializable):
 	""" A Source object represents the RSS channel that the item came from.
@@ -358,7 +883,7 @@ class Source(Serializable):
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self._write_element("source", self.name, { "url": self.url })
+		self._write_cached(handler, _cache_key(self.name, self.url), lambda handler: self._element(handler, "source", self.name, { "url": self.url }))
 
 class iTunesOwner(Serializable):
 	""" An iTunesOwner object contains contact information for the owner of the podcast intended to be used for administrative communication.
@@ -380,10 +905,10 @@ class iTunesOwner(Serializable):
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self.handler.startElement("itunes:owner", {})
-		self._write_element("itunes:name", self.name)
-		self._write_element("itunes:email", self.email)
-		self.handler.endElement("itunes:owner")
+		handler.startElement("itunes:owner", {})
+		self._element(handler, "itunes:name", self.name)
+		self._element(handler, "itunes:email", self.email)
+		handler.endElement("itunes:owner")
 
 class iTunesCategory(Serializable):
 	""" An iTunesCategory object specified the browsing category of the feed.
@@ -404,17 +929,25 @@ class iTunesCategory(Serializable):
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self.handler.startElement("itunes:category", { "text": self.name })
+		self._write_cached(handler, _cache_key(self.name, self.subcategory), self._write_category)
+
+	def _write_category(self, handler):
+		handler.startElement("itunes:category", { "text": self.name })
 
 		if self.subcategory is not None:
-			self._write_element("itunes:category", None, { "text": self.subcategory })
+			self._element(handler, "itunes:category", None, { "text": self.subcategory })
 
-		self.handler.endElement("itunes:category")
+		handler.endElement("itunes:category")
 
 class iTunes(Extension):
 	""" Extension for iTunes metatags.
 	More information at https://www.apple.com/itunes/podcasts/specs.html
 	"""
+	block = _Field("block", _flag)
+	explicit = _Field("explicit", _flag)
+	complete = _Field("complete", _flag)
+	categories = _Field("categories", _itunes_categories)
+
 	def __init__(self, author = None, block = None, categories = None, image = None, explicit = None, complete = None, owner = None, subtitle = None,
 		summary = None, new_feed_url = None, type=None):
 		""" Keyword arguments:
@@ -433,22 +966,16 @@ class iTunes(Extension):
 		Extension.__init__(self)
 
 		self.author = author
-		self.block = True if (isinstance(block, basestring) and block.lower() == 'yes') else block
+		self.block = block
 		self.image = image
-		self.explicit = True if (isinstance(explicit, basestring) and explicit.lower() == 'yes') else explicit
-		self.complete = True if (isinstance(complete, basestring) and complete.lower() == 'yes') else complete
+		self.explicit = explicit
+		self.complete = complete
 		self.owner = owner
 		self.subtitle = subtitle
 		self.summary = summary
 		self.new_feed_url = new_feed_url
 		self.type = type
-
-		self.categories = [] if categories is None else categories
-
-		if isinstance(self.categories, iTunesCategory):
-			self.categories = [self.categories]
-		elif isinstance(self.categories, basestring):
-			self.categories = [iTunesCategory(self.categories)]
+		self.categories = categories
 
 	def get_namespace(self):
 		return {"xmlns:itunes": "http://www.itunes.com/dtds/podcast-1.0.dtd"}
@@ -456,38 +983,43 @@ class iTunes(Extension):
 	def publish(self, handler):
 		Extension.publish(self, handler)
 
-		self._write_element("itunes:author", self.author)
+		self._element(handler, "itunes:author", self.author)
 
-		if self.block is not None:
-			self._write_element("itunes:block", "yes" if self.block is True else "no")
+		block = _flag(self._resolve(self.block))
+		if block is not None:
+			self._element(handler, "itunes:block", "yes" if block else "no")
 
 		if self.image is not None:
-			self._write_element("itunes:image", None, {"href" : self.image })
+			self._element(handler, "itunes:image", None, {"href" : self.image })
 
-		if self.explicit is not None:
-			self._write_element("itunes:explicit", "yes" if self.explicit is True else "clean")
+		explicit = _flag(self._resolve(self.explicit))
+		if explicit is not None:
+			self._element(handler, "itunes:explicit", "yes" if explicit else "clean")
 
-		if self.complete is not None:
-			self._write_element("itunes:complete", "yes" if self.complete is True else "no")
+		complete = _flag(self._resolve(self.complete))
+		if complete is not None:
+			self._element(handler, "itunes:complete", "yes" if complete else "no")
 
 		if self.owner is not None:
-			self.owner.publish(self.handler)
+			self.owner.publish(handler)
 
-		self._write_element("itunes:subtitle", self.subtitle)
-		self._write_element("itunes:summary", self.summary)
-		self._write_element("itunes:new-feed-url", self.new_feed_url)
+		self._element(handler, "itunes:subtitle", self.subtitle)
+		self._element(handler, "itunes:summary", self.summary)
+		self._element(handler, "itunes:new-feed-url", self.new_feed_url)
 
-		self._write_element("itunes:type", self.type)
+		self._element(handler, "itunes:type", self.type)
 
 		for category in self.categories:
-			if isinstance(category, basestring):
-				category = iTunesCategory(category)
-			category.publish(self.handler)
+			category.publish(handler)
 
-class iTunesItem(Serializable):
+class iTunesItem(Extension):
 	""" Extension for iTunes Item metatags.
 	More information at https://www.apple.com/itunes/podcasts/specs.html
 	"""
+	block = _Field("block", _flag)
+	explicit = _Field("explicit", _flag)
+	is_closed_captioned = _Field("is_closed_captioned", _flag)
+
 	def __init__(self, author = None, block = None, image = None, duration = None, explicit = None, is_closed_captioned = None, order = None, subtitle = None, summary = None,
 		title=None, episode=None, episodeType=None, season=None):
 		""" Keyword arguments:
@@ -505,14 +1037,14 @@ class iTunesItem(Serializable):
 		episodeType -- The episode type.
 		season -- The episode season number.
 		"""
-		Serializable.__init__(self)
+		Extension.__init__(self)
 
 		self.author = author
-		self.block = True if (isinstance(block, basestring) and block.lower() == 'yes') else block
+		self.block = block
 		self.image = image
 		self.duration = duration
-		self.explicit = True if (isinstance(explicit, basestring) and explicit.lower() == 'yes') else explicit
-		self.is_closed_captioned = True if (isinstance(is_closed_captioned, basestring) and is_closed_captioned.lower() == 'yes') else is_closed_captioned
+		self.explicit = explicit
+		self.is_closed_captioned = is_closed_captioned
 		self.order = order
 		self.subtitle = subtitle
 		self.summary = summary
@@ -521,35 +1053,41 @@ class iTunesItem(Serializable):
 		self.episodeType = episodeType
 		self.season = season
 
+	def get_namespace(self):
+		return {"xmlns:itunes": "http://www.itunes.com/dtds/podcast-1.0.dtd"}
+
 	def publish(self, handler):
-		Serializable.publish(self, handler)
+		Extension.publish(self, handler)
 
-		self._write_element("itunes:author", self.author)
+		self._element(handler, "itunes:author", self.author)
 
-		if self.block is not None:
-			self._write_element("itunes:block", "yes" if self.block is True else "no")
+		block = _flag(self._resolve(self.block))
+		if block is not None:
+			self._element(handler, "itunes:block", "yes" if block else "no")
 
 		if self.image is not None:
-			self._write_element("itunes:image", None, {"href" : self.image })
+			self._element(handler, "itunes:image", None, {"href" : self.image })
 
-		self._write_element("itunes:duration", self.duration)
+		self._element(handler, "itunes:duration", self.duration)
 
-		if self.explicit is not None:
-			self._write_element("itunes:explicit", "yes" if self.explicit is True else "clean")
+		explicit = _flag(self._resolve(self.explicit))
+		if explicit is not None:
+			self._element(handler, "itunes:explicit", "yes" if explicit else "clean")
 
-		if self.is_closed_captioned is not None:
-			self._write_element("itunes:is_closed_captioned", "yes" if self.is_closed_captioned is True else "no")
+		is_closed_captioned = _flag(self._resolve(self.is_closed_captioned))
+		if is_closed_captioned is not None:
+			self._element(handler, "itunes:is_closed_captioned", "yes" if is_closed_captioned else "no")
 
 		if self.order is not None:
-			self._write_element("itunes:order", str(self.order))
+			self._element(handler, "itunes:order", self.order)
 
-		self._write_element("itunes:subtitle", self.subtitle)
-		self._write_element("itunes:summary", self.summary)
+		self._element(handler, "itunes:subtitle", self.subtitle)
+		self._element(handler, "itunes:summary", self.summary)
 
-		self._write_element("itunes:title", self.title)
-		self._write_element("itunes:episode", self.episode)
-		self._write_element("itunes:episodeType", self.episodeType)
-		self._write_element("itunes:season", self.season)
+		self._element(handler, "itunes:title", self.title)
+		self._element(handler, "itunes:episode", self.episode)
+		self._element(handler, "itunes:episodeType", self.episodeType)
+		self._element(handler, "itunes:season", self.season)
 
 
 class Item(Host):
@@ -558,6 +1096,8 @@ class Item(Host):
 	of title or description must be present.
 	More information at http://cyber.law.harvard.edu/rss/rss.html#hrelementsOfLtitemgt
 	"""
+	categories = _Field("categories", _rss_categories)
+
 	def __init__(self, title = None, link = None, description = None, author = None,
 	creator = None, categories = None, comments = None, enclosure = None,
 		guid = None, pubDate = None, source = None, extensions = None):
@@ -592,46 +1132,521 @@ class Item(Host):
 		self.pubDate = pubDate
 		self.source = source
 
-		self.categories = [] if categories is None else categories
-
-		if isinstance(self.categories, Category):
-			self.categories = [self.categories]
-		elif isinstance(self.categories, basestring):
-			self.categories = [Category(self.categories)]
+		self.categories = categories
 
 	def publish(self, handler):
 		Serializable.publish(self, handler)
 
-		self.handler.startElement("item", {})
+		handler.startElement("item", {})
 
-		self._write_element("title", self.title)
-		self._write_element("link", self.link)
-		self._write_element("description", self.description)
-		self._write_element("author", self.author)
-		self._write_element("dc:creator", self.creator)
-		self._write_element("comments", self.comments)
-		self._write_element("pubDate", self._date(self.pubDate))
+		self._element(handler, "title", self.title)
+		self._element(handler, "link", self.link)
+		self._element(handler, "description", self.description)
+		self._element(handler, "author", self.author)
+		self._element(handler, "dc:creator", self.creator)
+		self._element(handler, "comments", self.comments)
+		self._element(handler, "pubDate", self._date(self.pubDate, handler))
 
 		for category in self.categories:
-			if isinstance(category, basestring):
-				category = Category(category)
-			category.publish(self.handler)
+			category.publish(handler)
 
 		if self.enclosure is not None:
-			self.enclosure.publish(self.handler)
+			self.enclosure.publish(handler)
 
 		if self.guid is not None:
-			self.guid.publish(self.handler)
+			self.guid.publish(handler)
 
 		if self.source is not None:
-			self.source.publish(self.handler)
+			self.source.publish(handler)
 
 		for extension in self.extensions:
-			extension.publish(self.handler)
+			extension.publish(handler)
+
+		handler.endElement("item")
+
+def _column(values):
+	if values is None:
+		return None
+
+	return values.tolist() if hasattr(values, "tolist") else list(values)
+
+def _missing(value):
+	# NaN is the only value that is not equal to itself.
+	return value is None or value != value
+
+def _numpy():
+	# NumPy is only imported when a column needs it, since importing it takes longer than importing the rest of the module.
+	try:
+		import numpy
+	except ImportError:
+		return None
 
-		self.handler.endElement("item")
+	return numpy
+
+def _format_dates(values):
+	""" Formats a column of dates as RFC 822 dates. NumPy datetime64 arrays (and pandas Series) are formatted with
+	vectorized operations; any other sequence is formatted one date at a time.
+	"""
+	if values is None:
+		return None
+
+	numpy = _numpy() if hasattr(values, "dtype") else None
+	array = numpy.asarray(values) if numpy is not None else None
+	if array is None or array.dtype.kind != "M":
+		formatter = Serializable()
+		return [None if _missing(date) else formatter._date(date) for date in values]
+
+	missing = numpy.isnat(array)
+	seconds = array.astype("datetime64[s]")
+	seconds[missing] = numpy.datetime64(0, "s")
+	days = seconds.astype("datetime64[D]")
+	months = days.astype("datetime64[M]")
+	years = days.astype("datetime64[Y]")
+
+	time_of_day = (seconds - days).astype(numpy.int64)
+	weekday = (days.astype(numpy.int64) + 3) % 7
+
+	def pad(numbers, width):
+		return numpy.char.zfill(numbers.astype(numpy.int64).astype(str), width)
+
+	parts = [numpy.array(_weekdays)[weekday], ", ", pad((days - months).astype(numpy.int64) + 1, 2), " ",
+		numpy.array(_months)[(months - years).astype(numpy.int64)], " ", pad(years.astype(numpy.int64) + 1970, 4), " ",
+		pad(time_of_day // 3600, 2), ":", pad(time_of_day % 3600 // 60, 2), ":", pad(time_of_day % 60, 2), " GMT"]
+
+	dates = parts[0]
+	for part in parts[1:]:
+		dates = numpy.char.add(dates, part)
+
+	dates = dates.tolist()
+	for index in numpy.flatnonzero(missing):
+		dates[index] = None
+
+	return dates
+
+class RawItem(Serializable):
+	""" A RawItem is an item whose markup is already available, usually because it was taken from another feed. It's
+	written exactly as it is, without going through the elements of the item. Use RawItem.extract to take the items of an
+	existing feed.
+	"""
+	_start_tag = re.compile(br"""<[^\s/>]+(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*/?>""")
+	_encoding_declaration = re.compile(br"""^\s*<\?xml[^>]*encoding\s*=\s*["']([A-Za-z0-9._-]+)["']""")
+
+	def __init__(self, markup, namespaces = None):
+		""" Keyword arguments:
+		markup -- The markup of the whole <item> element, as a string or as UTF-8 encoded bytes.
+		namespaces -- Optional. A dictionary with the namespaces used by the markup, for example
+		{"xmlns:itunes": "http://www.itunes.com/dtds/podcast-1.0.dtd"}. They are declared in the <rss> element of the feed.
+		"""
+		Serializable.__init__(self)
+
+		self.markup = markup.decode("utf-8") if isinstance(markup, bytes) else markup
+		self.namespaces = {} if namespaces is None else namespaces
+		self._namespaces = self.namespaces
+
+	def publish(self, handler):
+		Serializable.publish(self, handler)
+
+		if hasattr(handler, "raw"):
+			handler.raw(self.markup)
+		else:
+			handler.ignorableWhitespace(self.markup)
+
+	@classmethod
+	def extract(cls, source):
+		""" Returns the items of an RSS document as RawItem objects, holding the markup of each item exactly as it
+		appears in the document. The namespaces declared by the <rss> element are kept with each item.
+		Keyword arguments:
+		source -- The document, as bytes or as a file object open for reading in binary mode.
+		"""
+		data = source.read() if hasattr(source, "read") else source
+
+		match = cls._encoding_declaration.match(data)
+		encoding = match.group(1).decode("ascii") if match else "utf-8"
+
+		namespaces = {}
+		spans = []
+		depth = [0, None]
+
+		def start(name, attributes):
+			if depth[0] == 0:
+				namespaces.update((key, value) for key, value in attributes.items() if key.startswith("xmlns:"))
+			elif depth[0] == 2 and name == "item":
+				depth[1] = parser.CurrentByteIndex
+
+			depth[0] += 1
+
+		def end(name):
+			depth[0] -= 1
+
+			if depth[0] == 2 and name == "item":
+				# An empty element (<item/>) ends with its start tag, which may have attributes with a ">" in their values.
+				start_tag = cls._start_tag.match(data, depth[1]).end()
+				if data[start_tag - 2:start_tag] == b"/>":
+					spans.append((depth[1], start_tag))
+				else:
+					spans.append((depth[1], data.index(b">", parser.CurrentByteIndex) + 1))
+
+		parser = expat.ParserCreate()
+		parser.StartElementHandler = start
+		parser.EndElementHandler = end
+		parser.Parse(data, True)
+
+		return [cls(data[begin:end].decode(encoding), dict(namespaces)) for begin, end in spans]
+
+class ItemColumns(Serializable):
+	""" An ItemColumns object holds the items of a feed as columns of values (lists, NumPy arrays or pandas Series) instead
+	of Item objects. Items are rendered straight from the columns, without creating an object per item, and dates are all
+	formatted at once. Missing values (None, NaN or NaT) are left out. NumPy is optional, and only needed for datetime64
+	columns.
+	"""
+	def __init__(self, title = None, link = None, description = None, author = None, creator = None, comments = None,
+		pubDate = None, guid = None, isPermaLink = True):
+		""" Keyword arguments:
+		title -- Optional. The titles of the items.
+		link -- Optional. The URLs of the items.
+		description -- Optional. The synopses of the items.
+		author -- Optional. The email addresses of the authors of the items.
+		creator -- Optional. The persons or entities who wrote the items.
+		comments -- Optional. The URLs of the pages for comments relating to the items.
+		pubDate -- Optional. The publication dates of the items, as datetime objects or a datetime64 array.
+		guid -- Optional. The strings that uniquely identify the items.
+		isPermaLink -- Optional. Whether the guids are URLs that point to the items. This is a single value for every item.
+		"""
+		Serializable.__init__(self)
+
+		if title is None and description is None:
+			raise ElementRequiredError("title", "description")
+
+		self.title = title
+		self.link = link
+		self.description = description
+		self.author = author
+		self.creator = creator
+		self.comments = comments
+		self.pubDate = pubDate
+		self.guid = guid
+		self.isPermaLink = True if isPermaLink is None else isPermaLink
+
+		self._columns = [(name, _column(values)) for name, values in (("title", title), ("link", link),
+			("description", description), ("author", author), ("dc:creator", creator), ("comments", comments),
+			("pubDate", _format_dates(pubDate))) if values is not None]
+		self._guids = _column(guid)
+
+		lengths = set(len(values) for _, values in self._columns)
+		if self._guids is not None:
+			lengths.add(len(self._guids))
+		if len(lengths) > 1:
+			raise ValueError("Every column should have the same number of values")
+
+		self._length = lengths.pop()
+
+	def __len__(self):
+		return self._length
+
+	def __iter__(self):
+		for index in range(self._length):
+			yield self[index]
+
+	def __getitem__(self, index):
+		""" Returns an Item object for the item at the specified position.
+		"""
+		fields = {}
+		for name, column in (("title", self.title), ("link", self.link), ("description", self.description), ("author", self.author),
+			("creator", self.creator), ("comments", self.comments), ("pubDate", self.pubDate), ("guid", self.guid)):
+			if column is not None:
+				value = column[index]
+				fields[name] = None if _missing(value) else value
+
+		if hasattr(fields.get("pubDate"), "dtype"):
+			numpy = _numpy()
+			if numpy is not None and isinstance(fields["pubDate"], numpy.datetime64):
+				fields["pubDate"] = fields["pubDate"].astype("datetime64[us]").item()
+		if fields.get("guid") is not None:
+			fields["guid"] = Guid(fields["guid"], self.isPermaLink)
+
+		return Item(**fields)
+
+	def publish(self, handler):
+		Serializable.publish(self, handler)
+
+		permalink = { "isPermaLink": "true" if self._resolve(self.isPermaLink) else "false" }
+		columns = self._columns
+		guids = self._guids
+
+		for index in range(self._length):
+			handler.startElement("item", {})
+
+			for name, values in columns:
+				value = values[index]
+				if not _missing(value):
+					self._element(handler, name, value)
+
+			if guids is not None and not _missing(guids[index]):
+				self._element(handler, "guid", guids[index], permalink)
+
+			handler.endElement("item")
+
+def _gmt(date):
+	# Returns the date as a datetime without time zone in GMT, so dates of any kind can be compared.
+	if not isinstance(date, datetime.datetime):
+		return datetime.datetime.combine(date, datetime.time())
+
+	if date.utcoffset() is not None:
+		return (date - date.utcoffset()).replace(tzinfo = None)
+
+	return date
+
+class BoundedItems(object):
+	""" A BoundedItems object holds the items of a feed that only keeps the most recent ones, sorted by pubDate (newest
+	first.) Items beyond max_items, or older than max_age, are evicted as new items are added, without ever moving the
+	rest of the items around. Use it as the items of a Feed:
+
+		feed = Feed(title, link, description, items = BoundedItems(max_items = 100))
+		feed.items.add(item)
+
+	Items without a pubDate are treated as published when they were added. Dates without a time zone are taken as GMT.
+	Items are kept in a deque, so adding the newest item and evicting the oldest ones take constant time. An item
+	arriving out of order is inserted after walking from the newest item to its place, which takes time proportional to
+	the number of newer items (usually a few, since late items tend to be recent ones.)
+	Feeds using the object are told whenever its items change, so their indexes (see Feed.subfeed and Feed.search_feed)
+	and the namespaces they declare follow the items.
+	"""
+	def __init__(self, items = None, max_items = None, max_age = None, on_evict = None):
+		""" Keyword arguments:
+		items -- Optional. The initial items.
+		max_items -- Optional. The maximum number of items to keep.
+		max_age -- Optional. The maximum age of the items to keep, as a timedelta or a number of seconds.
+		on_evict -- Optional. A function, or a list of functions, called with every item that is evicted.
+		"""
+		if max_items is not None and max_items < 0:
+			raise ValueError("max_items should be a non-negative integer")
+
+		self.max_items = max_items
+		self.max_age = datetime.timedelta(seconds = max_age) if isinstance(max_age, (int, float)) else max_age
+		self.on_evict = [] if on_evict is None else (list(on_evict) if isinstance(on_evict, (list, tuple)) else [on_evict])
+
+		# (date, item) pairs, newest first.
+		self._entries = deque()
+		self._feeds = weakref.WeakSet()
+		self._namespace_counts = {}
+		self._namespaces_version = Host._extensions_version
+
+		if items is not None:
+			self.extend(items)
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __iter__(self):
+		for _, item in self._entries:
+			yield item
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(len(self._entries)))]
+
+		return self._entries[index][1]
+
+	def add(self, item, now = None):
+		""" Adds an item, and evicts the items that don't fit anymore. Returns the list of evicted items, which may include
+		the item itself if it's already too old.
+		Keyword arguments:
+		item -- The item to add.
+		now -- Optional. The current time as a datetime in GMT, used to find out the age of the items.
+		"""
+		now = self._now() if now is None else now
+
+		date = item._resolve(getattr(item, "pubDate", None))
+		entry = (now if date is None else _gmt(date), item)
+
+		entries = self._entries
+		if not entries or entry[0] >= entries[0][0]:
+			entries.appendleft(entry)
+		elif entry[0] < entries[-1][0]:
+			entries.append(entry)
+		else:
+			# Items arriving out of order are usually among the most recent ones, so look for their place from the front.
+			position = 1
+			while entries[position][0] > entry[0]:
+				position += 1
+
+			entries.insert(position, entry)
+
+		self._count_namespaces(item, 1)
+		evicted = self.evict(now)
+		if item not in evicted:
+			self._changed()
+
+		return evicted
+
+	def extend(self, items, now = None):
+		""" Adds several items. Returns the list of evicted items.
+		"""
+		now = self._now() if now is None else now
+
+		evicted = []
+		for item in items:
+			evicted.extend(self.add(item, now))
+
+		return evicted
+
+	def evict(self, now = None):
+		""" Evicts the items that are too old or don't fit anymore, and returns them. This is done automatically whenever
+		an item is added, but items may also get old while none is being added.
+		"""
+		entries = self._entries
+		evicted = []
+
+		if self.max_items is not None:
+			while len(entries) > self.max_items:
+				evicted.append(entries.pop()[1])
+
+		if self.max_age is not None:
+			oldest = (self._now() if now is None else now) - self.max_age
+			while entries and entries[-1][0] < oldest:
+				evicted.append(entries.pop()[1])
+
+		for item in evicted:
+			self._count_namespaces(item, -1)
+
+		if evicted:
+			self._changed()
+
+		for item in evicted:
+			for function in self.on_evict:
+				function(item)
+
+		return evicted
+
+	@property
+	def _namespaces(self):
+		# The namespaces used by the items currently held, which feeds declare in their <rss> element. They are counted again
+		# when an extension was added to some item since they were counted.
+		if self._namespaces_version != Host._extensions_version:
+			self._namespaces_version = Host._extensions_version
+			self._namespace_counts = {}
+			for _, item in self._entries:
+				self._count_namespaces(item, 1)
+
+		return dict(namespace for namespace, count in self._namespace_counts.items() if count > 0)
+
+	def _count_namespaces(self, item, delta):
+		counts = self._namespace_counts
+		for namespace in getattr(item, "_namespaces", {}).items():
+			counts[namespace] = counts.get(namespace, 0) + delta
+			if counts[namespace] <= 0:
+				del counts[namespace]
+
+	def _attach(self, feed):
+		self._feeds.add(feed)
+
+	def _changed(self):
+		for feed in list(self._feeds):
+			if feed._items is self:
+				feed._items_changed()
+
+	def _now(self):
+		return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo = None)
+
+class _NamespaceIndex:
+	""" Collects the namespaces used by the items of a feed.
+	"""
+	def __init__(self):
+		self.namespaces = {}
+
+	def add(self, position, item):
+		self.namespaces.update(getattr(item, "_namespaces", {}))
+
+class _CategoryIndex:
+	""" Maps category names, and (name, domain) pairs, to the positions of the items of a feed that belong to them.
+	"""
+	def __init__(self):
+		self.names = {}
+		self.keys = {}
+
+	def add(self, position, item):
+		for category in getattr(item, "categories", ()):
+			if isinstance(category, Category):
+				name, domain = category.category, category.domain
+			else:
+				name, domain = category, None
+
+			self.names.setdefault(name, []).append(position)
+			self.keys.setdefault((name, domain), []).append(position)
+
+	def lookup(self, category):
+		""" Returns the positions of the items that belong to the specified category. A string matches the category
+		name regardless of its domain, while a Category object or a (name, domain) tuple has to match both.
+		"""
+		if isinstance(category, Category):
+			return self.keys.get((category.category, category.domain), ())
+		if isinstance(category, tuple):
+			return self.keys.get(category, ())
+
+		return self.names.get(category, ())
+
+class _SearchIndex:
+	""" An inverted index mapping the words in the title, description and categories of the items of a feed to the
+	positions of those items. Values given as functions are only indexed once they were computed (by a Lazy object), so
+	building the index never computes them, and values streamed from files or iterators are never indexed.
+	"""
+	_word = re.compile(r"\w+", re.UNICODE)
+	_markup = re.compile(r"<[^>]*>")
+	_undated = datetime.datetime.min
+
+	def __init__(self):
+		self.postings = {}
+		self.dates = []
+
+	def add(self, position, item):
+		texts = []
+		for field in ("title", "description"):
+			value = self._value(getattr(item, field, None))
+			if value is not None:
+				texts.append(self._markup.sub(" ", item._text(value)))
+
+		for category in getattr(item, "categories", ()):
+			value = self._value(category.category if isinstance(category, Category) else category)
+			if isinstance(value, str):
+				texts.append(value)
+
+		for word in set(self.words(" ".join(texts))):
+			self.postings.setdefault(word, []).append(position)
+
+		date = self._value(getattr(item, "pubDate", None))
+		self.dates.append((_gmt(date) if isinstance(date, datetime.date) else self._undated, position))
+
+	def _value(self, value):
+		# Returns the value if it's available without computing or reading anything, and None otherwise.
+		if isinstance(value, Lazy):
+			return value.value if value.computed else None
+		if callable(value) or hasattr(value, "read") or hasattr(value, "__next__"):
+			return None
+
+		return value
+
+	def words(self, text):
+		return self._word.findall(text.lower())
+
+	def search(self, query, limit = None):
+		""" Returns the positions of the items containing every word of the query, the most recent first.
+		"""
+		words = set(self.words(query))
+		if not words:
+			return []
+
+		postings = sorted([self.postings.get(word, ()) for word in words], key = len)
+		positions = set(postings[0])
+		for other in postings[1:]:
+			if not positions:
+				break
+			positions.intersection_update(other)
+
+		return [position for _, position in sorted([self.dates[position] for position in positions], reverse = True)[:limit]]
 
 class Feed(Host):
+	categories = _Field("categories", _rss_categories)
+
 	def __init__(self, title, link, description, language = None, copyright = None, managingEditor = None, webMaster = None, pubDate = None,
 		lastBuildDate = None, categories = None, generator = None, docs = None, cloud = None, ttl = None, image = None, rating = None,
 		textInput = None, skipHours = None, skipDays = None, items = None, extensions = None):
@@ -684,84 +1699,2303 @@ class Feed(Host):
 		self.skipHours = skipHours
 		self.skipDays = skipDays
 
-		self.categories = [] if categories is None else categories
-
-		if isinstance(self.categories, Category):
-			self.categories = [self.categories]
-		elif isinstance(self.categories, basestring):
-			self.categories = [Category(self.categories)]
+		self.categories = categories
 
 		self.items = [] if items is None else items
 
-	def rss(self):
-		output = StringIO()
-		handler = saxutils.XMLGenerator(output, 'UTF-8')
-		handler.startDocument()
+	@property
+	def items(self):
+		return self._items
+
+	@items.setter
+	def items(self, items):
+		self._items = items
+		self._items_changed()
+
+		# Containers that can tell the feed when their items change (like BoundedItems) are attached to it.
+		if hasattr(items, "_attach"):
+			items._attach(self)
+
+	def _item_list(self):
+		# Returns the items as a list that can be read as many times as needed. Items coming from an iterator (like a
+		# generator) can only be read once, so they are stored back in the feed as a list.
+		items = self._items
+		if isinstance(items, list):
+			return items
+
+		if not hasattr(items, "__len__"):
+			self.items = list(items)
+			return self._items
+
+		return list(items)
+
+	def _items_tracked(self):
+		# Whether changes to the items can be detected, so indexes built over them can be kept.
+		return isinstance(self._items, list) or hasattr(self._items, "_attach")
+
+	def _index(self, name, cls, items):
+		""" Returns an index of the specified class over the items, reusing the one kept in the named attribute. Lists are
+		usually changed by appending items, so the index is kept along with the number of items it covers and the last of
+		them: when the list still starts with those items, only the new ones are added to the index, and otherwise it's
+		built again. Changes that keep the length and the last item (like replacing or sorting items) need a reindex().
+		"""
+		cached = getattr(self, name)
+		if cached is not None:
+			index, count, last = cached
+			if len(items) >= count and (count == 0 or items[count - 1] is last):
+				for position in range(count, len(items)):
+					index.add(position, items[position])
+			else:
+				cached = None
 
-		handler.startElement("rss", self._get_attributes())
-		self.publish(handler)
-		handler.endElement("rss")
+		if cached is None:
+			index = cls()
+			for position, item in enumerate(items):
+				index.add(position, item)
 
-		handler.endDocument()
-		return output.getvalue()
+		# Items coming from other sources (generators, stores, etc.) can change behind our back, so the index is only
+		# kept around when the feed can tell whether they changed.
+		if self._items_tracked():
+			setattr(self, name, (index, len(items), items[-1] if len(items) else None))
 
-	def publish(self, handler):
+		return index
+
+	def add_namespace(self, namespace):
+		""" Declares one or more namespaces in the <rss> element of the feed. Namespaces used by the extensions of the feed
+		and its items are declared automatically, so you only need this method when items come from a source the feed can't
+		look into ahead of time, like a generator.
+		Keyword arguments:
+		namespace -- A dictionary, for example {"xmlns:itunes": "http://www.itunes.com/dtds/podcast-1.0.dtd"}
+		"""
+		self._declared_namespaces.update(namespace)
+		self._attributes = None
+
+	def _items_changed(self):
+		self._category_index = None
+		self._search_index = None
+		self._namespace_index = None
+		self._namespaces_version = Host._extensions_version
+		self._attributes = None
+
+	def reindex(self):
+		""" Discards every index built over the items of the feed. You only need to call this method after changing the
+		title, description or categories of an item that is already part of the feed, or its extensions other than through
+		add_extension, or after replacing or reordering items in place; adding items (or assigning a new list) keeps the
+		indexes up to date.
+		"""
+		self._items_changed()
+
+	def subfeed(self, category, match = "any", **attributes):
+		""" Returns a new feed with the same channel information as this one, but only including the items that belong to
+		the specified categories. Items are looked up through an index that is built the first time this method is called
+		and kept up to date as items are added to the feed.
+		Keyword arguments:
+		category -- A category, or a list of categories. Each category can be a string (matching the name of the category
+		in any domain), a Category object or a (name, domain) tuple.
+		match -- Optional. Whether items should belong to "any" (default) or "all" of the specified categories.
+		attributes -- Optional. Channel elements to override in the new feed, for example title or link.
+		"""
+		if match not in ("any", "all"):
+			raise ValueError('match should be either "any" or "all"')
+
+		items = self._item_list()
+		index = self._index("_category_index", _CategoryIndex, items)
+
+		categories = category if isinstance(category, list) else [category]
+		matches = sorted([index.lookup(category) for category in categories], key = len)
+
+		positions = set(matches[0]) if matches else set()
+		for other in matches[1:]:
+			if match == "all":
+				positions.intersection_update(other)
+			else:
+				positions.update(other)
+
+		return self._copy([items[position] for position in sorted(positions)], **attributes)
+
+	def search_feed(self, query, limit = None, **attributes):
+		""" Returns a new feed with the same channel information as this one, but only including the items whose title,
+		description or categories contain every word of the query, the most recent first. Items are looked up through a
+		full-text index that is built the first time this method is called and kept up to date as items are added to the
+		feed. Values given as functions are not computed for the index; those wrapped in a Lazy object are found once they
+		have been computed (by rendering the feed, for example) and the feed is reindexed.
+		Keyword arguments:
+		query -- The words to look for. Case is ignored.
+		limit -- Optional. The maximum number of items to include.
+		attributes -- Optional. Channel elements to override in the new feed, for example title or link.
+		"""
+		items = self._item_list()
+		index = self._index("_search_index", _SearchIndex, items)
+
+		return self._copy([items[position] for position in index.search(query, limit)], **attributes)
+
+	def _copy(self, items, **attributes):
+		""" Returns a new feed with the same channel elements as this one and the specified items. Items and channel
+		elements are shared, not copied.
+		"""
+		feed = copy.copy(self)
+		feed.categories = list(self.categories)
+		feed.extensions = list(self.extensions)
+		feed._declared_namespaces = dict(self._declared_namespaces)
+		feed.items = items
+
+		for name, value in attributes.items():
+			setattr(feed, name, value)
+
+		return feed
+
+	@classmethod
+	def from_columns(cls, channel, **columns):
+		""" Creates a feed whose items come from columns of values instead of Item objects. See ItemColumns for details.
+		Keyword arguments:
+		channel -- A dictionary with the arguments for the Feed constructor (title, link, description, etc.)
+		columns -- The columns of the items, as taken by the ItemColumns constructor.
+		"""
+		channel = dict(channel)
+		channel["items"] = ItemColumns(**columns)
+		return cls(**channel)
+
+	def validate(self):
+		Host.validate(self)
+
+		if self.ttl is not None and not callable(self.ttl) and not _is_integer(self.ttl):
+			raise ElementValueError("ttl", self.ttl, "a non-negative integer")
+
+		return self
+
+	def dump(self, fp):
+		""" Saves the feed and all its items in a compact binary snapshot that can be loaded back with Feed.load. Field
+		values given as functions are called, and the time zone of dates is dropped. The namespaces used by the feed and its
+		items are saved too, and declared again when the feed is loaded.
+		Keyword arguments:
+		fp -- A file object open for writing in binary mode.
+		"""
+		_SnapshotWriter().write(self, fp)
+
+	@classmethod
+	def load(cls, fp, lazy = False):
+		""" Loads a feed from a snapshot created with Feed.dump. Objects are created by calling the constructor of their
+		class, which has to be a subclass of Serializable defined in a module that is already imported (modules are never
+		imported while loading, so import the modules of custom extensions first.) The snapshot has to hold a Feed.
+		Since every object goes through its constructor, loading a whole feed takes a little longer than unpickling it; a
+		lazy load only decodes the items that are accessed, and opens a feed of any size at once.
+		Keyword arguments:
+		fp -- A file object open for reading in binary mode.
+		lazy -- Optional. When true, the file is memory mapped and items are only decoded when they are accessed.
+		"""
+		if lazy:
+			try:
+				buffer = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+			except (AttributeError, IOError, OSError, ValueError):
+				buffer = fp.read()
+		else:
+			buffer = fp.read()
+
+		reader = _SnapshotReader(buffer)
+		feed = reader.load(lazy, Feed)
+		feed.add_namespace(reader.namespaces())
+		return feed
+
+	def expires(self, now = None, ttl = 60):
+		""" Returns the time (in seconds since the epoch) until which a rendered copy of this feed can be cached. That's
+		the number of minutes specified by the ttl element, extended until the end of any hours or days that aggregators
+		are told to skip through the skipHours and skipDays elements.
+		Keyword arguments:
+		now -- Optional. The current time in seconds since the epoch.
+		ttl -- Optional. The number of minutes to use when the feed doesn't specify a ttl element.
+		"""
+		now = time.time() if now is None else now
+
+		feed_ttl = self._resolve(self.ttl)
+		expires = now + 60 * (int(feed_ttl) if feed_ttl is not None else ttl)
+
+		hours = set(int(hour) for hour in self.skipHours.hours) if self.skipHours is not None else set()
+		days = set(day.lower() for day in self.skipDays.days) if self.skipDays is not None else set()
+
+		for _ in range(24 * 8):
+			date = time.gmtime(expires)
+			if _days[date.tm_wday].lower() in days:
+				expires += 86400 - (date.tm_hour * 3600 + date.tm_min * 60 + date.tm_sec)
+			elif date.tm_hour in hours:
+				expires += 3600 - (date.tm_min * 60 + date.tm_sec)
+			else:
+				break
+
+		return expires
+
+	def rss(self, sanitize = None, canonical = False):
+		""" Returns the rendered feed.
+		Keyword arguments:
+		sanitize -- Optional. What to do with characters that are not allowed in XML (like control characters): strip
+		them ("strip"), or replace them with U+FFFD ("replace".) By default they are written as they are.
+		canonical -- Optional. Whether to render the feed in canonical form, where the same content always produces the
+		same output: attributes are sorted by name, and dates with a time zone are converted to GMT.
+		"""
+		output = StringIO()
+		self.write(output, sanitize, canonical)
+		return output.getvalue()
+
+	def canonical_rss(self, sanitize = None):
+		""" Returns the feed rendered in canonical form (see Feed.rss) along with the hash of its UTF-8 encoding, which is
+		computed while the feed is rendered. The hash is suitable for ETags or to detect changes in the feed.
+		"""
+		output = StringIO()
+		digest = self.write(output, sanitize, True)
+		return output.getvalue(), digest
+
+	def write(self, output, sanitize = None, canonical = False):
+		""" Renders the feed straight into a file object, without building the whole document in memory first. When the
+		feed is rendered in canonical form, returns the hash of its UTF-8 encoding (see Feed.canonical_rss.)
+		Keyword arguments:
+		output -- A file object open for writing, either in text or in binary mode (in which case the feed is encoded as UTF-8.)
+		sanitize -- Optional. See Feed.rss.
+		canonical -- Optional. See Feed.rss.
+		"""
+		if not canonical:
+			self._write(_Writer(output, 'UTF-8', sanitize = sanitize))
+			return None
+
+		output = _HashingOutput(output)
+		self._write(_Writer(output, 'UTF-8', sanitize = sanitize, canonical = True))
+		return output.hash.hexdigest()
+
+	def _write(self, handler):
+		handler.startDocument()
+
+		handler.startElement("rss", self._get_attributes())
+		self.publish(handler)
+		handler.endElement("rss")
+
+		handler.endDocument()
+
+	def write_file(self, path, fsync = True):
+		""" Writes the feed to a file, replacing it atomically, unless the file already holds the same feed. The feed is
+		streamed to a temporary file while its hash is computed, and that hash is compared to the one kept in a sidecar
+		file (path + ".hash") or, if there's none, to the hash of the existing file. Returns True if the file was written.
+		Keyword arguments:
+		path -- The path of the file.
+		fsync -- Optional. Whether to flush the file to disk before renaming it into place.
+		"""
+		staged = _stage_file(self, path)
+		if staged is None:
+			return False
+
+		if fsync:
+			_fsync_file(staged[0])
+
+		_install_file(path, *staged)
+
+		if fsync:
+			_fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+		return True
+
+	def publish(self, handler):
 		Serializable.publish(self, handler)
 
 		handler.startElement("channel", {})
 
-		self._write_element("title", self.title)
-		self._write_element("link", self.link)
-		self._write_element("description", self.description)
-		self._write_element("language", self.language)
-		self._write_element("copyright", self.copyright)
-		self._write_element("managingEditor", self.managingEditor)
-		self._write_element("webMaster", self.webMaster)
-		self._write_element("pubDate", self._date(self.pubDate))
-		self._write_element("lastBuildDate", self._date(self.lastBuildDate))
-		self._write_element("generator", self.generator)
-		self._write_element("docs", self.docs)
-		self._write_element("ttl", self.ttl)
-		self._write_element("rating", self.rating)
+		self._element(handler, "title", self.title)
+		self._element(handler, "link", self.link)
+		self._element(handler, "description", self.description)
+		self._element(handler, "language", self.language)
+		self._element(handler, "copyright", self.copyright)
+		self._element(handler, "managingEditor", self.managingEditor)
+		self._element(handler, "webMaster", self.webMaster)
+		self._element(handler, "pubDate", self._date(self.pubDate, handler))
+		self._element(handler, "lastBuildDate", self._date(self.lastBuildDate, handler))
+		self._element(handler, "generator", self.generator)
+		self._element(handler, "docs", self.docs)
+		self._element(handler, "ttl", self.ttl)
+		self._element(handler, "rating", self.rating)
 
 		for category in self.categories:
-			if isinstance(category, basestring):
-				category = Category(category)
-			category.publish(self.handler)
+			category.publish(handler)
 
 		if self.cloud is not None:
-			self.cloud.publish(self.handler)
+			self.cloud.publish(handler)
 
 		if self.image is not None:
-			self.image.publish(self.handler)
+			self.image.publish(handler)
 
 		if self.textInput is not None:
-			self.textInput.publish(self.handler)
+			self.textInput.publish(handler)
 
 		if self.skipHours is not None:
-			self.skipHours.publish(self.handler)
+			self.skipHours.publish(handler)
 
 		if self.skipDays is not None:
-			self.skipDays.publish(self.handler)
+			self.skipDays.publish(handler)
 
 		for extension in self.extensions:
-			extension.publish(self.handler)
-
-		for item in self.items:
-			item.publish(self.handler)
+			extension.publish(handler)
+
+		if isinstance(self.items, Serializable):
+			self.items.publish(handler)
+		elif handler.fragments:
+			# Items shared with other feeds rendered at the same time (see render_many) are only rendered once.
+			for item in self.items:
+				markup = handler.fragments.get(id(item))
+				if markup is None:
+					item.publish(handler)
+				else:
+					handler.raw(markup)
+		else:
+			for item in self.items:
+				item.publish(handler)
 
 		handler.endElement("channel")
 
 	def _get_attributes(self):
-		attributes = {"version": "2.0", "xmlns:dc" : "http://purl.org/dc/elements/1.1/"}
+		# The attributes are kept until a namespace is declared, or the extensions of the feed or the namespaces of its items
+		# change. Extensions are compared on every render, since the list can be changed in place. The namespaces of a list
+		# of items are kept in an index like the others; containers other than lists can report the namespaces of their
+		# items through a _namespaces attribute. Either way, they are also checked on every render.
+		extensions = tuple(self.extensions)
+		if isinstance(self._items, list):
+			# Extensions added to items already in the list (through add_extension) change their namespaces.
+			if self._namespaces_version != Host._extensions_version:
+				self._namespace_index = None
+				self._namespaces_version = Host._extensions_version
+
+			items = self._index("_namespace_index", _NamespaceIndex, self._items).namespaces
+		else:
+			items = getattr(self._items, "_namespaces", None)
+
+		cached = self._attributes
+		if cached is None or cached[0] != extensions or cached[1] != items:
+			attributes = {"version": "2.0", "xmlns:dc" : "http://purl.org/dc/elements/1.1/"}
+			attributes.update(items or {})
+			attributes.update(self._namespaces)
+			cached = self._attributes = (extensions, None if items is None else dict(items), attributes)
+
+		return cached[2]
+
+class _HashingOutput(io.RawIOBase):
+	""" A binary output that computes the hash of everything written to it on the way to the file. If the file is open
+	in text mode, the data is decoded from UTF-8 before writing it.
+	"""
+	def __init__(self, file):
+		io.RawIOBase.__init__(self)
+		self.file = file
+		self.hash = _new_hash()
 
-		for extension in self.extensions:
-			if isinstance(extension, Extension):
-				namespace = extension.get_namespace()
-				if namespace is not None:
-					attributes = dict(itertools.chain(attributes.items(), namespace.items()))
+		binary = isinstance(file, (io.RawIOBase, io.BufferedIOBase)) or "b" in getattr(file, "mode", "")
+		self.decoder = None if binary else codecs.getincrementaldecoder("utf-8")()
+
+	def writable(self):
+		return True
+
+	def write(self, data):
+		self.hash.update(data)
+		self.file.write(data if self.decoder is None else self.decoder.decode(bytes(data)))
+		return len(data)
+
+def _file_digest(path):
+	# The sidecar is only trusted while the file it describes is still there.
+	if not os.path.exists(path):
+		return None
+
+	try:
+		with open(path + ".hash") as file:
+			return file.read().strip()
+	except (IOError, OSError):
+		pass
+
+	hash = _new_hash()
+	try:
+		with open(path, "rb") as file:
+			for chunk in _read_chunks(file):
+				hash.update(chunk)
+	except (IOError, OSError):
+		return None
+
+	return hash.hexdigest()
+
+def _stage_file(feed, path):
+	# Renders the feed into a temporary file next to its destination. Returns the temporary path and the hash of the feed,
+	# or None (removing the temporary file) when the destination already holds the same content.
+	directory = os.path.dirname(os.path.abspath(path))
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	descriptor, temporary = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+	try:
+		with os.fdopen(descriptor, "wb") as file:
+			output = _HashingOutput(file)
+			feed.write(output)
+	except:
+		os.remove(temporary)
+		raise
+
+	digest = output.hash.hexdigest()
+	if digest == _file_digest(path):
+		os.remove(temporary)
+		return None
+
+	return temporary, digest
+
+def _fsync_file(path):
+	with open(path, "rb+") as file:
+		os.fsync(file.fileno())
+
+def _fsync_directory(directory):
+	try:
+		descriptor = os.open(directory, os.O_RDONLY)
+	except OSError:
+		return
+
+	try:
+		os.fsync(descriptor)
+	except OSError:
+		pass
+	finally:
+		os.close(descriptor)
+
+def _install_file(path, temporary, digest):
+	os.replace(temporary, path)
+
+	# The sidecar is replaced atomically too, so it's never found empty or half written.
+	directory = os.path.dirname(os.path.abspath(path))
+	descriptor, sidecar = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+	try:
+		with os.fdopen(descriptor, "w") as file:
+			file.write(digest)
+
+		os.replace(sidecar, path + ".hash")
+	except:
+		os.remove(sidecar)
+		raise
+
+def publish_many(feeds, threads = 8, fsync = True):
+	""" Writes several feeds to their files like Feed.write_file does, skipping those that didn't change. Feeds are
+	rendered in a thread pool, and all the new files are flushed to disk together before any of them is renamed into place.
+	Returns the list of paths that were written.
+	Keyword arguments:
+	feeds -- A list of (feed, path) tuples.
+	threads -- Optional. The number of threads used to render the feeds.
+	fsync -- Optional. Whether to flush the files to disk before renaming them into place.
+	"""
+	feeds = list(feeds)
+	pool = ThreadPool(max(1, min(threads, len(feeds))))
+	try:
+		staged = [(path, result) for (_, path), result in zip(feeds, pool.map(lambda pair: _stage_file(*pair), feeds)) if result is not None]
+
+		if fsync:
+			pool.map(_fsync_file, [temporary for _, (temporary, _) in staged])
+
+		for path, (temporary, digest) in staged:
+			_install_file(path, temporary, digest)
+
+		if fsync:
+			pool.map(_fsync_directory, set(os.path.dirname(os.path.abspath(path)) for path, _ in staged))
+	finally:
+		pool.close()
+		pool.join()
+
+	return [path for path, _ in staged]
+
+def render_many(feeds, outputs = None):
+	""" Renders several feeds that share items, rendering each of those items only once. Returns the list of rendered
+	feeds (encoded as UTF-8) or, if outputs are specified, writes each feed to its output instead. Only items held in
+	containers that can be read more than once (lists and other containers with a length) are looked for in other feeds;
+	items coming from generators are rendered as they come.
+	Keyword arguments:
+	feeds -- A list of Feed objects.
+	outputs -- Optional. A list of file objects, one for each feed, open for writing either in text or in binary mode.
+	"""
+	feeds = list(feeds)
+
+	items = {}
+	counts = {}
+	for feed in feeds:
+		if isinstance(feed.items, Serializable) or not hasattr(feed.items, "__len__"):
+			continue
+
+		for item in feed.items:
+			items[id(item)] = item
+			counts[id(item)] = counts.get(id(item), 0) + 1
+
+	fragments = {}
+	writer = _Writer(StringIO(), 'UTF-8')
+	for key, count in counts.items():
+		if count > 1:
+			handler, output = writer.fragment()
+			items[key].publish(handler)
+			fragments[key] = output.getvalue()
+
+	results = []
+	for index, feed in enumerate(feeds):
+		output = io.BytesIO() if outputs is None else outputs[index]
+
+		handler = _Writer(output, 'UTF-8')
+		handler.fragments = fragments
+		feed._write(handler)
+
+		if outputs is None:
+			results.append(output.getvalue())
+
+	return results if outputs is None else None
+
+def _item_key(item):
+	""" Returns the value that identifies an item across versions of a feed: its guid, or its link if it has no guid, or
+	its whole content as a last resort.
+	"""
+	guid = getattr(item, "guid", None)
+	if guid is not None:
+		return ("guid", guid._resolve(guid.guid))
+
+	link = getattr(item, "link", None)
+	if link is not None:
+		return ("link", item._resolve(link))
+
+	return ("content", item.fingerprint())
+
+def _channel_fingerprint(feed):
+	hash = _new_hash()
+	for field in feed._fields():
+		if field != "items":
+			hash.update(field.encode("utf-8") + b"=")
+			_fingerprint(getattr(feed, field, None), hash)
+
+	return hash.hexdigest()
+
+class FeedDiff(object):
+	""" A FeedDiff object describes the changes between two versions of a feed, as returned by the diff function.
+	"""
+	def __init__(self, added, removed, changed, channel_changed):
+		""" Keyword arguments:
+		added -- The items of the new feed that were not in the old one.
+		removed -- The items of the old feed that are not in the new one.
+		changed -- A list of (old item, new item) tuples for the items whose content changed.
+		channel_changed -- Whether any channel element (anything other than the items) changed.
+		"""
+		self.added = added
+		self.removed = removed
+		self.changed = changed
+		self.channel_changed = channel_changed
+
+	def __bool__(self):
+		return bool(self.added or self.removed or self.changed or self.channel_changed)
+
+	def __repr__(self):
+		return "<FeedDiff added=%d removed=%d changed=%d channel_changed=%s>" % (len(self.added), len(self.removed),
+			len(self.changed), self.channel_changed)
+
+def diff(old, new):
+	""" Compares two versions of a feed without rendering them. Items are matched by guid (or by link when they don't have
+	a guid) and compared through their fingerprints, so the whole comparison takes linear time. Returns a FeedDiff object.
+	Keyword arguments:
+	old -- The previous version of the feed.
+	new -- The current version of the feed.
+	"""
+	old_items = dict((_item_key(item), item) for item in old.items)
+
+	added = []
+	changed = []
+	seen = set()
+	for item in new.items:
+		key = _item_key(item)
+		seen.add(key)
+
+		previous = old_items.get(key)
+		if previous is None:
+			added.append(item)
+		elif previous is not item and previous.fingerprint() != item.fingerprint():
+			changed.append((previous, item))
+
+	removed = [item for key, item in old_items.items() if key not in seen]
+
+	return FeedDiff(added, removed, changed, _channel_fingerprint(old) != _channel_fingerprint(new))
+
+class FeedHistory(object):
+	""" A FeedHistory object keeps track of the recent versions of a feed to support RFC 3229 delta encoding with the
+	"feed" instance manipulation (see http://www.ietf.org/rfc/rfc3229.txt.)
+	Clients sending "A-IM: feed" along with the ETag of a version they already have get only the items that were added or
+	changed since that version. Versions are identified by the fingerprint of the feed, and only the most recent ones
+	are remembered; clients with an older (or unknown) ETag get the full feed.
+	"""
+	content_type = "application/rss+xml; charset=utf-8"
+
+	def __init__(self, max_versions = 32):
+		""" Keyword arguments:
+		max_versions -- Optional. The number of versions of the feed to remember.
+		"""
+		self.max_versions = max_versions
+		self.versions = OrderedDict()
+		self._lock = threading.Lock()
+
+	def record(self, feed):
+		""" Records the current version of the feed, and returns its ETag.
+		"""
+		etag = '"' + feed.fingerprint() + '"'
+
+		with self._lock:
+			if etag in self.versions:
+				self.versions[etag] = self.versions.pop(etag)
+			else:
+				self.versions[etag] = dict((_item_key(item), item.fingerprint()) for item in feed.items)
+				while len(self.versions) > self.max_versions:
+					self.versions.popitem(last = False)
+
+		return etag
+
+	def respond(self, feed, if_none_match = None, a_im = None):
+		""" Returns the (status, headers, body) of the response to a request for the feed. The status is 304 when the client
+		already has the current version, 226 when only the new and changed items are sent, and 200 for the full feed.
+		Keyword arguments:
+		feed -- The current version of the feed.
+		if_none_match -- Optional. The value of the If-None-Match header of the request.
+		a_im -- Optional. The value of the A-IM header of the request.
+		"""
+		etag = self.record(feed)
+		etags = [tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip() for tag in (if_none_match or "").split(",")]
+
+		if etag in etags:
+			return 304, [("ETag", etag)], ""
+
+		manipulations = [manipulation.split(";")[0].strip().lower() for manipulation in (a_im or "").split(",")]
+		if "feed" in manipulations:
+			with self._lock:
+				base = next((self.versions[tag] for tag in etags if tag in self.versions), None)
+
+			if base is not None:
+				items = [item for item in feed.items if base.get(_item_key(item)) != item.fingerprint()]
+				headers = [("Content-Type", self.content_type), ("ETag", etag), ("IM", "feed"), ("Cache-Control", "no-store, im")]
+				return 226, headers, feed._copy(items).rss()
+
+		return 200, [("Content-Type", self.content_type), ("ETag", etag)], feed.rss()
+
+class _SnapshotWriter(object):
+	""" Writes an object graph in the binary snapshot format used by Feed.dump.
+
+	A snapshot starts with a fixed header, followed by a table of classes (module, name and field names), a string table
+	and a table of object records. Every object record is the index of its class (or LIST), the number of values and a one
+	byte tag for each value, followed by the values packed one after the other, each one taking as many bytes as its tag
+	requires: none for None, four for strings (indexes into the string table), objects and lists (indexes into the object
+	table) and dates, and eight for integers, floats and datetimes. Both tables start with their offsets, so any string or
+	object can be read without reading the rest of the snapshot, and all the values of an object are read at once.
+	The header also points to a list with the namespaces used by the objects of the snapshot (as name, value pairs), so
+	they can be declared without decoding the items.
+
+	Stores holding many small object graphs (see ItemStore) keep a single table of classes for all of them, which is
+	passed to the writer, and write each graph as a record: a short header (the number of strings and objects, and the
+	root object) followed by the string and object tables.
+	"""
+	magic = b"RFSN"
+	version = 1
+	header = struct.Struct("<4sHHIIIIIIII")
+	record_header = struct.Struct("<III")
+	object_header = struct.Struct("<HI")
+
+	NONE, STRING, INTEGER, BOOLEAN, FLOAT, DATETIME, DATE, OBJECT = range(8)
+	LIST = 0xFFFF
+
+	# The struct format of the values of each tag.
+	formats = ("0s", "I", "q", "?", "d", "q", "I", "I")
+
+	epoch = datetime.datetime(1970, 1, 1)
+
+	def __init__(self, classes = None, class_indexes = None):
+		""" Keyword arguments:
+		classes -- Optional. A shared list of (class, field names) tuples, which new classes are appended to.
+		class_indexes -- Optional. A dictionary mapping the classes of the shared list to their positions.
+		"""
+		self.classes = [] if classes is None else classes
+		self.class_indexes = {} if class_indexes is None else class_indexes
+		self.strings = []
+		self.string_indexes = {}
+		self.objects = []
+		self.object_indexes = {}
+		self.referenced = []
+		self.namespaces = {}
+		self.structs = {}
+
+	def write(self, root, fp):
+		root_index = self._object(root)
+		namespaces_index = self._object([value for namespace in sorted(self.namespaces.items()) for value in namespace])
+
+		classes = []
+		for cls, fields in self.classes:
+			classes.append(struct.pack("<IIH", self._string(cls.__module__), self._string(cls.__name__), len(fields)))
+			classes.append(struct.pack("<%dI" % len(fields), *[self._string(field) for field in fields]))
+		classes = b"".join(classes)
+
+		strings, objects = self._tables()
+
+		classes_offset = self.header.size
+		strings_offset = classes_offset + len(classes)
+		objects_offset = strings_offset + len(strings)
+
+		fp.write(self.header.pack(self.magic, self.version, 0, len(self.classes), len(self.strings), len(self.objects),
+			classes_offset, strings_offset, objects_offset, root_index, namespaces_index))
+		fp.write(classes)
+		fp.write(strings)
+		fp.write(objects)
+
+	def record(self, root):
+		""" Returns the object graph as a record, without a class table (the classes are added to the shared list instead.)
+		"""
+		root_index = self._object(root)
+		strings, objects = self._tables()
+		return self.record_header.pack(len(self.strings), len(self.objects), root_index) + strings + objects
+
+	def _tables(self):
+		# Returns the string table and the object table, each one starting with its offsets.
+		strings = [string.encode("utf-8") for string in self.strings]
+		string_offsets = [0]
+		for string in strings:
+			string_offsets.append(string_offsets[-1] + len(string))
+
+		object_offsets = [0]
+		for record in self.objects:
+			object_offsets.append(object_offsets[-1] + len(record))
+
+		return (struct.pack("<%dI" % len(string_offsets), *string_offsets) + b"".join(strings),
+			struct.pack("<%dI" % len(object_offsets), *object_offsets) + b"".join(self.objects))
+
+	def _string(self, string):
+		index = self.string_indexes.get(string)
+		if index is None:
+			index = self.string_indexes[string] = len(self.strings)
+			self.strings.append(string)
+
+		return index
+
+	def _object(self, obj):
+		index = self.object_indexes.get(id(obj))
+		if index is not None:
+			return index
+
+		# Reserve the slot before writing the values, since they may add objects of their own. Objects are kept alive until
+		# the snapshot is written, so their ids can't be reused by temporary objects.
+		index = self.object_indexes[id(obj)] = len(self.objects)
+		self.objects.append(None)
+		self.referenced.append(obj)
+
+		if isinstance(obj, Serializable):
+			self.namespaces.update(getattr(obj, "_namespaces", None) or {})
+
+			cls = type(obj)
+			class_index = self.class_indexes.get(cls)
+			if class_index is None:
+				class_index = self.class_indexes[cls] = len(self.classes)
+				self.classes.append((cls, cls._fields()))
+
+			values = []
+			for field in cls._fields():
+				if not hasattr(obj, field):
+					raise TypeError("%s can't be saved because its %s argument is not stored in an attribute with the same name" % (cls.__name__, field))
+
+				values.append(self._value(getattr(obj, field)))
+		else:
+			class_index = self.LIST
+			values = [self._value(value) for value in obj]
+
+		tags = bytes(tag for tag, _ in values)
+		pack = self.structs.get(tags)
+		if pack is None:
+			pack = self.structs[tags] = struct.Struct("<" + "".join(self.formats[tag] for tag in tags)).pack
+
+		self.objects[index] = self.object_header.pack(class_index, len(values)) + tags + pack(*[value for _, value in values])
+		return index
+
+	def _value(self, value):
+		# Returns the tag and the payload of a value.
+		if callable(value) and not isinstance(value, type):
+			value = value()
+
+		if value is None:
+			return self.NONE, b""
+		if isinstance(value, str):
+			return self.STRING, self._string(value)
+		if isinstance(value, bool):
+			return self.BOOLEAN, value
+		if isinstance(value, float):
+			return self.FLOAT, value
+		if isinstance(value, datetime.datetime):
+			# The time zone (if any) is dropped. The date is rendered exactly the same way, since only its fields are used.
+			delta = value.replace(tzinfo = None) - self.epoch
+			return self.DATETIME, (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+		if isinstance(value, datetime.date):
+			return self.DATE, value.toordinal()
+		if isinstance(value, Serializable) or isinstance(value, (list, tuple)):
+			return self.OBJECT, self._object(value)
+		if isinstance(value, int):
+			return self.INTEGER, value
+		if hasattr(value, "read") or hasattr(value, "__next__"):
+			raise TypeError("Values streamed from files or iterators can't be saved")
+		if hasattr(value, "__iter__"):
+			return self.OBJECT, self._object(list(value))
+
+		raise TypeError("Values of type %s can't be saved" % type(value).__name__)
+
+def _snapshot_class(module, name):
+	""" Returns the class a snapshot refers to by module and class name. Modules are never imported, and only subclasses
+	of Serializable are accepted, so loading a snapshot can't call anything but the constructors of feed objects.
+	"""
+	cls = getattr(sys.modules.get(module), name, None)
+	if not isinstance(cls, type) or not issubclass(cls, Serializable):
+		raise ValueError("Unknown class %s.%s in snapshot" % (module, name))
+
+	return cls
+
+class _SnapshotReader(object):
+	""" Reads objects from a snapshot written by _SnapshotWriter. The buffer can be a bytes object or a memory map; strings
+	and objects are only decoded when they are first needed, unless every string is decoded upfront with decode_strings.
+	"""
+	def __init__(self, buffer, classes = None):
+		""" Keyword arguments:
+		buffer -- The snapshot, or a record written by _SnapshotWriter.record.
+		classes -- Optional. The shared list of (class, field names) tuples of a record. Snapshots include their own.
+		"""
+		self.buffer = buffer
+		self.structs = {}
+		self.constructors = {}
+
+		if classes is not None:
+			string_count, object_count, self.root = _SnapshotWriter.record_header.unpack_from(buffer)
+			strings_offset = _SnapshotWriter.record_header.size
+			objects_offset = None
+			self.namespaces_index = None
+		else:
+			magic, version = struct.unpack_from("<4sH", buffer)
+			if magic != _SnapshotWriter.magic:
+				raise ValueError("The data is not an rfeed snapshot")
+			if version != _SnapshotWriter.version:
+				raise ValueError("Unsupported snapshot version %d" % version)
+
+			(_, _, _, class_count, string_count, object_count, classes_offset, strings_offset, objects_offset, self.root,
+				self.namespaces_index) = _SnapshotWriter.header.unpack_from(buffer)
+
+		self.strings = [None] * string_count
+		self.objects = [None] * object_count
+		self.string_offsets = struct.unpack_from("<%dI" % (string_count + 1), buffer, strings_offset)
+		self.string_data = strings_offset + 4 * (string_count + 1)
+
+		if objects_offset is None:
+			objects_offset = self.string_data + self.string_offsets[-1]
+		self.object_offsets = struct.unpack_from("<%dI" % (object_count + 1), buffer, objects_offset)
+		self.object_data = objects_offset + 4 * (object_count + 1)
+
+		if classes is not None:
+			self.classes = classes
+			return
+
+		self.classes = []
+		position = classes_offset
+		for _ in range(class_count):
+			module, name, field_count = struct.unpack_from("<IIH", buffer, position)
+			position += 10
+			fields = [self._string(field) for field in struct.unpack_from("<%dI" % field_count, buffer, position)]
+			position += 4 * field_count
+
+			self.classes.append((_snapshot_class(self._string(module), self._string(name)), fields))
+
+	def load(self, lazy = False, cls = Serializable):
+		""" Returns the root object of the snapshot, which has to be an instance of the specified class. Nothing is created
+		when it isn't. Unless the load is lazy, every string is decoded upfront.
+		"""
+		class_index = _SnapshotWriter.object_header.unpack_from(self.buffer, self.object_data + self.object_offsets[self.root])[0]
+		if class_index == _SnapshotWriter.LIST or not issubclass(self.classes[class_index][0], cls):
+			raise ValueError("The snapshot doesn't hold a %s object" % cls.__name__)
+
+		if not lazy:
+			self.decode_strings()
+			self._decode_objects()
+
+		return self._object(self.root, lazy)
+
+	def decode_strings(self):
+		""" Decodes every string of the snapshot at once.
+		"""
+		offsets = self.string_offsets
+		data = bytes(self.buffer[self.string_data:self.string_data + offsets[-1]])
+		try:
+			# Most text is ASCII, where byte offsets are also character offsets.
+			text = data.decode("ascii")
+		except UnicodeDecodeError:
+			self.strings = [data[begin:end].decode("utf-8") for begin, end in zip(offsets, offsets[1:])]
+		else:
+			self.strings = [text[begin:end] for begin, end in zip(offsets, offsets[1:])]
+
+	def namespaces(self):
+		""" Returns the namespaces used by the objects of the snapshot.
+		"""
+		if self.namespaces_index is None:
+			return {}
+
+		values = self._object(self.namespaces_index)
+		return dict(zip(values[::2], values[1::2]))
+
+	def _decode_objects(self):
+		# Decodes every object in a single loop, from the last one to the first, since the objects an object refers to are
+		# usually written after it (shared objects written earlier are decoded when they are first needed.)
+		buffer = self.buffer
+		offsets = self.object_offsets
+		data = self.object_data
+		objects = self.objects
+		strings = self.strings
+		layouts = self.structs
+		unpack_header = _SnapshotWriter.object_header.unpack_from
+		header_size = _SnapshotWriter.object_header.size
+		epoch = _SnapshotWriter.epoch
+
+		for index in range(len(objects) - 1, -1, -1):
+			if objects[index] is not None:
+				continue
+
+			position = data + offsets[index]
+			class_index, count = unpack_header(buffer, position)
+			position += header_size
+
+			tags = bytes(buffer[position:position + count])
+			layout = layouts.get(tags)
+			if layout is None:
+				layout = layouts[tags] = self._layout(tags)
+
+			unpack, nones, string_positions, object_positions, datetimes, dates = layout
+			values = list(unpack(buffer, position + count))
+
+			for i in nones:
+				values[i] = None
+			for i in string_positions:
+				values[i] = strings[values[i]]
+			for i in object_positions:
+				obj = objects[values[i]]
+				values[i] = obj if obj is not None else self._object(values[i])
+			for i in datetimes:
+				values[i] = epoch + datetime.timedelta(microseconds = values[i])
+			for i in dates:
+				values[i] = datetime.date.fromordinal(values[i])
+
+			if class_index == _SnapshotWriter.LIST:
+				objects[index] = values
+			else:
+				cls, fields = self._constructor(class_index)
+				objects[index] = cls(*values) if fields is None else cls(**dict(zip(fields, values)))
+
+	def _string(self, index):
+		string = self.strings[index]
+		if string is None:
+			begin = self.string_data + self.string_offsets[index]
+			string = self.strings[index] = str(self.buffer[begin:self.string_data + self.string_offsets[index + 1]], "utf-8")
+
+		return string
+
+	def _values(self, index):
+		# Returns the class index, the tags and the payloads of the values of an object.
+		buffer = self.buffer
+		position = self.object_data + self.object_offsets[index]
+		class_index, count = _SnapshotWriter.object_header.unpack_from(buffer, position)
+		position += _SnapshotWriter.object_header.size
+
+		tags = bytes(buffer[position:position + count])
+		layout = self.structs.get(tags)
+		if layout is None:
+			layout = self.structs[tags] = self._layout(tags)
+
+		return class_index, layout, layout[0](buffer, position + count)
+
+	def _layout(self, tags):
+		# Returns the function unpacking values with the specified tags, and the positions of the values of each tag that
+		# have to be converted after unpacking them.
+		for tag in tags:
+			if tag > _SnapshotWriter.OBJECT:
+				raise ValueError("Unknown value tag %d in snapshot" % tag)
+
+		positions = dict((tag, tuple(i for i, other in enumerate(tags) if other == tag)) for tag in (_SnapshotWriter.NONE,
+			_SnapshotWriter.STRING, _SnapshotWriter.OBJECT, _SnapshotWriter.DATETIME, _SnapshotWriter.DATE))
+
+		return (struct.Struct("<" + "".join(_SnapshotWriter.formats[tag] for tag in tags)).unpack_from, positions[_SnapshotWriter.NONE],
+			positions[_SnapshotWriter.STRING], positions[_SnapshotWriter.OBJECT], positions[_SnapshotWriter.DATETIME],
+			positions[_SnapshotWriter.DATE])
+
+	def _object(self, index, lazy = False):
+		obj = self.objects[index]
+		if obj is not None:
+			return obj
+
+		class_index, layout, payloads = self._values(index)
+
+		items = None
+		if lazy and class_index != _SnapshotWriter.LIST:
+			# The items of the feed are only decoded when they are accessed.
+			fields = self.classes[class_index][1]
+			if "items" in fields and fields.index("items") in layout[3]:
+				position = fields.index("items")
+				items = _SnapshotItems(self, payloads[position])
+				layout = layout[:3] + (tuple(i for i in layout[3] if i != position),) + layout[4:]
+
+		values = self._convert(layout, payloads)
+
+		if class_index == _SnapshotWriter.LIST:
+			obj = values
+		else:
+			if items is not None:
+				values[position] = items
+
+			cls, fields = self._constructor(class_index)
+			obj = cls(*values) if fields is None else cls(**dict(zip(fields, values)))
+
+		self.objects[index] = obj
+		return obj
+
+	def _constructor(self, class_index):
+		# Returns the class at the specified index, and the names of its fields, or None when the values can be passed to
+		# the constructor by position (because the fields haven't changed since the snapshot was written.)
+		constructor = self.constructors.get(class_index)
+		if constructor is None:
+			cls, fields = self.classes[class_index]
+			constructor = self.constructors[class_index] = (cls, None if tuple(fields) == tuple(cls._fields()) else fields)
+
+		return constructor
+
+	def _convert(self, layout, payloads):
+		# Turns the payloads into values. Integers, booleans and floats are unpacked as they are.
+		_, nones, strings, objects, datetimes, dates = layout
+		values = list(payloads)
+
+		for i in nones:
+			values[i] = None
+
+		table = self.strings
+		for i in strings:
+			string = table[values[i]]
+			values[i] = string if string is not None else self._string(values[i])
+
+		table = self.objects
+		for i in objects:
+			obj = table[values[i]]
+			values[i] = obj if obj is not None else self._object(values[i])
+
+		for i in datetimes:
+			values[i] = _SnapshotWriter.epoch + datetime.timedelta(microseconds = values[i])
+		for i in dates:
+			values[i] = datetime.date.fromordinal(values[i])
+
+		return values
+
+class _SnapshotItems(object):
+	""" The items of a feed loaded lazily from a snapshot. Each item is only decoded the first time it's accessed.
+	"""
+	def __init__(self, reader, index):
+		self.reader = reader
+		_, _, self.indexes = reader._values(index)
+
+	def __len__(self):
+		return len(self.indexes)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(len(self.indexes)))]
+
+		return self.reader._object(self.indexes[index])
+
+	def __iter__(self):
+		for index in self.indexes:
+			yield self.reader._object(index)
+
+class ItemStore(object):
+	""" An ItemStore keeps items in an append-only file, so a long history of items doesn't have to be kept in memory.
+	The file is memory mapped, and only an index of the items (by pubDate and guid) lives in memory; items are decoded from
+	the file when they are accessed, and only for as long as they are used. Windows of the store can be used as the items
+	of a Feed, and they declare the namespaces of the extensions of the stored items. The modules defining the classes of
+	the items (and their extensions) have to be imported before the store is opened.
+
+	The file starts with a short header (a magic string and the version of the format), followed by records. Every record
+	is a header (the kind of record, its length, the pubDate of the item in microseconds since the epoch in GMT and the
+	length of its guid), the guid encoded as UTF-8, and the data. Items are written in the format used by Feed.dump, but
+	without a class table: the classes are written once for the whole store, each one in a record of its own (its module,
+	name and field names), before the first item that uses it. The namespaces of the items are written in the same way.
+	"""
+	magic = b"RFIS"
+	version = 1
+	file_header = struct.Struct("<4sH")
+	record_header = struct.Struct("<BIqH")
+	undated = -2 ** 63
+
+	ITEM, CLASS, NAMESPACE = range(3)
+
+	def __init__(self, path):
+		""" Keyword arguments:
+		path -- The path of the file. It's created if it doesn't exist.
+		"""
+		self.path = path
+		self.file = open(path, "a+b")
+		self.buffer = None
+		self._lock = threading.Lock()
+
+		# Record offsets and dates in the order they were added, and record numbers sorted by pubDate (with their dates, for
+		# bisect.)
+		self.offsets = array.array("q")
+		self.record_dates = array.array("q")
+		self.dates = array.array("q")
+		self.records = array.array("q")
+		self.guids = {}
+
+		# The classes of the items, shared by all of them, and the namespaces they use.
+		self.classes = []
+		self.class_indexes = {}
+		self.namespaces = {}
+
+		self._map()
+		size = len(self.buffer) if self.buffer is not None else 0
+		if not size:
+			self.file.write(self.file_header.pack(self.magic, self.version))
+			self.file.flush()
+			return
+
+		if size < self.file_header.size or self.file_header.unpack_from(self.buffer) != (self.magic, self.version):
+			self.close()
+			raise ValueError("%s is not an rfeed item store" % path)
+
+		position = self.file_header.size
+		while position + self.record_header.size <= size:
+			kind, length, date, guid_length = self.record_header.unpack_from(self.buffer, position)
+			begin = position + self.record_header.size + guid_length
+			if begin + length > size:
+				# A record that was only partly written (if the process died while appending) is ignored.
+				break
+
+			if kind == self.CLASS:
+				self._add_class(bytes(self.buffer[begin:begin + length]).decode("utf-8").split("\0"))
+			elif kind == self.NAMESPACE:
+				name, value = bytes(self.buffer[begin:begin + length]).decode("utf-8").split("\0")
+				self.namespaces[name] = value
+			else:
+				guid = bytes(self.buffer[position + self.record_header.size:begin]).decode("utf-8")
+				self._index(position, date, guid)
+
+			position = begin + length
+
+		if position < size:
+			self.file.truncate(position)
+			self._map()
+
+	def __len__(self):
+		return len(self.records)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def add(self, item):
+		""" Appends an item to the store. An item with the same guid as an item already stored replaces it.
+		"""
+		self.extend([item])
+
+	def extend(self, items):
+		""" Appends several items to the store.
+		"""
+		with self._lock:
+			class_count = len(self.classes)
+			namespaces = {}
+			records = []
+
+			try:
+				for item in items:
+					writer = _SnapshotWriter(self.classes, self.class_indexes)
+					data = writer.record(item)
+					namespaces.update(writer.namespaces)
+
+					date = self._date_key(item._resolve(getattr(item, "pubDate", None)))
+					guid = getattr(item, "guid", None)
+					guid = (guid._resolve(guid.guid) if guid is not None else "").encode("utf-8")
+
+					records.append((self.record_header.pack(self.ITEM, len(data), date, len(guid)) + guid + data, date, guid))
+			except:
+				for cls, _ in self.classes[class_count:]:
+					del self.class_indexes[cls]
+				del self.classes[class_count:]
+				raise
+
+			# Classes and namespaces go before the items that use them.
+			metadata = []
+			for cls, fields in self.classes[class_count:]:
+				metadata.append(self._record(self.CLASS, [cls.__module__, cls.__name__] + list(fields)))
+			for name, value in sorted(namespaces.items()):
+				if self.namespaces.get(name) != value:
+					metadata.append(self._record(self.NAMESPACE, [name, value]))
+
+			self.file.seek(0, os.SEEK_END)
+			position = self.file.tell() + sum(len(record) for record in metadata)
+			self.file.write(b"".join(metadata + [record for record, _, _ in records]))
+			self.file.flush()
+
+			self.namespaces.update(namespaces)
+			for record, date, guid in records:
+				self._index(position, date, guid.decode("utf-8"))
+				position += len(record)
+
+			self.buffer = None
+
+	def get(self, guid):
+		""" Returns the item with the specified guid, or None if there's none.
+		"""
+		record = self.guids.get(guid)
+		return None if record is None else self._item(self.offsets[record])
+
+	def window(self, start = 0, stop = None, newest_first = True):
+		""" Returns a window of the items, sorted by pubDate, that can be used as the items of a Feed. Items are decoded
+		every time they are accessed.
+		Keyword arguments:
+		start -- Optional. The position of the first item of the window.
+		stop -- Optional. The position after the last item of the window. By default, the window goes to the last item.
+		newest_first -- Optional. Whether positions count from the newest item (default) or from the oldest one.
+		"""
+		count = len(self.records)
+		start, stop, _ = slice(start, stop).indices(count)
+		stop = max(start, stop)
+
+		if newest_first:
+			return _StoreWindow(self, self.records[count - stop:count - start][::-1])
+
+		return _StoreWindow(self, self.records[start:stop])
+
+	def between(self, since = None, until = None, newest_first = True):
+		""" Returns a window with the items published from since (inclusive) to until (exclusive.)
+		"""
+		start = 0 if since is None else bisect.bisect_left(self.dates, self._date_key(since))
+		stop = len(self.dates) if until is None else bisect.bisect_left(self.dates, self._date_key(until))
+		records = self.records[start:max(start, stop)]
+
+		return _StoreWindow(self, records[::-1] if newest_first else records)
+
+	def close(self):
+		self.buffer = None
+		self.file.close()
+
+	def _add_class(self, values):
+		module, name, fields = values[0], values[1], values[2:]
+		cls = _snapshot_class(module, name)
+
+		# Items written while the class had other fields are still read with the fields they were written with, but new
+		# items get a new entry for the class.
+		if tuple(fields) == tuple(cls._fields()):
+			self.class_indexes[cls] = len(self.classes)
+
+		self.classes.append((cls, fields))
+
+	def _record(self, kind, values):
+		data = "\0".join(values).encode("utf-8")
+		return self.record_header.pack(kind, len(data), 0, 0) + data
+
+	def _index(self, offset, date, guid):
+		record = len(self.offsets)
+		self.offsets.append(offset)
+		self.record_dates.append(date)
+
+		previous = self.guids.get(guid) if guid else None
+		if previous is not None:
+			position = self._position(previous)
+			del self.dates[position]
+			del self.records[position]
+
+		if guid:
+			self.guids[guid] = record
+
+		# Items usually come in order, so they're inserted at the end without moving anything.
+		position = bisect.bisect_right(self.dates, date)
+		self.dates.insert(position, date)
+		self.records.insert(position, record)
+
+	def _position(self, record):
+		position = bisect.bisect_left(self.dates, self.record_dates[record])
+		while self.records[position] != record:
+			position += 1
+
+		return position
+
+	def _map(self):
+		buffer = self.buffer
+		if buffer is None:
+			self.file.flush()
+			size = os.fstat(self.file.fileno()).st_size
+			if size:
+				buffer = self.buffer = mmap.mmap(self.file.fileno(), size, access = mmap.ACCESS_READ)
+
+		return buffer
+
+	def _item(self, offset):
+		buffer = self._map()
+		_, length, _, guid_length = self.record_header.unpack_from(buffer, offset)
+		begin = offset + self.record_header.size + guid_length
+
+		return _SnapshotReader(memoryview(buffer)[begin:begin + length], self.classes).load()
 
-		return attributes
+	def _date_key(self, date):
+		if date is None:
+			return self.undated
+
+		delta = _gmt(date) - _SnapshotWriter.epoch
+		return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+class _StoreWindow(object):
+	""" A window of the items of an ItemStore. Items are decoded from the store every time they are accessed.
+	"""
+	def __init__(self, store, records):
+		self.store = store
+		self.records = records
+
+	@property
+	def _namespaces(self):
+		return dict(self.store.namespaces)
+
+	def __len__(self):
+		return len(self.records)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return _StoreWindow(self.store, self.records[index])
+
+		return self.store._item(self.store.offsets[self.records[index]])
+
+	def __iter__(self):
+		for record in self.records:
+			yield self.store._item(self.store.offsets[record])
+
+class InternPool(object):
+	""" An InternPool deduplicates the strings and sub-objects that many items share, like authors, categories, sources or
+	iTunes images. Items built through the pool share a single copy of each value, which saves memory, and since shared
+	Category, Source and iTunesCategory objects keep their rendered markup, each of them is only escaped once.
+	Objects returned by the pool are shared, so they shouldn't be modified.
+	"""
+	def __init__(self, max_entries = 100000):
+		""" Keyword arguments:
+		max_entries -- Optional. The maximum number of strings, and of objects, to keep. The least recently used ones are
+		removed first (values already handed out are still valid, they're just not shared with later ones.)
+		"""
+		self.max_entries = max_entries
+		self.strings = OrderedDict()
+		self.objects = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.strings) + len(self.objects)
+
+	def string(self, value):
+		""" Returns the pooled copy of a string. Any other value is returned as it is.
+		"""
+		if not isinstance(value, str):
+			return value
+
+		return self._pooled(self.strings, value, value)
+
+	def category(self, category, domain = None):
+		return self._object(Category, self.string(category), self.string(domain))
+
+	def source(self, name, url):
+		return self._object(Source, self.string(name), self.string(url))
+
+	def itunes_category(self, name, subcategory = None):
+		return self._object(iTunesCategory, self.string(name), self.string(subcategory))
+
+	def intern(self, value):
+		""" Returns the pooled equivalent of a string, Category, Source or iTunesCategory. Any other value is returned as it is.
+		"""
+		if isinstance(value, str):
+			return self.string(value)
+		if type(value) is Category:
+			return self.category(value.category, value.domain)
+		if type(value) is Source:
+			return self.source(value.name, value.url)
+		if type(value) is iTunesCategory:
+			return self.itunes_category(value.name, value.subcategory)
+
+		return value
+
+	def item(self, **fields):
+		""" Creates an Item with the specified fields (the same arguments the Item constructor takes), sharing its author,
+		creator, categories, source, enclosure type and iTunes values with every other item created through the pool.
+		"""
+		for field in ("author", "creator", "source"):
+			if field in fields:
+				fields[field] = self.intern(fields[field])
+
+		if fields.get("categories") is not None:
+			fields["categories"] = [self.intern(category) for category in _rss_categories(fields["categories"])]
+
+		item = Item(**fields)
+
+		if item.enclosure is not None:
+			item.enclosure.type = self.string(item.enclosure.type)
+
+		for extension in item.extensions:
+			if isinstance(extension, iTunesItem):
+				extension.author = self.string(extension.author)
+				extension.image = self.string(extension.image)
+
+		return item
+
+	def _object(self, cls, *values):
+		key = (cls,) + values
+		obj = self.objects.get(key)
+		if obj is None:
+			obj = cls(*values)
+			obj._interned = True
+
+		return self._pooled(self.objects, key, obj)
+
+	def _pooled(self, table, key, value):
+		with self._lock:
+			pooled = table.get(key)
+			if pooled is not None:
+				table.move_to_end(key)
+				return pooled
+
+			table[key] = value
+			if len(table) > self.max_entries:
+				table.popitem(last = False)
+
+			return value
+
+_mp3_bitrates = {
+	(3, 3): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+	(3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+	(3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+	(2, 3): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+	(2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+	(2, 1): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]}
+
+_mp3_sample_rates = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+def _mp3_duration(file, size):
+	""" Returns the duration in seconds of an MP3 file, using the Xing/Info or VBRI header when there's one, or the bitrate
+	of the first frame otherwise.
+	"""
+	header = file.read(10)
+	start = 0
+	if header[:3] == b"ID3" and len(header) == 10:
+		start = 10 + ((header[6] & 0x7f) << 21 | (header[7] & 0x7f) << 14 | (header[8] & 0x7f) << 7 | (header[9] & 0x7f))
+		if header[5] & 0x10:
+			start += 10
+
+	file.seek(start)
+	data = bytearray(file.read(64 * 1024))
+
+	for position in range(len(data) - 4):
+		if data[position] != 0xff or data[position + 1] & 0xe0 != 0xe0:
+			continue
+
+		version = (data[position + 1] >> 3) & 3
+		layer = (data[position + 1] >> 1) & 3
+		bitrate_index = data[position + 2] >> 4
+		sample_rate_index = (data[position + 2] >> 2) & 3
+		mono = data[position + 3] >> 6 == 3
+		if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+			continue
+
+		bitrate = _mp3_bitrates[(3 if version == 3 else 2, layer)][bitrate_index] * 1000
+		sample_rate = _mp3_sample_rates[version][sample_rate_index]
+		samples = 384 if layer == 3 else (1152 if layer == 2 or version == 3 else 576)
+
+		xing = position + 4 + ((17 if mono else 32) if version == 3 else (9 if mono else 17))
+		if data[xing:xing + 4] in (b"Xing", b"Info") and struct.unpack(">I", bytes(data[xing + 4:xing + 8]))[0] & 1:
+			return struct.unpack(">I", bytes(data[xing + 8:xing + 12]))[0] * samples / float(sample_rate)
+
+		vbri = position + 36
+		if data[vbri:vbri + 4] == b"VBRI":
+			return struct.unpack(">I", bytes(data[vbri + 14:vbri + 18]))[0] * samples / float(sample_rate)
+
+		return (size - start - position) * 8 / float(bitrate)
+
+	return None
+
+def _mp4_duration(file, size):
+	""" Returns the duration in seconds of an MP4/M4A file, from the mvhd box inside the moov box.
+	"""
+	end = size
+	position = 0
+	while position + 8 <= end:
+		file.seek(position)
+		box_size, box_type = struct.unpack(">I4s", file.read(8))
+		header = 8
+		if box_size == 1:
+			box_size = struct.unpack(">Q", file.read(8))[0]
+			header = 16
+		elif box_size == 0:
+			box_size = end - position
+
+		if box_size < header:
+			return None
+
+		if box_type == b"moov":
+			# Look for the mvhd box inside the moov box.
+			end = position + box_size
+			position += header
+		elif box_type == b"mvhd":
+			version = file.read(1)[0]
+			if version == 1:
+				file.read(3 + 16)
+				timescale, duration = struct.unpack(">IQ", file.read(12))
+			else:
+				file.read(3 + 8)
+				timescale, duration = struct.unpack(">II", file.read(8))
+
+			return duration / float(timescale) if timescale else None
+		else:
+			position += box_size
+
+	return None
+
+def _wav_duration(file, size):
+	reader = wave.open(file)
+	try:
+		return reader.getnframes() / float(reader.getframerate())
+	finally:
+		reader.close()
+
+def _format_duration(seconds):
+	seconds = int(round(seconds))
+	return "%02d:%02d:%02d" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+class MediaResolver(object):
+	""" A MediaResolver works out the length, MIME type and duration of local media files, so they can be used to fill in
+	Enclosure and iTunesItem objects. Files are inspected in parallel by a pool of threads, and the results are cached
+	(optionally in a JSON file that persists between runs) by path, size and modification time, so only new or changed
+	files are read again. Durations are read from the headers of MP3, MP4/M4A and WAV files.
+	"""
+	def __init__(self, cache = None, workers = 8):
+		""" Keyword arguments:
+		cache -- Optional. The path of the JSON file where results are kept between runs.
+		workers -- Optional. The number of threads used to inspect files.
+		"""
+		self.cache = cache
+		self.workers = workers
+		self.entries = {}
+		self._lock = threading.Lock()
+
+		if cache is not None and os.path.exists(cache):
+			with io.open(cache, "r", encoding = "utf-8") as file:
+				self.entries = json.load(file)
+
+	def resolve(self, path):
+		""" Returns a dictionary with the length (in bytes), type and duration (in seconds, or None if unknown) of a file.
+		"""
+		stat = os.stat(path)
+		key = os.path.abspath(path)
+
+		entry = self.entries.get(key)
+		if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+			return entry
+
+		with open(path, "rb") as file:
+			type = self._type(file, path)
+			duration = None
+			readers = {"audio/mpeg": _mp3_duration, "audio/mp4": _mp4_duration, "audio/x-m4a": _mp4_duration,
+				"video/mp4": _mp4_duration, "audio/wav": _wav_duration, "audio/x-wav": _wav_duration}
+
+			if type in readers:
+				try:
+					file.seek(0)
+					duration = readers[type](file, stat.st_size)
+				except (EOFError, IndexError, struct.error, wave.Error):
+					duration = None
+
+		entry = {"size": stat.st_size, "mtime": stat.st_mtime, "length": stat.st_size, "type": type, "duration": duration}
+		with self._lock:
+			self.entries[key] = entry
+
+		return entry
+
+	def resolve_many(self, paths):
+		""" Resolves several files in parallel. Returns a dictionary mapping each path to the result of resolve().
+		"""
+		return self._map(self.resolve, paths)
+
+	def update(self, items, url = None):
+		""" Fills in the enclosure length and type, and the iTunes duration, of each item from its media file, and saves
+		the cache afterwards. Items whose file can't be read (because it's missing, for example) are left as they are.
+		Returns a dictionary mapping the path of each of those files to the OSError raised while reading it.
+		Keyword arguments:
+		items -- A list of (item, path) tuples.
+		url -- Optional. A function returning the URL of a file, used to create the enclosure of items that don't have one.
+		"""
+		items = list(items)
+		resolved = self._map(self._resolve_or_error, [path for _, path in items])
+		errors = {}
+
+		for item, path in items:
+			entry = resolved[path]
+			if isinstance(entry, OSError):
+				errors[path] = entry
+				continue
+
+			if item.enclosure is not None:
+				item.enclosure.length = entry["length"]
+				item.enclosure.type = entry["type"]
+			elif url is not None:
+				item.enclosure = Enclosure(url(path), entry["length"], entry["type"])
+
+			if entry["duration"] is not None:
+				for extension in item.extensions:
+					if isinstance(extension, iTunesItem):
+						extension.duration = _format_duration(entry["duration"])
+
+		self.save()
+		return errors
+
+	def save(self):
+		""" Writes the cache file (if any.)
+		"""
+		if self.cache is None:
+			return
+
+		with self._lock:
+			data = json.dumps(self.entries)
+
+		temporary = self.cache + ".tmp"
+		with open(temporary, "w") as file:
+			file.write(data)
+
+		os.replace(temporary, self.cache)
+
+	def _resolve_or_error(self, path):
+		try:
+			return self.resolve(path)
+		except OSError as error:
+			return error
+
+	def _map(self, function, paths):
+		paths = list(paths)
+		pool = ThreadPool(max(1, min(self.workers, len(paths))))
+		try:
+			return dict(zip(paths, pool.map(function, paths)))
+		finally:
+			pool.close()
+			pool.join()
+
+	def _type(self, file, path):
+		header = file.read(12)
+
+		if header[:3] == b"ID3" or (len(header) > 1 and header[0:1] == b"\xff" and ord(header[1:2]) & 0xe0 == 0xe0):
+			return "audio/mpeg"
+		if header[4:8] == b"ftyp":
+			return "audio/mp4" if header[8:11] == b"M4A" else "video/mp4"
+		if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+			return "audio/wav"
+		if header[:4] == b"OggS":
+			return "audio/ogg"
+
+		return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+class _HTTPConnections(object):
+	""" A minimal asyncio HTTP/1.1 client that keeps connections open and reuses them for later requests to the same host.
+	"""
+	def __init__(self, timeout):
+		self.timeout = timeout
+		self.idle = {}
+
+	async def post(self, url, body, content_type):
+		""" Sends a POST request and returns the status code of the response.
+		"""
+		return (await self.request("POST", url, body, content_type))[0]
+
+	async def request(self, method, url, body = "", content_type = None):
+		""" Sends a request and returns the status code and the body of the response.
+		"""
+		parts = urlsplit(url)
+		secure = parts.scheme == "https"
+		host = parts.hostname
+		port = parts.port or (443 if secure else 80)
+		path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+		data = body.encode("utf-8")
+
+		headers = "Content-Type: %s\r\n" % content_type if content_type is not None else ""
+		request = ("%s %s HTTP/1.1\r\nHost: %s\r\n%sContent-Length: %d\r\nUser-Agent: %s\r\n\r\n" %
+			(method, path, parts.netloc, headers, len(data), _generator)).encode("latin-1") + data
+
+		key = (host, port, secure)
+		connections = self.idle.setdefault(key, [])
+		reused = bool(connections)
+		reader, writer = connections.pop() if reused else await asyncio.wait_for(
+			asyncio.open_connection(host, port, ssl = secure or None), self.timeout)
+
+		try:
+			writer.write(request)
+			await writer.drain()
+			status, content, keep_alive = await asyncio.wait_for(self._response(reader), self.timeout)
+		except (OSError, asyncio.IncompleteReadError, ValueError):
+			writer.close()
+			if reused:
+				# The server may have closed the idle connection in the meantime, so try again with a new one.
+				return await self.request(method, url, body, content_type)
+			raise
+		except (asyncio.TimeoutError, asyncio.CancelledError):
+			writer.close()
+			raise
+
+		if keep_alive:
+			connections.append((reader, writer))
+		else:
+			writer.close()
+
+		return status, content
+
+	async def _response(self, reader):
+		status_line = await reader.readline()
+		if not status_line:
+			raise asyncio.IncompleteReadError(b"", None)
+
+		version, status = status_line.decode("latin-1").split(None, 2)[:2]
+
+		headers = {}
+		while True:
+			line = (await reader.readline()).decode("latin-1").strip()
+			if not line:
+				break
+
+			name, _, value = line.partition(":")
+			headers[name.strip().lower()] = value.strip()
+
+		if headers.get("transfer-encoding", "").lower() == "chunked":
+			chunks = []
+			while True:
+				size = int((await reader.readline()).split(b";")[0], 16)
+				chunks.append((await reader.readexactly(size + 2))[:size])
+				if size == 0:
+					break
+			content = b"".join(chunks)
+		elif "content-length" in headers:
+			content = await reader.readexactly(int(headers["content-length"]))
+		else:
+			return int(status), await reader.read(), False
+
+		keep_alive = headers.get("connection", "").lower() != "close" and version.upper() == "HTTP/1.1"
+		return int(status), content, keep_alive
+
+	def close(self):
+		for connections in self.idle.values():
+			for reader, writer in connections:
+				writer.close()
+
+		self.idle.clear()
+
+class CloudNotifier(object):
+	""" A CloudNotifier lets subscribers know when a feed changes, using the rssCloud interface described by the Cloud
+	element of the feed (see http://cyber.law.harvard.edu/rss/soapMeetsRss.html#rsscloudInterface) and WebSub hubs (see
+	https://www.w3.org/TR/websub/.)
+	Subscribers register through the procedure described by the Cloud element, which should call register_request. The
+	callback of every subscriber is verified before it's registered, so the notifier can't be used to send requests to
+	arbitrary servers.
+	Notifications run on asyncio: connections are reused, the number of requests in flight is bounded, updates coming in
+	quick succession are coalesced into a single round of notifications, and failed notifications are retried with an
+	exponential backoff.
+	"""
+	def __init__(self, cloud = None, hubs = None, concurrency = 16, delay = 1.0, retries = 3, backoff = 0.5, timeout = 10,
+		expiration = 25 * 3600):
+		""" Keyword arguments:
+		cloud -- Optional. The Cloud object of the feed, describing how subscribers register.
+		hubs -- Optional. The URLs of the WebSub hubs to notify.
+		concurrency -- Optional. The maximum number of notifications sent at once.
+		delay -- Optional. The number of seconds to wait for more updates before sending notifications.
+		retries -- Optional. The number of times a failed notification is retried.
+		backoff -- Optional. The number of seconds to wait before the first retry. It doubles on every retry.
+		timeout -- Optional. The number of seconds to wait for each request.
+		expiration -- Optional. The number of seconds a subscription lasts unless it's renewed. rssCloud uses 25 hours.
+		"""
+		self.cloud = cloud
+		self.hubs = [] if hubs is None else hubs
+		self.concurrency = concurrency
+		self.delay = delay
+		self.retries = retries
+		self.backoff = backoff
+		self.timeout = timeout
+		self.expiration = expiration
+
+		self.subscriptions = {}
+		self._pending = {}
+		self._connections = None
+		self._semaphore = None
+
+	def register(self, url, callback, protocol = "http-post", procedure = None):
+		""" Subscribes a callback to the updates of a feed. Registering the same callback again renews the subscription.
+		Keyword arguments:
+		url -- The URL of the feed.
+		callback -- The URL to notify.
+		protocol -- Optional. Either http-post (default) or xml-rpc.
+		procedure -- Optional. The name of the procedure to call when the protocol is xml-rpc.
+		"""
+		if protocol not in ("http-post", "xml-rpc"):
+			raise ValueError("Unsupported protocol: " + str(protocol))
+
+		self.subscriptions.setdefault(url, {})[callback] = (protocol, procedure, time.time() + self.expiration)
+
+	async def register_request(self, parameters, address):
+		""" Handles a request to the registration procedure of the cloud, verifying the callback first as rssCloud
+		describes: when a domain is specified (and the protocol is http-post), the callback is sent a GET request with a
+		challenge it has to echo back; otherwise it's sent a test notification that has to succeed. Returns the list of feed
+		URLs the subscriber was registered for, and raises a ValueError if the callback couldn't be verified.
+		Keyword arguments:
+		parameters -- A dictionary with the parameters of the request: notifyProcedure, port, path, protocol, url1, url2,
+		etc. and optionally domain.
+		address -- The IP address of the subscriber, used when no domain is specified.
+		"""
+		protocol = parameters.get("protocol", self.cloud.protocol if self.cloud is not None else "http-post")
+		if self.cloud is not None and protocol != self.cloud.protocol:
+			raise ValueError("The cloud only supports the %s protocol" % self.cloud.protocol)
+
+		domain = parameters.get("domain")
+		callback = self._callback(domain or address, parameters.get("port"), parameters.get("path"))
+		procedure = parameters.get("notifyProcedure")
+
+		urls = [value for name, value in sorted(parameters.items()) if name.startswith("url")]
+		if not urls:
+			raise ValueError("The request doesn't specify any feed")
+
+		self._start()
+		try:
+			if domain and protocol == "http-post":
+				challenge = os.urandom(16).hex()
+				query = urlencode([("url", urls[0]), ("challenge", challenge)])
+				status, content = await self._connections.request("GET", callback + ("&" if "?" in callback else "?") + query)
+				verified = 200 <= status < 300 and content.decode("utf-8", "replace").strip() == challenge
+			else:
+				status = await self._connections.post(callback, *self._notification(urls[0], protocol, procedure))
+				verified = 200 <= status < 300
+		except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+			verified = False
+
+		if not verified:
+			raise ValueError("The callback %s could not be verified" % callback)
+
+		for url in urls:
+			self.register(url, callback, protocol, procedure)
+
+		return urls
+
+	def _callback(self, host, port, path):
+		# Builds the callback URL of a subscriber, making sure it points to the host it claims to, so a crafted port or path
+		# (like "@127.0.0.1:8080/internal") can't turn the verification request against another server.
+		port = str(port)
+		if not port.isdigit() or not 1 <= int(port) <= 65535:
+			raise ValueError("The port of the callback should be a number between 1 and 65535")
+		if not isinstance(path, str) or not path.startswith("/") or "@" in path or re.search(r"\s", path):
+			raise ValueError("The path of the callback should start with / and can't contain @ or spaces")
+
+		callback = "http://%s:%d%s" % ("[%s]" % host if ":" in host else host, int(port), path)
+		try:
+			parts = urlsplit(callback)
+			valid = parts.hostname == host.strip("[]").lower() and parts.port == int(port)
+		except ValueError:
+			valid = False
+
+		if not valid:
+			raise ValueError("The callback %s doesn't point to %s" % (callback, host))
+
+		return callback
+
+	def unregister(self, url, callback):
+		self.subscriptions.get(url, {}).pop(callback, None)
+
+	async def notify(self, url):
+		""" Notifies every subscriber (and hub) that the feed changed, after waiting for more updates during the configured
+		delay. However many times this is called during that time, notifications are sent once. Returns the same results
+		as ping.
+		"""
+		future = self._pending.get(url)
+		if future is None:
+			future = self._pending[url] = asyncio.ensure_future(self._notify_later(url))
+
+		return await asyncio.shield(future)
+
+	async def _notify_later(self, url):
+		try:
+			await asyncio.sleep(self.delay)
+		finally:
+			self._pending.pop(url, None)
+
+		return await self.ping(url)
+
+	async def ping(self, url):
+		""" Notifies every subscriber (and hub) right away that the feed changed. Returns a dictionary mapping each
+		notified URL to whether it was notified successfully. Subscriptions that expired are dropped.
+		"""
+		self._start()
+
+		now = time.time()
+		subscriptions = self.subscriptions.get(url, {})
+		for callback, (_, _, expires) in list(subscriptions.items()):
+			if expires <= now:
+				del subscriptions[callback]
+
+		requests = [(callback,) + self._notification(url, protocol, procedure)
+			for callback, (protocol, procedure, _) in subscriptions.items()]
+
+		for hub in self.hubs:
+			requests.append((hub, urlencode([("hub.mode", "publish"), ("hub.url", url)]), "application/x-www-form-urlencoded"))
+
+		results = await asyncio.gather(*[self._send(*request) for request in requests])
+		return dict(zip([request[0] for request in requests], results))
+
+	def _start(self):
+		if self._connections is None:
+			self._connections = _HTTPConnections(self.timeout)
+			self._semaphore = asyncio.Semaphore(self.concurrency)
+
+	def _notification(self, url, protocol, procedure):
+		# Returns the body and content type of the notification sent to a subscriber.
+		if protocol == "xml-rpc":
+			return ("<?xml version=\"1.0\"?><methodCall><methodName>%s</methodName><params><param><value><string>%s"
+				"</string></value></param></params></methodCall>" % (saxutils.escape(procedure or ""), saxutils.escape(url)), "text/xml")
+
+		return urlencode({"url": url}), "application/x-www-form-urlencoded"
+
+	async def _send(self, target, body, content_type):
+		for attempt in range(self.retries + 1):
+			if attempt:
+				await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+
+			try:
+				async with self._semaphore:
+					status = await self._connections.post(target, body, content_type)
+			except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+				continue
+
+			if 200 <= status < 300:
+				return True
+			if status < 500:
+				return False
+
+		return False
+
+	async def close(self):
+		""" Closes the connections kept open for later notifications. The notifier can still be used afterwards (even from
+		another event loop.)
+		"""
+		if self._connections is not None:
+			self._connections.close()
+
+		self._connections = None
+		self._semaphore = None
+
+class FeedTemplate(object):
+	""" A FeedTemplate renders a feed once, with named slots in place of some of its values, so it can be rendered again
+	with different values for those slots by just joining the pieces of the feed that were already rendered:
+
+		feed = Feed(title = FeedTemplate.slot("title"), link = "http://www.example.com/?ref=" + FeedTemplate.slot("ref"), ...)
+		template = FeedTemplate(feed)
+		template.render(title = "Example", ref = "tenant")
+
+	Slots can be used (even as part of a longer string) in any text value or attribute of the feed and its items, but not
+	in values that are not strings, like dates. Values of slots inside CDATA sections are written as they are instead of
+	being escaped, so they can hold markup (but not "]]>".)
+	"""
+	_slot_begin = u"\ue000"
+	_slot_end = u"\ue001"
+	_slot = re.compile(u"\ue000([^\ue000\ue001]*)\ue001")
+	_escapes = {ord("&"): u"&amp;", ord("<"): u"&lt;", ord(">"): u"&gt;", ord('"'): u"&quot;", ord("'"): u"&apos;",
+		ord("\n"): u"&#10;", ord("\r"): u"&#13;", ord("\t"): u"&#9;"}
+
+	def __init__(self, feed):
+		""" Keyword arguments:
+		feed -- The feed to render, using slot() for the values that change.
+		"""
+		pieces = self._slot.split(feed.rss())
+
+		# Segments and slot names alternate: segment, slot, segment, ..., segment.
+		self.segments = [segment.encode("utf-8") for segment in pieces[0::2]]
+		self.names = pieces[1::2]
+		self.slots = frozenset(self.names)
+
+		# Whether each slot is inside a CDATA section. Text outside of them is escaped, so the markers of a section are
+		# only found in the rendered feed when they actually begin or end one.
+		self.cdata = []
+		inside = False
+		for segment in pieces[0:-1:2]:
+			begin = segment.rfind(_cdata_begin)
+			end = segment.rfind(_cdata_end)
+			if begin != end:
+				inside = begin > end
+
+			self.cdata.append(inside)
+
+	@classmethod
+	def slot(cls, name):
+		""" Returns the placeholder to use in the feed for the slot with the specified name.
+		"""
+		return cls._slot_begin + name + cls._slot_end
+
+	def render(self, **values):
+		""" Returns the feed (encoded as UTF-8) with the specified values in its slots. Values are escaped, and they can't
+		contain markup, except in slots inside CDATA sections, where they are written as they are.
+		"""
+		missing = self.slots.difference(values)
+		if missing:
+			raise KeyError("Missing values for slots: " + ", ".join(sorted(missing)))
+
+		encoded = {}
+		for name, cdata in zip(self.names, self.cdata):
+			if (name, cdata) not in encoded:
+				text = self._text(values[name])
+				if not cdata:
+					text = text.translate(self._escapes)
+				elif _cdata_end in text:
+					raise ValueError("The value of the %s slot is inside a CDATA section and can't contain %s" % (name, _cdata_end))
+
+				encoded[name, cdata] = text.encode("utf-8")
+
+		pieces = [None] * (2 * len(self.segments) - 1)
+		pieces[0::2] = self.segments
+		pieces[1::2] = [encoded[key] for key in zip(self.names, self.cdata)]
+		return b"".join(pieces)
+
+	def _text(self, value):
+		return value if isinstance(value, str) else str(value)
+
+class FeedCache(object):
+	""" An in-process cache of rendered feeds, bounded both by number of feeds and by their total size. Rendered feeds
+	expire at the time returned by Feed.expires, so they honor the ttl, skipHours and skipDays elements of each feed.
+	Every method can be called from several threads at once, including get_or_render for feeds that share items (the
+	built-in classes can be rendered by several threads at once; extensions should follow Serializable.publish.)
+	"""
+	def __init__(self, max_entries = 1024, max_size = 64 * 1024 * 1024, ttl = 60):
+		""" Keyword arguments:
+		max_entries -- Optional. The maximum number of feeds to keep. The least recently used feeds are removed first.
+		max_size -- Optional. The maximum total size in bytes (once encoded as UTF-8) of the feeds to keep.
+		ttl -- Optional. The number of minutes feeds are kept when they don't specify a ttl element.
+		"""
+		self.max_entries = max_entries
+		self.max_size = max_size
+		self.ttl = ttl
+		self.size = 0
+
+		self._entries = OrderedDict()
+		self._flights = {}
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key):
+		""" Returns the rendered feed stored under the specified key, or None if there's no such feed or it has expired.
+		"""
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is None:
+				return None
+
+			if entry[2] <= time.time():
+				self.size -= entry[1]
+				return None
+
+			self._entries[key] = entry
+			return entry[0]
+
+	def put(self, key, feed, rss = None):
+		""" Stores a rendered feed under the specified key. If rss is not provided, the feed is rendered first.
+		"""
+		if rss is None:
+			rss = feed.rss()
+
+		entry = (rss, len(rss.encode("utf-8")), feed.expires(ttl = self.ttl))
+
+		with self._lock:
+			previous = self._entries.pop(key, None)
+			if previous is not None:
+				self.size -= previous[1]
+
+			self._entries[key] = entry
+			self.size += entry[1]
+
+			while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_size):
+				_, evicted = self._entries.popitem(last = False)
+				self.size -= evicted[1]
+
+	def get_or_render(self, key, factory):
+		""" Returns the rendered feed stored under the specified key. If it's missing or expired, the feed returned by the
+		factory is rendered and stored. However many threads ask for the same key at once, the factory runs only once and
+		every thread gets the same result.
+		Keyword arguments:
+		key -- The key identifying the feed, for example its URL.
+		factory -- A function taking no arguments that returns the Feed object to render.
+		"""
+		rss = self.get(key)
+		if rss is not None:
+			return rss
+
+		with self._lock:
+			flight = self._flights.setdefault(key, threading.Lock())
+
+		try:
+			with flight:
+				rss = self.get(key)
+				if rss is None:
+					feed = factory()
+					rss = feed.rss()
+					self.put(key, feed, rss)
+		finally:
+			with self._lock:
+				if self._flights.get(key) is flight:
+					del self._flights[key]
+
+		return rss
+
+	def invalidate(self, key):
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None:
+				self.size -= entry[1]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.size = 0
+
+class SharedFeedCache(object):
+	""" A cache of rendered feeds that can be shared by every process running on the same machine (for example, the
+	workers of a prefork server.) Each feed is stored in its own file under the specified directory, and served through
+	a memory map, so every process reads the same pages instead of keeping its own copy. Point it to a memory-backed
+	file system like /dev/shm to keep everything in memory.
+	Feeds are stored under keys chosen by the caller (like FeedCache) and expire at the time returned by Feed.expires.
+	"""
+	_magic = b"RFC1"
+	_header = struct.Struct("<4sd")
+
+	def __init__(self, directory, max_entries = 1024, ttl = 60):
+		""" Keyword arguments:
+		directory -- The directory where rendered feeds are stored.
+		max_entries -- Optional. The maximum number of feeds to keep. The least recently used feeds are removed first.
+		ttl -- Optional. The number of minutes feeds are kept when they don't specify a ttl element.
+		"""
+		self.directory = directory
+		self.max_entries = max_entries
+		self.ttl = ttl
+
+		try:
+			os.makedirs(directory)
+		except OSError as e:
+			if e.errno != errno.EEXIST:
+				raise
+
+	def get(self, key):
+		""" Returns the rendered feed stored under the specified key as a read-only memoryview over the shared memory map,
+		or None if there's no such feed or it has already expired.
+		"""
+		path = self._path(key)
+
+		try:
+			with open(path, "rb") as file:
+				mapping = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+		except (OSError, ValueError):
+			return None
+
+		magic, expires = self._header.unpack_from(mapping)
+		if magic != self._magic or expires <= time.time():
+			mapping.close()
+			return None
+
+		try:
+			os.utime(path, None)
+		except OSError:
+			pass
+
+		return memoryview(mapping)[self._header.size:]
+
+	def put(self, key, feed, data = None):
+		""" Stores a rendered feed under the specified key. If data is not provided, the feed is rendered and encoded as
+		UTF-8.
+		"""
+		if data is None:
+			data = feed.rss().encode("utf-8")
+
+		expires = feed.expires(ttl = self.ttl)
+
+		descriptor, temporary = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+		try:
+			with os.fdopen(descriptor, "wb") as file:
+				file.write(self._header.pack(self._magic, expires))
+				file.write(data)
+
+			os.replace(temporary, self._path(key))
+		except:
+			os.remove(temporary)
+			raise
+
+		self._evict()
+
+	def get_or_render(self, key, factory):
+		""" Returns the rendered feed stored under the specified key. If it's missing or expired, the feed returned by the
+		factory is rendered and stored. When several processes ask for the same missing feed at the same time, only one of
+		them renders it while the rest wait for the result.
+		Keyword arguments:
+		key -- The key identifying the feed, for example its URL.
+		factory -- A function taking no arguments that returns the Feed object to render.
+		"""
+		data = self.get(key)
+		if data is not None:
+			return data
+
+		lock = self._lock(key)
+		try:
+			data = self.get(key)
+			if data is None:
+				feed = factory()
+				rendered = feed.rss().encode("utf-8")
+				self.put(key, feed, rendered)
+
+				# Feeds that expire right away (a ttl of 0, for example) are not returned by get.
+				data = self.get(key)
+				if data is None:
+					data = memoryview(rendered)
+		finally:
+			self._unlock(lock)
+
+		return data
+
+	def clear(self):
+		for name in os.listdir(self.directory):
+			self._remove(os.path.join(self.directory, name))
+
+	def _path(self, key, suffix = ".rss"):
+		# Keys can be any string (like a URL), so files are named after their hash.
+		hash = _new_hash()
+		hash.update(key.encode("utf-8"))
+		return os.path.join(self.directory, hash.hexdigest() + suffix)
+
+	def _lock(self, key):
+		if fcntl is None:
+			return None
+
+		path = self._path(key, ".lock")
+		file = open(path, "a")
+		fcntl.flock(file, fcntl.LOCK_EX)
+		return path, file
+
+	def _unlock(self, lock):
+		# The lock file is removed while it's still locked. Processes already waiting for it find the feed in the cache
+		# once they get the lock, and later ones create a new file, so lock files don't pile up.
+		if lock is not None:
+			path, file = lock
+			self._remove(path)
+			fcntl.flock(file, fcntl.LOCK_UN)
+			file.close()
+
+	def _evict(self):
+		# Only the directory is listed (with the modification times, which record the last use of each feed), so storing
+		# a feed doesn't need to open every other one. Expired feeds are not returned by get, and go away with the least
+		# recently used ones.
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".rss"):
+				try:
+					entries.append((entry.stat().st_mtime, entry.path))
+				except OSError:
+					pass
+
+		if len(entries) > self.max_entries:
+			entries.sort()
+			for modified, path in entries[:len(entries) - self.max_entries]:
+				self._remove(path)
+
+	def _remove(self, path):
+		try:
+			os.remove(path)
+		except OSError:
+			pass
 
 class ElementRequiredError(Exception):
 	def __init__(self, element1, element2 = None):
@@ -773,3 +4007,247 @@ class ElementRequiredError(Exception):
 			return 'Either "' + self.element1 + '" or "' + self.element2 + '" must be defined'
 
 		return '"' + self.element1 + '" must be defined'
+
+class ElementValueError(Exception):
+	def __init__(self, element, value, expected):
+		self.element = element
+		self.value = value
+		self.expected = expected
+
+	def __str__(self):
+		return '"' + self.element + '" should be ' + self.expected + ', not ' + repr(self.value)
+
+def _parse_date(value):
+	""" Parses an ISO 8601 date (as found in JSON or CSV input) into a datetime in GMT.
+	"""
+	if not isinstance(value, str):
+		return value
+
+	value = value.strip()
+	if hasattr(datetime.datetime, "fromisoformat"):
+		date = datetime.datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+		if date.tzinfo is not None:
+			date = (date - date.utcoffset()).replace(tzinfo = None)
+
+		return date
+
+	for format in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+		try:
+			return datetime.datetime.strptime(value, format)
+		except ValueError:
+			pass
+
+	raise ValueError("Invalid date: " + value)
+
+def _record_object(cls, value):
+	if value is None or value == "" or isinstance(value, Serializable):
+		return value
+	if isinstance(value, dict):
+		return cls(**value)
+
+	return cls(value)
+
+def _record_list(cls, value):
+	if value is None or value == "":
+		return None
+	if isinstance(value, str):
+		value = [element.strip() for element in value.split(",")]
+
+	return [_record_object(cls, element) if isinstance(element, dict) else element for element in value]
+
+def _item_from_record(record):
+	""" Creates an Item from a JSON object or a CSV row. Nested values can be given as objects with the arguments of their
+	constructors (for example, "enclosure": {"url": ..., "length": ..., "type": ...}), or as plain strings for guid,
+	categories (comma-separated in CSV files) and pubDate (ISO 8601).
+	"""
+	record = dict((key, value) for key, value in record.items() if value is not None and value != "")
+
+	if "pubDate" in record:
+		record["pubDate"] = _parse_date(record["pubDate"])
+	if "guid" in record:
+		record["guid"] = _record_object(Guid, record["guid"])
+	if "enclosure" in record:
+		record["enclosure"] = _record_object(Enclosure, record["enclosure"])
+	if "source" in record:
+		record["source"] = _record_object(Source, record["source"])
+	if "categories" in record:
+		record["categories"] = _record_list(Category, record["categories"])
+
+	return Item(**record)
+
+def _feed_from_record(record, items):
+	""" Creates a Feed from a JSON object with the channel elements, using the given items.
+	"""
+	record = dict(record)
+
+	for field in ("pubDate", "lastBuildDate"):
+		if field in record:
+			record[field] = _parse_date(record[field])
+	for field, cls in (("image", Image), ("cloud", Cloud), ("textInput", TextInput)):
+		if field in record:
+			record[field] = _record_object(cls, record[field])
+	if "skipHours" in record:
+		record["skipHours"] = SkipHours(record["skipHours"])
+	if "skipDays" in record:
+		record["skipDays"] = SkipDays(record["skipDays"])
+	if "categories" in record:
+		record["categories"] = _record_list(Category, record["categories"])
+
+	record["items"] = items
+	return Feed(**record)
+
+class _Counter(object):
+	""" Wraps an iterator of items, counting them as they are rendered.
+	"""
+	def __init__(self, items):
+		self.items = items
+		self.count = 0
+
+	def __iter__(self):
+		for item in self.items:
+			self.count += 1
+			yield item
+
+def _read_channel(input, format, channel):
+	""" Returns the channel elements of a feed: the ones given, updated with the first line of JSON Lines input (which is
+	consumed, so the stream is left at the first item.)
+	"""
+	if format == "csv":
+		return channel
+
+	for line in input:
+		if line.strip():
+			return dict(channel, **json.loads(line))
+
+	raise ValueError("The input should start with a JSON object with the channel elements")
+
+def _missing_channel_elements(channel):
+	return [name for name in ("title", "link", "description") if channel.get(name) is None]
+
+def _render_stream(input, output, format, channel):
+	""" Reads the items of a feed from a JSON Lines or CSV text stream (past the channel elements, see _read_channel) and
+	renders the feed into a binary stream, one item at a time. Returns the number of items rendered.
+	"""
+	if format == "csv":
+		items = _Counter(_item_from_record(row) for row in csv.DictReader(input))
+	else:
+		items = _Counter(_item_from_record(json.loads(line)) for line in input if line.strip())
+
+	_feed_from_record(channel, items).write(output)
+	return items.count
+
+def _render_file(task):
+	input_path, output_path, format, channel = task
+
+	with io.open(input_path, "r", encoding = "utf-8", newline = "") as input:
+		channel = _read_channel(input, format, channel)
+		with open(output_path, "wb") as output:
+			return _render_stream(input, output, format, channel)
+
+def main(argv = None):
+	""" Renders feeds from JSON Lines or CSV files. This is the entry point of the rfeed command (and python -m rfeed.)
+	Run it with --help for the list of options.
+	"""
+	parser = argparse.ArgumentParser(prog = "rfeed", description = "Renders RSS 2.0 feeds from JSON Lines or CSV input. "
+		"In JSON Lines input, the first line holds the channel elements and every other line is an item. In CSV input, "
+		"every row is an item and the channel elements come from the command line.")
+	parser.add_argument("inputs", nargs = "*", help = "Input files. Standard input is used when there are none (or for -).")
+	parser.add_argument("-f", "--format", choices = ["jsonl", "csv"], help = "The input format. By default it depends on the file extension.")
+	parser.add_argument("-o", "--output", help = "The output file, when rendering a single feed. Defaults to standard output.")
+	parser.add_argument("-d", "--output-dir", help = "The directory where feeds are written when rendering several files.")
+	parser.add_argument("-j", "--jobs", type = int, default = 1, help = "The number of processes used to render several files.")
+	parser.add_argument("--title", help = "The title of the channel.")
+	parser.add_argument("--link", help = "The link of the channel.")
+	parser.add_argument("--description", help = "The description of the channel.")
+	parser.add_argument("-q", "--quiet", action = "store_true", help = "Don't report throughput on standard error.")
+	options = parser.parse_args(argv)
+
+	channel = dict((name, getattr(options, name)) for name in ("title", "link", "description") if getattr(options, name) is not None)
+	inputs = options.inputs or ["-"]
+
+	def format_of(path):
+		return options.format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+
+	def check_channel(path, channel):
+		# Feeds can't be rendered without these elements, so they are reported before anything is written.
+		missing = _missing_channel_elements(channel)
+		if missing:
+			parser.error("%s has no channel %s (give %s in the first line of JSON Lines input, or with %s)" % (path,
+				", ".join(missing), "it" if len(missing) == 1 else "them", ", ".join("--" + name for name in missing)))
+
+	started = time.time()
+
+	if len(inputs) == 1 and options.output_dir is None:
+		path = inputs[0]
+		if path == "-":
+			input = io.TextIOWrapper(sys.stdin.buffer, encoding = "utf-8", newline = "")
+		else:
+			input = io.open(path, "r", encoding = "utf-8", newline = "")
+
+		try:
+			channel = _read_channel(input, format_of(path), channel)
+			check_channel("standard input" if path == "-" else path, channel)
+
+			output = open(options.output, "wb") if options.output else sys.stdout.buffer
+			try:
+				counts = [_render_stream(input, output, format_of(path), channel)]
+			finally:
+				if output is sys.stdout.buffer:
+					output.flush()
+				else:
+					output.close()
+		finally:
+			# The wrapper around standard input is detached instead of closed, so it doesn't close sys.stdin.buffer.
+			if path == "-":
+				input.detach()
+			else:
+				input.close()
+	else:
+		if options.output_dir is None:
+			parser.error("--output-dir is required when rendering several files")
+		if "-" in inputs:
+			parser.error("standard input can only be used when rendering a single feed")
+
+		tasks = [(path, os.path.join(options.output_dir, os.path.splitext(os.path.basename(path))[0] + ".xml"), format_of(path), channel)
+			for path in inputs]
+
+		# Inputs with the same name (in different directories, or with different extensions) would overwrite each other.
+		outputs = {}
+		for path, output_path, _, _ in tasks:
+			key = os.path.normcase(output_path)
+			if key in outputs:
+				parser.error("%s and %s would both be rendered to %s" % (outputs[key], path, output_path))
+
+			outputs[key] = path
+
+		for path, _, format, _ in tasks:
+			with io.open(path, "r", encoding = "utf-8", newline = "") as input:
+				check_channel(path, _read_channel(input, format, channel))
+
+		os.makedirs(options.output_dir, exist_ok = True)
+
+		if options.jobs > 1:
+			import multiprocessing
+
+			# When running as python -m rfeed, this module is __main__, so the worker function is taken from the importable
+			# rfeed module instead, or the worker processes wouldn't be able to find it.
+			worker = importlib.import_module(__name__)._render_file
+
+			pool = multiprocessing.Pool(options.jobs)
+			try:
+				counts = pool.map(worker, tasks)
+			finally:
+				pool.close()
+				pool.join()
+		else:
+			counts = [_render_file(task) for task in tasks]
+
+	elapsed = max(time.time() - started, 1e-9)
+	if not options.quiet:
+		sys.stderr.write("Rendered %d feeds with %d items in %.3f seconds (%.1f feeds/s, %.1f items/s)\n" %
+			(len(counts), sum(counts), elapsed, len(counts) / elapsed, sum(counts) / elapsed))
+
+	return 0
+
+if getattr(sys.modules.get("__main__"), "__dict__", None) is globals():
+	sys.exit(main())
@@ -1,10 +1,12 @@
 from setuptools import setup
 
 setup(name = "rfeed",
-      version = "1.0.0",
+      version = "2.0.0",
       description = "Python RSS 2.0 Generator",
       author = "Santiago L. Valdarrama",
       author_email = "svpino@gmail.com",
       url = "https://github.com/svpino/rfeed/blob/master/README.md",
       license = "MIT",
-      py_modules = ["rfeed"])
+      py_modules = ["rfeed"],
+      python_requires = ">=3.6",
+      entry_points = {"console_scripts": ["rfeed = rfeed:main"]})
@@ -1,9 +1,32 @@
 import unittest
+import contextlib
+import copy
 import locale
 import datetime
+import io
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+import asyncio
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from xml.sax import saxutils
 from time import gmtime, strftime
+import rfeed
 from rfeed import *
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
 class BaseTestCase(unittest.TestCase):
 
 	def _element(self, element, value, attributes = {}):
@@ -321,6 +344,1529 @@ class ItemTestCase(BaseTestCase):
 		guid = Guid(guid = '123', isPermaLink = None)
 		self.assertTrue(guid.isPermaLink)
 
+class ValidationTestCase(BaseTestCase):
+
+	def test_values_are_normalized_when_assigned(self):
+		item = Item(title = 'abc')
+		item.categories = 'python'
+		self.assertTrue(isinstance(item.categories[0], Category))
+		itunes = iTunes(explicit = 'YES')
+		self.assertTrue(itunes.explicit is True)
+		enclosure = Enclosure('1', 2, '3')
+		enclosure.length = 500
+		self.assertTrue('length="500"' in Feed('', '', '', items = [Item(title = '', enclosure = enclosure)]).rss())
+
+	def test_validate_normalizes_lists_changed_in_place(self):
+		feed = Feed('', '', '', categories = ['a'])
+		feed.categories.append('b')
+		feed.validate()
+		self.assertTrue(all(isinstance(category, Category) for category in feed.categories))
+
+	def test_categories_added_in_place_are_rendered(self):
+		item = Item(title = 'abc')
+		item.categories.append('python')
+		itunes = iTunes()
+		itunes.categories.append('Technology')
+		itunes.categories += ['Arts']
+		feed = Feed('', '', '', items = [item], extensions = [itunes])
+		feed.categories.append('a')
+		feed.categories.insert(0, 'b')
+		feed.categories[1:] = ['c']
+
+		rss = feed.rss()
+		self.assertTrue(self._element('category', 'b') + self._element('category', 'c') in rss)
+		self.assertTrue(self._element('category', 'python') in rss)
+		self.assertTrue('<itunes:category text="Technology"></itunes:category><itunes:category text="Arts"></itunes:category>' in rss)
+
+	def test_validate_returns_the_object(self):
+		feed = Feed('', '', '', ttl = 60, skipHours = SkipHours([0, 23]), skipDays = SkipDays(['Sunday']),
+			items = [Item(title = '', enclosure = Enclosure('1', '200', '3'))])
+		self.assertTrue(feed.validate() is feed)
+
+	def test_validate_skiphours(self):
+		for hours in ([24], [-1], ['a'], [1, 1], list(range(24)) * 2):
+			with self.assertRaises(ElementValueError):
+				SkipHours(hours).validate()
+
+	def test_validate_skipdays(self):
+		for days in (['monday'], ['Funday'], ['Monday', 'Monday']):
+			with self.assertRaises(ElementValueError):
+				SkipDays(days).validate()
+
+	def test_validate_ttl(self):
+		with self.assertRaises(ElementValueError) as cm:
+			Feed('', '', '', ttl = 'soon').validate()
+		self.assertTrue('ttl' in str(cm.exception))
+
+	def test_validate_enclosure_length(self):
+		with self.assertRaises(ElementValueError):
+			Feed('', '', '', items = [Item(title = '', enclosure = Enclosure('1', '12kb', '3'))]).validate()
+
+	def test_validate_cloud_port(self):
+		with self.assertRaises(ElementValueError):
+			Cloud('1', 70000, '3', '4', '5').validate()
+
+class InternPoolTestCase(BaseTestCase):
+
+	def test_strings_and_objects_are_shared(self):
+		pool = InternPool()
+		item1 = pool.item(title = 'a', author = ''.join(['sv', 'pino']), categories = ['python', Category('rss', 'tags')], source = Source('s', 'u'))
+		item2 = pool.item(title = 'b', author = ''.join(['svp', 'ino']), categories = ['python', Category('rss', 'tags')], source = Source('s', 'u'))
+		self.assertTrue(item1.author is item2.author)
+		self.assertTrue(item1.categories[0] is item2.categories[0])
+		self.assertTrue(item1.categories[1] is item2.categories[1])
+		self.assertTrue(item1.source is item2.source)
+
+	def test_intern(self):
+		pool = InternPool()
+		self.assertTrue(pool.intern(iTunesCategory('Technology')) is pool.itunes_category('Technology'))
+		self.assertEqual(5, pool.intern(5))
+
+	def test_shared_objects_render_the_same(self):
+		pool = InternPool()
+		items = [pool.item(title = str(i), categories = Category('a & b', 'd'), source = Source('s', 'u')) for i in range(3)]
+		unpooled = [Item(title = str(i), categories = Category('a & b', 'd'), source = Source('s', 'u')) for i in range(3)]
+		self.assertEqual(Feed('', '', '', items = unpooled).rss(), Feed('', '', '', items = items).rss())
+
+	def test_cached_markup_follows_changes(self):
+		category = InternPool().category('a')
+		feed = Feed('', '', '', categories = [category])
+		self.assertTrue(self._element('category', 'a') in feed.rss())
+		category.category = 'b'
+		self.assertTrue(self._element('category', 'b') in feed.rss())
+
+	def test_only_interned_objects_cache_markup(self):
+		pool = InternPool()
+		category = Category('a')
+		Feed('', '', '', categories = [category, pool.category('b')]).rss()
+		self.assertFalse('_markup' in vars(category))
+		self.assertTrue('_markup' in vars(pool.category('b')))
+
+	def test_least_recently_used_values_are_evicted(self):
+		pool = InternPool(max_entries = 2)
+		first = pool.category('a')
+		pool.category('b')
+		self.assertTrue(pool.category('a') is first)
+		pool.category('c')
+		self.assertTrue(pool.category('a') is first)
+		self.assertEqual(2, len(pool.objects))
+		self.assertEqual(['c', 'a'], [key[1] for key in pool.objects])
+
+		for i in range(5):
+			pool.string('value %d' % i)
+		self.assertEqual(2, len(pool.strings))
+
+	def test_writer_internals(self):
+		# _Writer.raw relies on these private attributes of XMLGenerator, so this fails if they ever change.
+		output = io.StringIO()
+		generator = saxutils.XMLGenerator(output, 'UTF-8', short_empty_elements = True)
+		for name in rfeed._Writer._internals:
+			self.assertTrue(hasattr(generator, name), name)
+
+		generator.startElement('a', {})
+		self.assertTrue(generator._pending_start_element)
+
+		output = io.StringIO()
+		handler = rfeed._Writer(output)
+		handler.startElement('b', {})
+		handler.raw('<c/>')
+		handler.endElement('b')
+		self.assertTrue(output.getvalue().endswith('<b><c/></b>'))
+
+class RawItemTestCase(BaseTestCase):
+
+	def test_markup_is_written_as_it_is(self):
+		rss = Feed('', '', '', items = [RawItem('<item><title>A &amp; B</title><custom a="1"/></item>')]).rss()
+		self.assertTrue('<item><title>A &amp; B</title><custom a="1"/></item>' in rss)
+
+	def test_bytes_markup(self):
+		rss = Feed('', '', '', items = [RawItem(u'<item><title>caf\u00e9</title></item>'.encode('utf-8'))]).rss()
+		self.assertTrue(self._element('title', u'caf\u00e9') in rss)
+
+	def test_namespaces_are_declared(self):
+		rss = Feed('', '', '', items = [RawItem('<item><media:title>A</media:title></item>', {'xmlns:media': 'http://search.yahoo.com/mrss/'})]).rss()
+		self.assertTrue('xmlns:media="http://search.yahoo.com/mrss/"' in rss)
+
+	def test_extract_round_trip(self):
+		feed = Feed('Title', 'http://www.example.com', '', items = [
+			Item(title = 'A & B', description = '<![CDATA[<p>x</p>]]>', extensions = [iTunesItem(author = 'Author')]),
+			Item(title = u'caf\u00e9', categories = ['Food'])])
+		items = RawItem.extract(feed.rss().encode('utf-8'))
+
+		self.assertEqual(2, len(items))
+		self.assertEqual(feed.rss(), Feed('Title', 'http://www.example.com', '', items = items).rss())
+		self.assertEqual('http://www.itunes.com/dtds/podcast-1.0.dtd', items[0].namespaces['xmlns:itunes'])
+
+	def test_extract_keeps_markup(self):
+		source = b"<?xml version='1.0' encoding='ISO-8859-1'?>\n<rss><channel><title>x</title><item/><item>\n  <title  lang='fr'>\xe9t\xe9</title>\n</item >\n</channel></rss>"
+		items = RawItem.extract(io.BytesIO(source))
+
+		self.assertEqual(['<item/>', u"<item>\n  <title  lang='fr'>\u00e9t\u00e9</title>\n</item >"], [item.markup for item in items])
+
+		items = RawItem.extract(b'<rss><channel><item/></channel></rss>')
+		self.assertEqual(['<item/>'], [item.markup for item in items])
+		self.assertEqual(1, Feed('', '', '', items = items).rss().count('</channel>'))
+
+		items = RawItem.extract(b'<rss><channel><item a="x>y" /><item b="/>"></item ></channel></rss>')
+		self.assertEqual(['<item a="x>y" />', '<item b="/>"></item >'], [item.markup for item in items])
+
+class ItemColumnsTestCase(BaseTestCase):
+
+	def _items(self, pubDates):
+		return [Item(title = 'Item %d' % i, link = 'http://example.com/%d' % i, guid = Guid('guid-%d' % i, isPermaLink = False),
+			pubDate = pubDate) for i, pubDate in enumerate(pubDates)]
+
+	def test_columns_render_like_items(self):
+		dates = [datetime.datetime(2014, 11, 13, 8, 0, 0), datetime.datetime(2015, 2, 28, 23, 59, 59)]
+		feed = Feed.from_columns({'title': 'Title', 'link': '', 'description': ''}, title = ['Item 0', 'Item 1'],
+			link = ['http://example.com/0', 'http://example.com/1'], guid = ['guid-0', 'guid-1'], isPermaLink = False, pubDate = dates)
+		self.assertEqual(Feed('Title', '', '', items = self._items(dates)).rss(), feed.rss())
+
+	def test_missing_values_are_skipped(self):
+		rss = Feed('', '', '', items = ItemColumns(title = ['a', None], description = [None, 'b'])).rss()
+		self.assertTrue(self._element('title', 'a') in rss)
+		self.assertTrue(self._element('description', 'b') in rss)
+		self.assertEqual(1, rss.count('<title>a</title>'))
+		self.assertFalse('<description>' in rss.split('<item>')[1])
+
+	def test_columns_should_have_the_same_length(self):
+		with self.assertRaises(ValueError):
+			ItemColumns(title = ['a', 'b'], link = ['c'])
+
+	def test_required_columns(self):
+		with self.assertRaises(ElementRequiredError):
+			ItemColumns(link = ['a'])
+
+	def test_columns_can_be_materialized(self):
+		columns = ItemColumns(title = ['a', 'b'], guid = ['1', '2'])
+		self.assertEqual(2, len(columns))
+		self.assertEqual('b', columns[1].title)
+		self.assertEqual('2', columns[1].guid.guid)
+
+	@unittest.skipIf(numpy is None, 'NumPy is not installed')
+	def test_numpy_columns(self):
+		dates = [datetime.datetime(2014, 11, 13, 8, 0, 0), datetime.datetime(1969, 12, 31, 23, 59, 59), datetime.datetime(2000, 2, 29, 12, 30, 5)]
+		feed = Feed.from_columns({'title': 'Title', 'link': '', 'description': ''}, title = numpy.array(['Item 0', 'Item 1', 'Item 2']),
+			link = numpy.array(['http://example.com/%d' % i for i in range(3)]), guid = numpy.array(['guid-0', 'guid-1', 'guid-2']),
+			isPermaLink = False, pubDate = numpy.array(dates, dtype = 'datetime64[ns]'))
+		self.assertEqual(Feed('Title', '', '', items = self._items(dates)).rss(), feed.rss())
+
+	@unittest.skipIf(numpy is None, 'NumPy is not installed')
+	def test_numpy_missing_dates(self):
+		rss = Feed('', '', '', items = ItemColumns(title = ['a', 'b'], pubDate = numpy.array(['2014-11-13T08:00', 'NaT'], dtype = 'datetime64[s]'))).rss()
+		self.assertTrue(self._element('pubDate', 'Thu, 13 Nov 2014 08:00:00 GMT') in rss)
+		self.assertEqual(1, rss.count('<pubDate>'))
+
+	def test_numpy_is_imported_lazily(self):
+		code = 'import sys, rfeed; rfeed.Feed("", "", "", items = rfeed.ItemColumns(title = ["a"])).rss(); print("numpy" in sys.modules)'
+		output = subprocess.check_output([sys.executable, '-c', code], cwd = os.path.dirname(os.path.abspath(__file__)))
+		self.assertEqual(b'False', output.strip())
+
+class BoundedItemsTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.now = datetime.datetime(2014, 12, 31, 12, 0)
+
+	def _item(self, title, hours_ago):
+		return Item(title = title, pubDate = self.now - datetime.timedelta(hours = hours_ago))
+
+	def test_max_items(self):
+		evicted = []
+		items = BoundedItems(max_items = 3, on_evict = evicted.append)
+		for i in range(5):
+			items.add(self._item('Item %d' % i, 10 - i), now = self.now)
+
+		self.assertEqual(['Item 4', 'Item 3', 'Item 2'], [item.title for item in items])
+		self.assertEqual(['Item 0', 'Item 1'], [item.title for item in evicted])
+
+	def test_items_are_sorted_by_date(self):
+		items = BoundedItems([self._item('b', 2), self._item('d', 0), self._item('a', 3), self._item('c', 1)])
+		self.assertEqual(['d', 'c', 'b', 'a'], [item.title for item in items])
+		self.assertEqual('c', items[1].title)
+		self.assertEqual(['d', 'c'], [item.title for item in items[:2]])
+
+	def test_out_of_order_item_is_evicted_when_too_old(self):
+		items = BoundedItems(max_items = 2)
+		items.extend([self._item('new', 0), self._item('newer', -1)], now = self.now)
+		self.assertEqual(['old'], [item.title for item in items.add(self._item('old', 5), now = self.now)])
+
+	def test_max_age(self):
+		evicted = []
+		items = BoundedItems(max_age = datetime.timedelta(hours = 24), on_evict = [evicted.append])
+		items.extend([self._item('recent', 1), self._item('old', 30)], now = self.now)
+
+		self.assertEqual(['recent'], [item.title for item in items])
+		self.assertEqual(['old'], [item.title for item in evicted])
+
+		self.assertEqual(['recent'], [item.title for item in items.evict(now = self.now + datetime.timedelta(hours = 24))])
+		self.assertEqual(0, len(items))
+
+	def test_max_age_in_seconds_with_time_zones(self):
+		class Zone(datetime.tzinfo):
+			def utcoffset(self, date):
+				return datetime.timedelta(hours = 5)
+
+		items = BoundedItems(max_age = 3600)
+		items.add(Item(title = 'a', pubDate = datetime.datetime(2014, 12, 31, 16, 30, tzinfo = Zone())), now = self.now)
+		self.assertEqual(1, len(items))
+		items.add(Item(title = 'b', pubDate = datetime.datetime(2014, 12, 31, 15, 30, tzinfo = Zone())), now = self.now)
+		self.assertEqual(['a'], [item.title for item in items])
+
+	def test_feed(self):
+		items = BoundedItems(max_items = 1)
+		feed = Feed('', '', '', items = items)
+		feed.items.add(self._item('first', 1))
+		feed.items.add(self._item('second', 0))
+
+		rss = feed.rss()
+		self.assertTrue(self._element('title', 'second') in rss)
+		self.assertFalse(self._element('title', 'first') in rss)
+
+	def test_feed_declares_the_namespaces_of_its_items(self):
+		itunes = 'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"'
+		items = BoundedItems(max_items = 1)
+		feed = Feed('', '', '', items = items)
+		self.assertFalse(itunes in feed.rss())
+
+		items.add(Item(title = 'episode', pubDate = self.now, extensions = [iTunesItem(author = 'svpino')]), now = self.now)
+		self.assertTrue(itunes in feed.rss())
+
+		items.add(self._item('article', -1), now = self.now)
+		self.assertFalse(itunes in feed.rss())
+
+	def test_feed_indexes_follow_added_items(self):
+		items = BoundedItems(max_items = 2)
+		feed = Feed('', '', '', items = items)
+		items.add(Item(title = 'first', categories = ['a'], pubDate = self.now), now = self.now)
+		self.assertEqual(['first'], [item.title for item in feed.subfeed('a').items])
+		self.assertEqual(['first'], [item.title for item in feed.search_feed('first').items])
+
+		items.add(Item(title = 'second first', categories = ['a'], pubDate = self.now + datetime.timedelta(hours = 1)), now = self.now)
+		self.assertEqual(['second first', 'first'], [item.title for item in feed.subfeed('a').items])
+		self.assertEqual(['second first', 'first'], [item.title for item in feed.search_feed('first').items])
+
+		items.add(Item(title = 'third', categories = ['a'], pubDate = self.now + datetime.timedelta(hours = 2)), now = self.now)
+		self.assertEqual(['third', 'second first'], [item.title for item in feed.subfeed('a').items])
+		self.assertEqual(['second first'], [item.title for item in feed.search_feed('first').items])
+
+class SubfeedTestCase(BaseTestCase):
+
+	def _feed(self):
+		return Feed('Main', 'http://example.com/', '', items = [
+			Item(title = 'a', categories = ['python', 'rss']),
+			Item(title = 'b', categories = [Category('python', domain = 'tags')]),
+			Item(title = 'c', categories = 'go'),
+			Item(title = 'd', categories = ['rss'])])
+
+	def test_subfeed_by_single_category(self):
+		feed = self._feed().subfeed('python')
+		self.assertEqual(['a', 'b'], [item.title for item in feed.items])
+
+	def test_subfeed_by_category_and_domain(self):
+		feed = self._feed()
+		self.assertEqual(['b'], [item.title for item in feed.subfeed(Category('python', domain = 'tags')).items])
+		self.assertEqual(['a'], [item.title for item in feed.subfeed(('python', None)).items])
+
+	def test_subfeed_any_and_all(self):
+		feed = self._feed()
+		self.assertEqual(['a', 'b', 'd'], [item.title for item in feed.subfeed(['python', 'rss']).items])
+		self.assertEqual(['a'], [item.title for item in feed.subfeed(['python', 'rss'], match = 'all').items])
+
+	def test_subfeed_keeps_channel_and_allows_overrides(self):
+		rss = self._feed().subfeed('go', title = 'Go').rss()
+		self.assertTrue(self._element('title', 'Go') in rss)
+		self.assertTrue(self._element('link', 'http://example.com/') in rss)
+		self.assertTrue(self._element('title', 'c') in rss)
+		self.assertFalse(self._element('title', 'a') in rss)
+
+	def test_subfeed_index_follows_item_changes(self):
+		feed = self._feed()
+		self.assertEqual(1, len(feed.subfeed('go').items))
+		feed.items.append(Item(title = 'e', categories = 'go'))
+		self.assertEqual(['c', 'e'], [item.title for item in feed.subfeed('go').items])
+		del feed.items[2]
+		self.assertEqual(['e'], [item.title for item in feed.subfeed('go').items])
+		feed.items = [Item(title = 'f', categories = 'go')]
+		self.assertEqual(['f'], [item.title for item in feed.subfeed('go').items])
+
+	def test_subfeed_invalid_match(self):
+		with self.assertRaises(ValueError):
+			self._feed().subfeed('go', match = 'some')
+
+	def test_subfeed_of_generated_items(self):
+		feed = Feed('Main', 'http://example.com/', '', items = (item for item in self._feed().items))
+		self.assertEqual(['a', 'b'], [item.title for item in feed.subfeed('python').items])
+		self.assertEqual(['c'], [item.title for item in feed.subfeed('go').items])
+		self.assertEqual(4, feed.rss().count('<item>'))
+
+	def test_subfeed_index_follows_repeated_items(self):
+		feed = self._feed()
+		self.assertEqual(['c'], [item.title for item in feed.subfeed('go').items])
+		feed.items *= 2
+		self.assertEqual(['c', 'c'], [item.title for item in feed.subfeed('go').items])
+
+	def test_feed_uses_the_list_it_is_given(self):
+		items = []
+		feed = Feed('Main', 'http://example.com/', '', items = items)
+		self.assertEqual([], feed.subfeed('go').items)
+		items.append(Item(title = 'e', categories = 'go'))
+
+		self.assertTrue(feed.items is items)
+		self.assertTrue(self._element('title', 'e') in feed.rss())
+		self.assertEqual(['e'], [item.title for item in feed.subfeed('go').items])
+
+	def test_subfeed_index_follows_replaced_items(self):
+		feed = self._feed()
+		self.assertEqual(['c'], [item.title for item in feed.subfeed('go').items])
+		feed.items.pop()
+		feed.items.append(Item(title = 'e', categories = 'go'))
+		self.assertEqual(['c', 'e'], [item.title for item in feed.subfeed('go').items])
+
+	def test_indexed_feed_can_be_pickled_and_copied(self):
+		import pickle
+		feed = self._feed()
+		feed.subfeed('go')
+		feed.search_feed('a')
+
+		for other in (pickle.loads(pickle.dumps(feed)), copy.deepcopy(feed)):
+			self.assertEqual(feed.rss(), other.rss())
+			other.items.append(Item(title = 'e', categories = 'go'))
+			self.assertEqual(['c', 'e'], [item.title for item in other.subfeed('go').items])
+			self.assertEqual(['c'], [item.title for item in feed.subfeed('go').items])
+
+class SearchFeedTestCase(BaseTestCase):
+
+	def setUp(self):
+		date = datetime.datetime(2014, 12, 1)
+		self.feed = Feed('Title', 'http://www.example.com', 'Description', items = [
+			Item(title = 'Python tips', description = '<p>Generators and <b>coroutines</b></p>', pubDate = date, categories = ['Programming']),
+			Item(title = 'Cooking pasta', description = 'Boil water', pubDate = date + datetime.timedelta(days = 2), categories = ['Food']),
+			Item(title = 'More Python', description = 'Decorators explained', pubDate = date + datetime.timedelta(days = 1), categories = ['Programming']),
+			Item(title = u'Caf\u00e9 python', pubDate = date + datetime.timedelta(days = 3))])
+
+	def _titles(self, feed):
+		return [item.title for item in feed.items]
+
+	def test_search_feed(self):
+		self.assertEqual([u'Caf\u00e9 python', 'More Python', 'Python tips'], self._titles(self.feed.search_feed('python')))
+		self.assertEqual(['Python tips'], self._titles(self.feed.search_feed('Python COROUTINES')))
+		self.assertEqual(['Cooking pasta'], self._titles(self.feed.search_feed('food')))
+		self.assertEqual([u'Caf\u00e9 python'], self._titles(self.feed.search_feed(u'caf\u00e9')))
+		self.assertEqual([], self._titles(self.feed.search_feed('python pasta')))
+		self.assertEqual([], self._titles(self.feed.search_feed('')))
+
+	def test_markup_is_not_indexed(self):
+		self.assertEqual([], self._titles(self.feed.search_feed('b')))
+
+	def test_limit_and_attributes(self):
+		results = self.feed.search_feed('python', limit = 2, title = 'Search: python')
+		self.assertEqual([u'Caf\u00e9 python', 'More Python'], self._titles(results))
+		self.assertEqual('Search: python', results.title)
+		self.assertEqual('Title', self.feed.title)
+		self.assertTrue(self._element('title', 'More Python') in results.rss())
+
+	def test_index_is_updated_as_items_are_added(self):
+		self.feed.search_feed('python')
+		index = self.feed._search_index[0]
+
+		self.feed.items.append(Item(title = 'Python packaging', pubDate = datetime.datetime(2015, 1, 1)))
+		self.assertEqual('Python packaging', self._titles(self.feed.search_feed('python'))[0])
+		self.assertTrue(self.feed._search_index[0] is index)
+
+		self.feed.items = [Item(title = 'Only python')]
+		self.assertEqual(['Only python'], self._titles(self.feed.search_feed('python')))
+
+	def test_items_without_dates_come_last(self):
+		self.feed.items.append(Item(title = 'Undated python'))
+		self.assertEqual('Undated python', self._titles(self.feed.search_feed('python'))[-1])
+
+	def test_items_from_generator(self):
+		feed = Feed('', '', '', items = (item for item in self.feed.items))
+		self.assertEqual(['Cooking pasta'], self._titles(feed.search_feed('pasta')))
+		self.assertEqual(['Python tips'], self._titles(feed.search_feed('coroutines')))
+		self.assertEqual(4, feed.rss().count('<item>'))
+
+	def test_values_given_as_functions_are_not_computed(self):
+		calls = []
+		def description():
+			calls.append(1)
+			return 'Computed python'
+
+		lazy = Lazy(description)
+		feed = Feed('', '', '', items = [Item(title = 'Lazy', description = lazy), Item(title = 'Function', description = description)])
+		self.assertEqual([], self._titles(feed.search_feed('computed')))
+		self.assertEqual([], calls)
+
+		feed.rss()
+		feed.reindex()
+		self.assertEqual(['Lazy'], self._titles(feed.search_feed('computed')))
+
+class LazyTestCase(BaseTestCase):
+
+	def test_callable_values_are_rendered(self):
+		rss = Feed('', '', '', items = [Item(title = lambda: 'My title', enclosure = Enclosure(url = '1', length = lambda: 42, type = '3'))]).rss()
+		self.assertTrue(self._element('title', 'My title') in rss)
+		self.assertTrue('length="42"' in rss)
+
+	def test_callable_returning_none_is_skipped(self):
+		rss = Feed('', '', '', items = [Item(title = 'abc', description = lambda: None)]).rss()
+		self.assertFalse('<description>' in rss.split('<item>')[1])
+
+	def test_callable_pubdate(self):
+		rss = Feed('', '', '', items = [Item(title = '', pubDate = lambda: datetime.datetime(2014, 11, 13, 8, 0, 0))]).rss()
+		self.assertTrue(self._element('pubDate', 'Thu, 13 Nov 2014 08:00:00 GMT') in rss)
+
+	def test_callable_flags_are_rendered(self):
+		feed = Feed('', '', '', extensions = [iTunes(block = lambda: False, explicit = lambda: 'yes', complete = lambda: None)],
+			items = [Item(title = '', guid = Guid('a', isPermaLink = lambda: False),
+				extensions = [iTunesItem(block = lambda: True, explicit = lambda: False, is_closed_captioned = lambda: 'no')])])
+		channel, item = feed.rss().split('<item>')
+
+		self.assertTrue(self._element('itunes:block', 'no') in channel)
+		self.assertTrue(self._element('itunes:explicit', 'yes') in channel)
+		self.assertFalse('itunes:complete' in channel)
+		self.assertTrue('<guid isPermaLink="false">a</guid>' in item)
+		self.assertTrue(self._element('itunes:block', 'yes') in item)
+		self.assertTrue(self._element('itunes:explicit', 'clean') in item)
+		self.assertTrue(self._element('itunes:is_closed_captioned', 'no') in item)
+
+	def test_callables_are_not_called_unless_rendered(self):
+		calls = []
+		Item(title = '', description = lambda: calls.append(1))
+		self.assertEqual([], calls)
+
+	def test_lazy_computes_value_once(self):
+		calls = []
+		def description():
+			calls.append(1)
+			return 'Expensive'
+
+		feed = Feed('', '', '', items = [Item(title = '', description = Lazy(description))])
+		self.assertTrue(self._element('description', 'Expensive') in feed.rss())
+		self.assertTrue(self._element('description', 'Expensive') in feed.rss())
+		self.assertEqual([1], calls)
+
+	def test_lazy_reset(self):
+		calls = []
+		lazy = Lazy(lambda: calls.append(1))
+		lazy()
+		lazy.reset()
+		lazy()
+		self.assertEqual([1, 1], calls)
+
+class StreamingTestCase(BaseTestCase):
+
+	def test_file_object_value(self):
+		rss = Feed('', '', '', items = [Item(title = '', description = io.StringIO('Fish & Chips'))]).rss()
+		self.assertTrue(self._element('description', 'Fish &amp; Chips') in rss)
+
+	def test_binary_file_object_value(self):
+		rss = Feed('', '', '', items = [Item(title = '', description = io.BytesIO(u'caf\u00e9'.encode('utf-8')))]).rss()
+		self.assertTrue(self._element('description', u'caf\u00e9') in rss)
+
+	def test_iterator_value_with_cdata_across_chunks(self):
+		chunks = iter(['a < b <![CD', 'ATA[<p>x', '</p>]', ']> & c'])
+		rss = Feed('', '', '', items = [Item(title = '', description = chunks)]).rss()
+		self.assertTrue(self._element('description', 'a &lt; b <![CDATA[<p>x</p>]]> &amp; c') in rss)
+
+	def test_chunks_match_string_output(self):
+		text = 'x' * 10 + '<![CDATA[<b>bold</b>]]>' + '&' * 5 + '<![CDATA[<i>' * 2 + ']]>tail'
+		expected = Feed('', '', '', items = [Item(title = '', description = text)]).rss()
+		for size in (1, 2, 3, 7, 100):
+			chunks = iter([text[i:i + size] for i in range(0, len(text), size)])
+			self.assertEqual(expected, Feed('', '', '', items = [Item(title = '', description = chunks)]).rss())
+
+	def test_unterminated_cdata_matches_string_output(self):
+		for text in ('a <![CDATA[b', 'x <![CDATA[a]]> & <![CDATA[b & c', '<![CDATA[a]]'):
+			expected = Feed('', '', '', items = [Item(title = '', description = text)]).rss()
+			for size in (1, 2, 5, 100):
+				chunks = iter([text[i:i + size] for i in range(0, len(text), size)])
+				self.assertEqual(expected, Feed('', '', '', items = [Item(title = '', description = chunks)]).rss())
+
+		rss = Feed('', '', '', items = [Item(title = '', description = iter(['a <![CDATA[b']))]).rss()
+		self.assertTrue(self._element('description', 'a &lt;![CDATA[b') in rss)
+
+	def test_stream_can_only_be_rendered_once(self):
+		feed = Feed('', '', '', items = [Item(title = '', description = io.StringIO('Fish & Chips'))])
+		feed.rss()
+		self.assertRaises(ValueError, feed.rss)
+
+	def test_function_opening_streams_can_be_rendered_again(self):
+		feed = Feed('', '', '', items = [Item(title = '', description = lambda: io.StringIO('Fish & Chips'))])
+		self.assertEqual(feed.rss(), feed.rss())
+		self.assertTrue(self._element('description', 'Fish &amp; Chips') in feed.rss())
+
+	def test_truncated_utf8_is_reported(self):
+		feed = Feed('', '', '', items = [Item(title = '', description = iter([b'caf\xc3']))])
+		self.assertRaises(UnicodeDecodeError, feed.rss)
+
+class PublishFileTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_write_file(self):
+		path = os.path.join(self.directory, 'feeds', 'rss.xml')
+		feed = Feed('Title', 'http://www.example.com', '', items = [Item(title = 'First')])
+
+		self.assertTrue(feed.write_file(path))
+		with open(path, encoding = 'utf-8') as file:
+			self.assertEqual(feed.rss(), file.read())
+
+	def test_unchanged_feed_is_not_written(self):
+		path = os.path.join(self.directory, 'rss.xml')
+		feed = Feed('Title', 'http://www.example.com', '')
+
+		self.assertTrue(feed.write_file(path))
+		mtime = os.stat(path).st_mtime_ns
+		self.assertFalse(feed.write_file(path))
+		self.assertEqual(mtime, os.stat(path).st_mtime_ns)
+		self.assertEqual(['rss.xml', 'rss.xml.hash'], sorted(os.listdir(self.directory)))
+
+		feed.title = 'Changed'
+		self.assertTrue(feed.write_file(path))
+
+	def test_existing_file_is_compared_without_sidecar(self):
+		path = os.path.join(self.directory, 'rss.xml')
+		feed = Feed('Title', 'http://www.example.com', '')
+		feed.write_file(path, fsync = False)
+		os.remove(path + '.hash')
+
+		self.assertFalse(feed.write_file(path, fsync = False))
+
+	def test_deleted_file_is_written_again(self):
+		path = os.path.join(self.directory, 'rss.xml')
+		feed = Feed('Title', 'http://www.example.com', '')
+		feed.write_file(path, fsync = False)
+		os.remove(path)
+
+		self.assertTrue(feed.write_file(path, fsync = False))
+		with open(path, encoding = 'utf-8') as file:
+			self.assertEqual(feed.rss(), file.read())
+		self.assertEqual(['rss.xml', 'rss.xml.hash'], sorted(os.listdir(self.directory)))
+
+	def test_publish_many(self):
+		feeds = [(Feed('Feed %d' % i, 'http://www.example.com', ''), os.path.join(self.directory, '%d.xml' % i)) for i in range(10)]
+		self.assertEqual([path for _, path in feeds], publish_many(feeds, threads = 4))
+
+		feeds[3][0].title = 'Changed'
+		self.assertEqual([feeds[3][1]], publish_many(feeds, threads = 4))
+		with open(feeds[3][1], encoding = 'utf-8') as file:
+			self.assertTrue(self._element('title', 'Changed') in file.read())
+
+	def test_feeds_sharing_items_are_rendered_concurrently(self):
+		items = [Item(title = 'Item %d' % i, description = 'Description %d' % i, categories = ['Category %d' % (i % 3)],
+			guid = Guid('http://www.example.com/%d' % i), pubDate = datetime.datetime(2014, 12, 1, i % 24),
+			extensions = [iTunesItem(author = 'Author', duration = '01:00')]) for i in range(200)]
+		archive = Feed('Archive', 'http://www.example.com', '', items = items)
+		feeds = [archive] + [archive.subfeed('Category %d' % i) for i in range(3)]
+		expected = [feed.rss() for feed in feeds]
+
+		errors = []
+		def render(feed, rss):
+			try:
+				for _ in range(20):
+					if feed.rss() != rss:
+						errors.append(feed.title)
+			except Exception as e:
+				errors.append(e)
+
+		threads = [threading.Thread(target = render, args = (feed, rss)) for feed, rss in zip(feeds, expected) for _ in range(2)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual([], errors)
+
+class RenderManyTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.items = [Item(title = 'Item %d' % i, link = 'http://www.example.com/%d' % i, categories = ['Tag %d' % (i % 3)]) for i in range(6)]
+		self.feeds = [
+			Feed('Everything', 'http://www.example.com', '', items = self.items),
+			Feed('Tag 0', 'http://www.example.com/0', '', items = [item for item in self.items if item.categories[0].category == 'Tag 0']),
+			Feed('Empty', 'http://www.example.com/empty', '')]
+
+	def test_render_many_matches_rss(self):
+		self.assertEqual([feed.rss().encode('utf-8') for feed in self.feeds], render_many(self.feeds))
+
+	def test_render_many_to_outputs(self):
+		outputs = [io.StringIO() for feed in self.feeds]
+		self.assertEqual(None, render_many(self.feeds, outputs))
+		self.assertEqual([feed.rss() for feed in self.feeds], [output.getvalue() for output in outputs])
+
+	def test_shared_items_are_rendered_once(self):
+		published = []
+
+		class CountingItem(Item):
+			def publish(self, handler):
+				published.append(self)
+				Item.publish(self, handler)
+
+		item = CountingItem(title = 'Shared')
+		render_many([Feed(str(i), '', '', items = [item]) for i in range(5)])
+		self.assertEqual(1, len(published))
+
+	def test_generated_items_are_not_consumed_while_counting(self):
+		items = [Item(title = 'Item %d' % i) for i in range(3)]
+		expected = Feed('Generated', '', '', items = items).rss().encode('utf-8')
+
+		feed = Feed('Generated', '', '', items = (item for item in items))
+		self.assertEqual([expected, expected], render_many([feed, Feed('Generated', '', '', items = items)]))
+
+class SanitizeTestCase(BaseTestCase):
+
+	def test_illegal_characters_are_written_by_default(self):
+		self.assertTrue(self._element('title', 'a\x01b') in Feed('', '', '', items = [Item(title = 'a\x01b')]).rss())
+
+	def test_strip(self):
+		rss = Feed('', '', '', items = [Item(title = 'a\x00b\x1f & <c>\ud800', guid = Guid('id\x0b'))]).rss(sanitize = 'strip')
+		self.assertTrue(self._element('title', 'ab &amp; &lt;c&gt;') in rss)
+		self.assertTrue('<guid isPermaLink="true">id</guid>' in rss)
+
+	def test_replace(self):
+		rss = Feed('', '', '', items = [Item(title = 'a\x08b\ufffe', description = '<![CDATA[x\x02]]>')]).rss(sanitize = 'replace')
+		self.assertTrue(self._element('title', 'a\ufffdb\ufffd') in rss)
+		self.assertTrue(self._element('description', '<![CDATA[x\ufffd]]>') in rss)
+
+	def test_attributes(self):
+		rss = Feed('', '', '', items = [Item(title = '', enclosure = Enclosure('http://www.example.com/\x0c"a".mp3', 0, 'audio/mpeg'))]).rss(sanitize = 'strip')
+		self.assertTrue('url=\'http://www.example.com/"a".mp3\'' in rss)
+
+	def test_allowed_characters_are_kept(self):
+		text = 'tab\tline\nreturn\r caf\u00e9 \U0001f600'
+		rss = Feed('', '', '', items = [Item(title = text)])
+		self.assertEqual(rss.rss(), rss.rss(sanitize = 'strip'))
+
+	def test_sanitized_output_is_well_formed(self):
+		from xml.dom import minidom
+		rss = Feed('\x00', '', '', items = [Item(title = ''.join(chr(i) for i in range(64)), categories = ['\x1b[0m'])]).rss(sanitize = 'replace')
+		minidom.parseString(rss.encode('utf-8'))
+
+	def test_unsupported_mode(self):
+		self.assertRaises(ValueError, Feed('', '', '').rss, sanitize = 'drop')
+
+class CanonicalTestCase(BaseTestCase):
+
+	class Zone(datetime.tzinfo):
+		def utcoffset(self, date):
+			return datetime.timedelta(hours = -3)
+
+	def _feed(self, extensions, pubDate):
+		return Feed('Title', 'http://www.example.com', '', pubDate = pubDate, extensions = extensions,
+			items = [Item(title = 'Item', enclosure = Enclosure('http://www.example.com/1.mp3', 0, 'audio/mpeg'))])
+
+	def test_attributes_are_sorted(self):
+		rss = self._feed([MockExtension1(), iTunes()], None).rss(canonical = True)
+		self.assertTrue('<rss name="value" version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:itunes=' in rss)
+		self.assertTrue('<enclosure length="0" type="audio/mpeg" url="http://www.example.com/1.mp3">' in rss)
+
+	def test_dates_are_converted_to_gmt(self):
+		rss = self._feed([], datetime.datetime(2014, 12, 1, 22, 0, tzinfo = self.Zone())).rss(canonical = True)
+		self.assertTrue(self._element('pubDate', 'Tue, 02 Dec 2014 01:00:00 GMT') in rss)
+
+		rss = self._feed([], datetime.date(2014, 12, 1)).rss(canonical = True)
+		self.assertTrue(self._element('pubDate', 'Mon, 01 Dec 2014 00:00:00 GMT') in rss)
+
+	def test_same_content_has_same_output_and_digest(self):
+		first = self._feed([iTunes(), MockExtension1()], datetime.datetime(2014, 12, 2, 1, 0)).canonical_rss()
+		second = self._feed([MockExtension1(), iTunes()], datetime.datetime(2014, 12, 1, 22, 0, tzinfo = self.Zone())).canonical_rss()
+		self.assertEqual(first, second)
+
+	def test_digest_matches_output(self):
+		feed = Feed('Title', 'http://www.example.com', u'caf\u00e9 ' * 10000)
+		rss, digest = feed.canonical_rss()
+
+		hash = rfeed._new_hash()
+		hash.update(rss.encode('utf-8'))
+		self.assertEqual(hash.hexdigest(), digest)
+
+		output = io.BytesIO()
+		self.assertEqual(digest, feed.write(output, canonical = True))
+		self.assertEqual(rss.encode('utf-8'), output.getvalue())
+		self.assertEqual(None, feed.write(io.BytesIO()))
+
+class CommandLineTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _file(self, name, content):
+		path = self.directory + '/' + name
+		with io.open(path, 'w', encoding = 'utf-8') as file:
+			file.write(content)
+		return path
+
+	def test_jsonl_input(self):
+		path = self._file('feed.jsonl', u'{"title": "T", "link": "L", "description": "D", "ttl": 5}\n'
+			u'{"title": "A & B", "pubDate": "2014-11-13T08:00:00Z", "guid": "g", "enclosure": {"url": "u", "length": 5, "type": "audio/mpeg"}}\n')
+		output = self.directory + '/feed.xml'
+		self.assertEqual(0, main([path, '-o', output, '-q']))
+
+		with io.open(output, encoding = 'utf-8') as file:
+			rss = file.read()
+
+		self.assertTrue(self._element('ttl', '5') in rss)
+		self.assertTrue(self._element('title', 'A &amp; B') in rss)
+		self.assertTrue(self._element('pubDate', 'Thu, 13 Nov 2014 08:00:00 GMT') in rss)
+		self.assertTrue('length="5"' in rss)
+
+	def test_csv_input_to_output_directory(self):
+		path = self._file('feed.csv', u'title,link,categories\nOne,http://1,"a,b"\nTwo,http://2,\n')
+		self.assertEqual(0, main([path, '--title', 'T', '--link', 'L', '--description', 'D', '-d', self.directory + '/out', '-q']))
+
+		with io.open(self.directory + '/out/feed.xml', encoding = 'utf-8') as file:
+			rss = file.read()
+
+		self.assertTrue(self._element('title', 'T') in rss)
+		self.assertTrue(self._element('title', 'Two') in rss)
+		self.assertTrue(self._element('category', 'b') in rss)
+
+	def test_inputs_with_the_same_name_are_rejected(self):
+		os.mkdir(self.directory + '/a')
+		paths = [self._file('feed.jsonl', u'{"title": "T", "link": "L", "description": "D"}\n'),
+			self._file('a/feed.jsonl', u'{"title": "T", "link": "L", "description": "D"}\n')]
+
+		errors = io.StringIO()
+		with contextlib.redirect_stderr(errors):
+			self.assertRaises(SystemExit, main, paths + ['-d', self.directory + '/out', '-q'])
+
+		self.assertTrue('would both be rendered to' in errors.getvalue())
+		self.assertFalse(os.path.exists(self.directory + '/out'))
+
+	def test_missing_channel_elements_are_reported(self):
+		jsonl = self._file('feed.jsonl', u'{"title": "T"}\n{"title": "Item"}\n')
+		csv = self._file('items.csv', u'title\nOne\n')
+		output = self.directory + '/feed.xml'
+
+		errors = io.StringIO()
+		with contextlib.redirect_stderr(errors):
+			self.assertRaises(SystemExit, main, [jsonl, '-o', output, '-q'])
+			self.assertRaises(SystemExit, main, [csv, '--title', 'T', '-d', self.directory + '/out', '-q'])
+
+		self.assertTrue('feed.jsonl has no channel link, description' in errors.getvalue())
+		self.assertTrue('items.csv has no channel link, description' in errors.getvalue())
+		self.assertFalse(os.path.exists(output))
+		self.assertFalse(os.path.exists(self.directory + '/out'))
+
+	def test_parse_date_with_offset(self):
+		self.assertEqual(datetime.datetime(2014, 11, 13, 6, 0, 0), rfeed._parse_date('2014-11-13T08:00:00+02:00'))
+
+class MediaResolverTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _file(self, name, data):
+		path = self.directory + '/' + name
+		with open(path, 'wb') as file:
+			file.write(data)
+		return path
+
+	def _wav(self, name, seconds):
+		path = self.directory + '/' + name
+		writer = wave.open(path, 'wb')
+		writer.setnchannels(1)
+		writer.setsampwidth(1)
+		writer.setframerate(8000)
+		writer.writeframes(b'\x80' * 8000 * seconds)
+		writer.close()
+		return path
+
+	def test_wav(self):
+		info = MediaResolver().resolve(self._wav('episode.wav', 2))
+		self.assertEqual('audio/wav', info['type'])
+		self.assertEqual(2.0, info['duration'])
+		self.assertEqual(os.path.getsize(self.directory + '/episode.wav'), info['length'])
+
+	def test_mp3_with_xing_header(self):
+		frame = b'\xff\xfb\x90\x00' + b'\x00' * 32 + b'Xing' + struct.pack('>II', 1, 100)
+		info = MediaResolver().resolve(self._file('episode.mp3', frame + b'\x00' * 1000))
+		self.assertEqual('audio/mpeg', info['type'])
+		self.assertAlmostEqual(100 * 1152 / 44100.0, info['duration'])
+
+	def test_mp3_constant_bitrate(self):
+		info = MediaResolver().resolve(self._file('episode.mp3', b'\xff\xfb\x90\x00' + b'\x00' * 15996))
+		self.assertAlmostEqual(1.0, info['duration'])
+
+	def test_mp4(self):
+		mvhd = struct.pack('>I4sB3xIIII', 28, b'mvhd', 0, 0, 0, 1000, 65000)
+		data = struct.pack('>I4s4sI', 16, b'ftyp', b'M4A ', 0) + struct.pack('>I4s', 8 + len(mvhd), b'moov') + mvhd
+		info = MediaResolver().resolve(self._file('episode.m4a', data))
+		self.assertEqual('audio/mp4', info['type'])
+		self.assertEqual(65.0, info['duration'])
+
+	def test_update_items(self):
+		paths = [self._wav('episode%d.wav' % i, i + 1) for i in range(3)]
+		items = [Item(title = str(i), extensions = [iTunesItem()]) for i in range(3)]
+		MediaResolver().update(zip(items, paths), url = lambda path: 'http://example.com/' + os.path.basename(path))
+		self.assertEqual('http://example.com/episode2.wav', items[2].enclosure.url)
+		self.assertEqual('audio/wav', items[2].enclosure.type)
+		self.assertEqual('00:00:03', items[2].extensions[0].duration)
+
+	def test_missing_files_are_skipped_and_reported(self):
+		cache = self.directory + '/media.json'
+		paths = [self._wav('episode.wav', 1), self.directory + '/missing.wav']
+		items = [Item(title = str(i), enclosure = Enclosure('u', 0, 't')) for i in range(2)]
+		errors = MediaResolver(cache).update(zip(items, paths))
+
+		self.assertEqual([paths[1]], list(errors))
+		self.assertTrue(isinstance(errors[paths[1]], FileNotFoundError))
+		self.assertEqual('audio/wav', items[0].enclosure.type)
+		self.assertEqual('t', items[1].enclosure.type)
+		self.assertTrue(os.path.abspath(paths[0]) in MediaResolver(cache).entries)
+
+	def test_cache_is_persisted_and_invalidated(self):
+		cache = self.directory + '/media.json'
+		path = self._wav('episode.wav', 1)
+		MediaResolver(cache).update([(Item(title = '', enclosure = Enclosure('u', 0, 't')), path)])
+
+		resolver = MediaResolver(cache)
+		entry = resolver.entries[os.path.abspath(path)]
+		self.assertTrue(resolver.resolve(path) is entry)
+
+		self._wav('episode.wav', 2)
+		os.utime(path, (0, 12345))
+		self.assertEqual(2.0, resolver.resolve(path)['duration'])
+
+class FingerprintTestCase(BaseTestCase):
+
+	def test_same_content_same_fingerprint(self):
+		feed1 = Feed('a', 'b', 'c', items = [Item(title = '1', guid = Guid('x'), pubDate = datetime.datetime(2014, 1, 1))])
+		feed2 = Feed('a', 'b', 'c', items = [Item(title = '1', guid = Guid('x'), pubDate = datetime.datetime(2014, 1, 1))])
+		self.assertEqual(feed1.fingerprint(), feed2.fingerprint())
+
+	def test_different_content_different_fingerprint(self):
+		feed = Feed('a', 'b', 'c', items = [Item(title = '1')])
+		fingerprint = feed.fingerprint()
+		feed.items[0].title = '2'
+		self.assertNotEqual(fingerprint, feed.fingerprint())
+
+class DiffTestCase(BaseTestCase):
+
+	def _feed(self, items, title = 'Title'):
+		return Feed(title, '', '', items = items)
+
+	def test_no_changes(self):
+		result = diff(self._feed([Item(title = 'a', guid = Guid('1'))]), self._feed([Item(title = 'a', guid = Guid('1'))]))
+		self.assertFalse(result)
+		self.assertEqual(([], [], [], False), (result.added, result.removed, result.changed, result.channel_changed))
+
+	def test_added_removed_and_changed(self):
+		old = self._feed([Item(title = 'a', guid = Guid('1')), Item(title = 'b', link = 'http://b'), Item(title = 'c', guid = Guid('3'))])
+		new = self._feed([Item(title = 'a2', guid = Guid('1')), Item(title = 'b', link = 'http://b'), Item(title = 'd', guid = Guid('4'))])
+		result = diff(old, new)
+		self.assertTrue(result)
+		self.assertEqual(['d'], [item.title for item in result.added])
+		self.assertEqual(['c'], [item.title for item in result.removed])
+		self.assertEqual([('a', 'a2')], [(o.title, n.title) for o, n in result.changed])
+		self.assertFalse(result.channel_changed)
+
+	def test_channel_changed(self):
+		self.assertTrue(diff(self._feed([]), self._feed([], title = 'Other')).channel_changed)
+
+class FeedHistoryTestCase(BaseTestCase):
+
+	def _feed(self, count):
+		return Feed('Title', '', '', items = [Item(title = 'Item %d' % i, guid = Guid(str(i))) for i in range(count)])
+
+	def test_full_feed_without_etag(self):
+		status, headers, body = FeedHistory().respond(self._feed(2))
+		self.assertEqual(200, status)
+		self.assertTrue(('ETag', '"' + self._feed(2).fingerprint() + '"') in headers)
+		self.assertEqual(self._feed(2).rss(), body)
+
+	def test_not_modified(self):
+		history = FeedHistory()
+		etag = history.record(self._feed(2))
+		status, headers, body = history.respond(self._feed(2), if_none_match = etag, a_im = 'feed')
+		self.assertEqual((304, ''), (status, body))
+
+	def test_only_new_and_changed_items_are_sent(self):
+		history = FeedHistory()
+		etag = history.record(self._feed(2))
+		feed = self._feed(4)
+		feed.items[0].title = 'Changed'
+
+		status, headers, body = history.respond(feed, if_none_match = 'W/' + etag, a_im = 'feed, gzip')
+		self.assertEqual(226, status)
+		self.assertTrue(('IM', 'feed') in headers)
+		self.assertTrue(self._element('title', 'Changed') in body)
+		self.assertFalse(self._element('title', 'Item 1') in body)
+		self.assertTrue(self._element('title', 'Item 2') in body)
+		self.assertTrue(self._element('title', 'Item 3') in body)
+
+	def test_unknown_etag_gets_full_feed(self):
+		history = FeedHistory(max_versions = 1)
+		etag = history.record(self._feed(1))
+		history.record(self._feed(2))
+		status, headers, body = history.respond(self._feed(3), if_none_match = etag, a_im = 'feed')
+		self.assertEqual(200, status)
+		self.assertTrue(self._element('title', 'Item 0') in body)
+
+	def test_full_feed_without_a_im(self):
+		history = FeedHistory()
+		etag = history.record(self._feed(1))
+		self.assertEqual(200, history.respond(self._feed(2), if_none_match = etag)[0])
+
+class SnapshotTestCase(BaseTestCase):
+
+	def _feed(self):
+		itunes_item = iTunesItem(author = 'svpino', duration = '01:00', explicit = 'yes', order = 3)
+		return Feed('Title', 'http://example.com/', u'Caf\u00e9', ttl = 30, pubDate = datetime.datetime(2014, 12, 1, 10, 22, 15),
+			categories = ['a', Category('b', domain = 'c')], cloud = Cloud('1', 2, '3', '4', '5'),
+			skipHours = SkipHours([1, 2]), extensions = [iTunes(author = 'svpino', categories = iTunesCategory('Technology', 'Podcasting'))],
+			items = [Item(title = 'Item %d' % i, guid = Guid('guid-%d' % i, isPermaLink = False), pubDate = datetime.datetime(2015, 1, i + 1),
+				enclosure = Enclosure('http://example.com/%d.mp3' % i, 1000 + i, 'audio/mpeg'), extensions = [itunes_item])
+				for i in range(5)])
+
+	def _dump(self, feed):
+		output = io.BytesIO()
+		feed.dump(output)
+		return output.getvalue()
+
+	def test_dump_and_load(self):
+		feed = self._feed()
+		loaded = Feed.load(io.BytesIO(self._dump(feed)))
+		self.assertEqual(feed.rss(), loaded.rss())
+		self.assertEqual(feed.fingerprint(), loaded.fingerprint())
+
+	def test_shared_objects_are_stored_once(self):
+		loaded = Feed.load(io.BytesIO(self._dump(self._feed())))
+		self.assertTrue(loaded.items[0].extensions[0] is loaded.items[1].extensions[0])
+
+	def test_lazy_load_from_file(self):
+		feed = self._feed()
+		directory = tempfile.mkdtemp()
+		try:
+			path = directory + '/feed.snapshot'
+			with open(path, 'wb') as fp:
+				feed.dump(fp)
+
+			with open(path, 'rb') as fp:
+				loaded = Feed.load(fp, lazy = True)
+
+			self.assertEqual(5, len(loaded.items))
+			self.assertEqual('Item 3', loaded.items[3].title)
+			self.assertEqual(['Item 3', 'Item 4'], [item.title for item in loaded.items[-2:]])
+			self.assertEqual(feed.rss(), loaded.rss())
+		finally:
+			shutil.rmtree(directory)
+
+	def test_load_rejects_other_data(self):
+		with self.assertRaises(ValueError):
+			Feed.load(io.BytesIO(b'not a snapshot at all, really not one'))
+
+	def test_load_rejects_other_versions(self):
+		data = bytearray(self._dump(self._feed()))
+		data[4] += 1
+
+		with self.assertRaises(ValueError):
+			Feed.load(io.BytesIO(bytes(data)))
+
+	def test_values_keep_their_types(self):
+		feed = Feed('Title', 'http://example.com/', '', ttl = -3, lastBuildDate = datetime.datetime(1969, 7, 20, 20, 17, 40, 5), skipDays = SkipDays([]),
+			items = [Item(title = u'\u00e9t\u00e9', guid = Guid('a', isPermaLink = False), enclosure = Enclosure('u', 2 ** 40, 't'))])
+		loaded = Feed.load(io.BytesIO(self._dump(feed)))
+
+		self.assertEqual(-3, loaded.ttl)
+		self.assertEqual(datetime.datetime(1969, 7, 20, 20, 17, 40, 5), loaded.lastBuildDate)
+		self.assertEqual(u'\u00e9t\u00e9', loaded.items[0].title)
+		self.assertTrue(loaded.items[0].guid.isPermaLink is False)
+		self.assertEqual(2 ** 40, loaded.items[0].enclosure.length)
+		self.assertEqual(None, loaded.items[0].link)
+		self.assertEqual(feed.rss(), loaded.rss())
+
+	def test_load_only_creates_serializable_classes(self):
+		class Popen(Serializable):
+			def __init__(self, args):
+				Serializable.__init__(self)
+				self.args = args
+
+		Popen.__module__ = 'subprocess'
+		feed = Feed('Title', 'http://example.com/', '', extensions = [Popen(['true'])])
+
+		with self.assertRaises(ValueError):
+			Feed.load(io.BytesIO(self._dump(feed)))
+
+	def test_load_requires_a_feed(self):
+		output = io.BytesIO()
+		rfeed._SnapshotWriter().write(Item(title = 'Title'), output)
+
+		with self.assertRaises(ValueError):
+			Feed.load(io.BytesIO(output.getvalue()))
+
+	def test_lazy_load_declares_item_namespaces(self):
+		feed = Feed('Title', 'http://example.com/', '', items = [Item(title = 'Item', extensions = [iTunesItem(author = 'svpino')])])
+		loaded = Feed.load(io.BytesIO(self._dump(feed)), lazy = True)
+
+		self.assertTrue('xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"' in loaded.rss())
+		self.assertEqual(feed.rss(), loaded.rss())
+
+class ItemStoreTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'items.db')
+		self.date = datetime.datetime(2014, 12, 1)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def _items(self, count):
+		return [Item(title = 'Item %d' % i, guid = Guid('id-%d' % i), pubDate = self.date + datetime.timedelta(days = i)) for i in range(count)]
+
+	def test_window(self):
+		with ItemStore(self.path) as store:
+			store.extend(reversed(self._items(10)))
+
+			self.assertEqual(10, len(store))
+			self.assertEqual(['Item 9', 'Item 8', 'Item 7'], [item.title for item in store.window(0, 3)])
+			self.assertEqual(['Item 4', 'Item 3'], [item.title for item in store.window(5, 7)])
+			self.assertEqual(['Item 0', 'Item 1'], [item.title for item in store.window(0, 2, newest_first = False)])
+			self.assertEqual(0, len(store.window(20, 30)))
+
+	def test_between(self):
+		with ItemStore(self.path) as store:
+			store.extend(self._items(10))
+			titles = [item.title for item in store.between(self.date + datetime.timedelta(days = 2), self.date + datetime.timedelta(days = 5))]
+			self.assertEqual(['Item 4', 'Item 3', 'Item 2'], titles)
+
+	def test_get_and_replace(self):
+		with ItemStore(self.path) as store:
+			store.extend(self._items(3))
+			store.add(Item(title = 'Updated', guid = Guid('id-0'), pubDate = self.date + datetime.timedelta(days = 10)))
+
+			self.assertEqual(3, len(store))
+			self.assertEqual('Updated', store.get('id-0').title)
+			self.assertEqual(None, store.get('id-9'))
+			self.assertEqual(['Updated', 'Item 2', 'Item 1'], [item.title for item in store.window()])
+
+	def test_reopen(self):
+		with ItemStore(self.path) as store:
+			store.extend(self._items(5))
+			store.add(Item(title = 'Updated', guid = Guid('id-4'), pubDate = self.date))
+
+		with ItemStore(self.path) as store:
+			self.assertEqual(5, len(store))
+			self.assertEqual(['Item 3', 'Item 2', 'Item 1', 'Updated', 'Item 0'], [item.title for item in store.window()])
+
+	def test_partial_record_is_dropped(self):
+		with ItemStore(self.path) as store:
+			store.extend(self._items(2))
+
+		with open(self.path, 'ab') as file:
+			file.write(b'\x40\x00\x00')
+
+		with ItemStore(self.path) as store:
+			self.assertEqual(2, len(store))
+			store.add(Item(title = 'Item 2', guid = Guid('id-2'), pubDate = self.date + datetime.timedelta(days = 2)))
+
+		with ItemStore(self.path) as store:
+			self.assertEqual(['Item 2', 'Item 1', 'Item 0'], [item.title for item in store.window()])
+
+	def test_feed_from_window(self):
+		items = self._items(20)
+		with ItemStore(self.path) as store:
+			store.extend(items)
+			expected = Feed('Archive', 'http://www.example.com', '', items = items[-5:][::-1]).rss()
+			self.assertEqual(expected, Feed('Archive', 'http://www.example.com', '', items = store.window(0, 5)).rss())
+
+	def test_classes_are_written_once(self):
+		with ItemStore(self.path) as store:
+			store.extend(self._items(2))
+			size = os.path.getsize(self.path)
+			store.extend(self._items(102)[2:])
+			self.assertTrue((os.path.getsize(self.path) - size) / 100 < 250)
+
+		with ItemStore(self.path) as store:
+			self.assertEqual(['Item 101', 'Item 100'], [item.title for item in store.window(0, 2)])
+			self.assertEqual(2, len(store.classes))
+
+	def test_dates_are_compared_in_gmt(self):
+		with ItemStore(self.path) as store:
+			store.add(Item(title = 'Later', guid = Guid('later'), pubDate = datetime.datetime(2014, 12, 1, 10, 0, tzinfo = datetime.timezone.utc)))
+			store.add(Item(title = 'Earlier', guid = Guid('earlier'),
+				pubDate = datetime.datetime(2014, 12, 1, 12, 0, tzinfo = datetime.timezone(datetime.timedelta(hours = 5)))))
+
+			self.assertEqual(['Later', 'Earlier'], [item.title for item in store.window()])
+			self.assertEqual(['Earlier'], [item.title for item in store.between(until = datetime.datetime(2014, 12, 1, 8, 0))])
+
+	def test_window_declares_namespaces(self):
+		with ItemStore(self.path) as store:
+			store.add(Item(title = 'Episode', guid = Guid('episode'), pubDate = self.date, extensions = [iTunesItem(author = 'Host')]))
+
+		with ItemStore(self.path) as store:
+			rss = Feed('Podcast', 'http://www.example.com', '', items = store.window()).rss()
+			self.assertTrue('xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"' in rss)
+
+	def test_other_files_are_rejected(self):
+		with open(self.path, 'wb') as file:
+			file.write(b'Not a store')
+
+		self.assertRaises(ValueError, ItemStore, self.path)
+
+class FeedTemplateTestCase(BaseTestCase):
+
+	def setUp(self):
+		slot = FeedTemplate.slot
+		self.template = FeedTemplate(Feed(slot('title'), slot('link'), 'Description',
+			image = Image(slot('image'), slot('title'), slot('link')),
+			items = [Item(title = 'Article', link = 'http://www.example.com/1?ref=' + slot('ref'),
+				enclosure = Enclosure('http://www.example.com/1.mp3?ref=' + slot('ref'), 0, 'audio/mpeg'))]))
+
+	def test_render_matches_feed(self):
+		expected = Feed('Tenant', 'http://tenant.example.com', 'Description',
+			image = Image('http://tenant.example.com/logo.png', 'Tenant', 'http://tenant.example.com'),
+			items = [Item(title = 'Article', link = 'http://www.example.com/1?ref=tenant',
+				enclosure = Enclosure('http://www.example.com/1.mp3?ref=tenant', 0, 'audio/mpeg'))]).rss()
+
+		rss = self.template.render(title = 'Tenant', link = 'http://tenant.example.com', image = 'http://tenant.example.com/logo.png', ref = 'tenant')
+		self.assertEqual(expected.encode('utf-8'), rss)
+
+	def test_values_are_escaped(self):
+		rss = self.template.render(title = u'<Caf\u00e9 & "Bar">', link = '', image = '', ref = "a'b").decode('utf-8')
+		self.assertTrue(self._element('title', u'&lt;Caf\u00e9 &amp; &quot;Bar&quot;&gt;') in rss)
+		self.assertTrue('url="http://www.example.com/1.mp3?ref=a&apos;b"' in rss)
+
+		from xml.dom import minidom
+		document = minidom.parseString(self.template.render(title = '"\'<&>\n', link = '', image = '', ref = '"\'<&>\t'))
+		self.assertEqual('"\'<&>\n', document.getElementsByTagName('title')[0].firstChild.data)
+		self.assertEqual('http://www.example.com/1.mp3?ref="\'<&>\t', document.getElementsByTagName('enclosure')[0].getAttribute('url'))
+
+	def test_values_inside_cdata_are_not_escaped(self):
+		slot = FeedTemplate.slot
+		template = FeedTemplate(Feed('Title', 'http://example.com/', '<![CDATA[' + slot('d') + ']]>',
+			items = [Item(title = slot('d'), description = '<![CDATA[<p>' + slot('d') + '</p>]]>')]))
+
+		rss = template.render(d = 'a&b').decode('utf-8')
+		self.assertTrue(self._element('description', '<![CDATA[a&b]]>') in rss)
+		self.assertTrue(self._element('title', 'a&amp;b') in rss)
+		self.assertTrue(self._element('description', '<![CDATA[<p>a&b</p>]]>') in rss)
+		self.assertRaises(ValueError, template.render, d = 'a]]>b')
+
+	def test_missing_values(self):
+		self.assertEqual(frozenset(['title', 'link', 'image', 'ref']), self.template.slots)
+		self.assertRaises(KeyError, self.template.render, title = 'Tenant')
+
+class FeedCacheTestCase(BaseTestCase):
+
+	# Monday, 5 January 2015 10:00:00 GMT
+	now = 1420452000
+
+	def test_expires_uses_ttl(self):
+		self.assertEqual(self.now + 1800, Feed('', '', '', ttl = 30).expires(self.now))
+		self.assertEqual(self.now + 600, Feed('', '', '').expires(self.now, ttl = 10))
+
+	def test_expires_extends_through_skipped_hours(self):
+		feed = Feed('', '', '', ttl = 30, skipHours = SkipHours([10, 11, 12]))
+		self.assertEqual(self.now + 3 * 3600, feed.expires(self.now))
+
+	def test_expires_extends_through_skipped_days(self):
+		feed = Feed('', '', '', ttl = 30, skipDays = SkipDays(['Monday']), skipHours = SkipHours([0]))
+		self.assertEqual(self.now + 15 * 3600, feed.expires(self.now))
+
+	def test_get_and_put(self):
+		cache = FeedCache()
+		feed = Feed('Title', '', '')
+		self.assertEqual(None, cache.get('key'))
+		cache.put('key', feed)
+		self.assertEqual(feed.rss(), cache.get('key'))
+		cache.invalidate('key')
+		self.assertEqual(None, cache.get('key'))
+
+	def test_expired_feeds_are_not_returned(self):
+		cache = FeedCache()
+		cache.put('key', Feed('', '', '', ttl = 0))
+		self.assertEqual(None, cache.get('key'))
+		self.assertEqual(0, cache.size)
+
+	def test_size_bound(self):
+		cache = FeedCache(max_size = 1000)
+		cache.put('a', Feed('', '', ''), 'a' * 600)
+		cache.put('b', Feed('', '', ''), 'b' * 600)
+		self.assertEqual(None, cache.get('a'))
+		self.assertEqual('b' * 600, cache.get('b'))
+		self.assertEqual(600, cache.size)
+
+	def test_get_or_render_renders_once(self):
+		cache = FeedCache()
+		calls = []
+		def factory():
+			calls.append(1)
+			time.sleep(0.05)
+			return Feed('Title', '', '')
+
+		results = []
+		threads = [threading.Thread(target = lambda: results.append(cache.get_or_render('key', factory))) for _ in range(20)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual([1], calls)
+		self.assertEqual(20, len(results))
+		self.assertEqual(1, len(set(results)))
+
+	def test_get_or_render_feeds_sharing_items(self):
+		items = [Item(title = 'Item %d' % i, categories = ['Category %d' % (i % 4)], pubDate = datetime.datetime(2014, 12, 1))
+			for i in range(400)]
+		archive = Feed('Archive', 'http://www.example.com', '', items = items)
+		feeds = dict(('Category %d' % i, archive.subfeed('Category %d' % i)) for i in range(4))
+		expected = dict((key, feed.rss()) for key, feed in feeds.items())
+
+		cache = FeedCache()
+		results = []
+		def render(key):
+			for _ in range(10):
+				results.append((key, cache.get_or_render(key, lambda: feeds[key])))
+				cache.invalidate(key)
+
+		threads = [threading.Thread(target = render, args = (key,)) for key in feeds for _ in range(3)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(120, len(results))
+		for key, rss in results:
+			self.assertEqual(expected[key], rss)
+
+class SharedFeedCacheTestCase(BaseTestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_get_or_render(self):
+		cache = SharedFeedCache(self.directory)
+		feed = Feed('Title', '', '', ttl = 10)
+		self.assertEqual(None, cache.get('http://www.example.com/rss'))
+		data = cache.get_or_render('http://www.example.com/rss', lambda: feed)
+		self.assertEqual(feed.rss().encode('utf-8'), bytes(data))
+		self.assertEqual(bytes(data), bytes(SharedFeedCache(self.directory).get('http://www.example.com/rss')))
+		self.assertEqual(1, len(os.listdir(self.directory)))
+
+	def test_factory_is_only_called_on_a_miss(self):
+		cache = SharedFeedCache(self.directory)
+		calls = []
+		def factory():
+			calls.append(1)
+			return Feed('Title', '', '', ttl = 10)
+
+		cache.get_or_render('key', factory)
+		cache.get_or_render('key', factory)
+		self.assertEqual([1], calls)
+
+	def test_feeds_that_expire_right_away_are_returned(self):
+		cache = SharedFeedCache(self.directory)
+		feed = Feed('Title', '', '', ttl = 0, items = [Item(title = 'Streamed', description = iter(['a', 'b']))])
+		self.assertTrue(b'<description>ab</description>' in bytes(cache.get_or_render('key', lambda: feed)))
+		self.assertEqual(None, cache.get('key'))
+
+	def test_expired_feeds_are_not_returned(self):
+		cache = SharedFeedCache(self.directory)
+		cache.put('key', Feed('Title', '', '', ttl = 0))
+		self.assertEqual(None, cache.get('key'))
+
+	def test_least_recently_used_feeds_are_evicted(self):
+		cache = SharedFeedCache(self.directory, max_entries = 1)
+		cache.put('1', Feed('1', '', ''), data = b'1')
+		time.sleep(0.05)
+		cache.put('2', Feed('2', '', ''), data = b'2')
+		self.assertEqual(None, cache.get('1'))
+		self.assertEqual(b'2', bytes(cache.get('2')))
+
+		cache.clear()
+		self.assertEqual([], os.listdir(self.directory))
+
+class CloudNotifierTestCase(BaseTestCase):
+
+	def setUp(self):
+		received = self.received = []
+		failures = self.failures = {}
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def do_POST(self):
+				body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+				received.append((self.path, body, self.client_address[1]))
+
+				status = 500 if failures.get(self.path, 0) > 0 else 200
+				failures[self.path] = failures.get(self.path, 0) - 1
+				self.send_response(status)
+				self.send_header("Content-Length", "0")
+				self.end_headers()
+
+			def do_GET(self):
+				path, _, query = self.path.partition("?")
+				received.append((path, query, self.client_address[1]))
+
+				body = parse_qs(query).get("challenge", [""])[0] if path == "/challenge" else "wrong"
+				body = body.encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		class Server(ThreadingMixIn, HTTPServer):
+			daemon_threads = True
+
+		self.server = Server(("127.0.0.1", 0), Handler)
+		self.base = "http://127.0.0.1:%d" % self.server.server_address[1]
+		threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def _run(self, notifier, coroutine):
+		async def run():
+			try:
+				return await coroutine
+			finally:
+				await notifier.close()
+
+		return asyncio.run(run())
+
+	def test_ping_subscribers_and_hubs(self):
+		notifier = CloudNotifier(hubs = [self.base + "/hub"])
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+		notifier.register("http://www.example.com/rss", self.base + "/rpc", "xml-rpc", "river.feedUpdated")
+
+		results = self._run(notifier, notifier.ping("http://www.example.com/rss"))
+
+		self.assertEqual({self.base + "/post": True, self.base + "/rpc": True, self.base + "/hub": True}, results)
+		bodies = dict((path, body) for path, body, _ in self.received)
+		self.assertEqual({"url": ["http://www.example.com/rss"]}, parse_qs(bodies["/post"]))
+		self.assertTrue("<methodName>river.feedUpdated</methodName>" in bodies["/rpc"])
+		self.assertEqual({"hub.mode": ["publish"], "hub.url": ["http://www.example.com/rss"]}, parse_qs(bodies["/hub"]))
+
+	def _register_request(self, notifier, path, domain = None):
+		parameters = {"notifyProcedure": "", "port": str(self.server.server_address[1]), "path": path, "protocol": "http-post",
+			"url1": "http://www.example.com/rss", "url2": "http://www.example.com/podcast"}
+		if domain is not None:
+			parameters["domain"] = domain
+
+		return self._run(notifier, notifier.register_request(parameters, "127.0.0.1"))
+
+	def test_register_request_sends_a_test_notification(self):
+		notifier = CloudNotifier(Cloud("rpc.example.com", 80, "/RPC2", "cloud.notify", "http-post"))
+		urls = self._register_request(notifier, "/post")
+
+		self.assertEqual(["http://www.example.com/rss", "http://www.example.com/podcast"], urls)
+		self.assertTrue(self.base + "/post" in notifier.subscriptions["http://www.example.com/podcast"])
+		self.assertEqual([("/post", "url=http%3A%2F%2Fwww.example.com%2Frss")], [(path, body) for path, body, _ in self.received])
+
+		with self.assertRaises(ValueError):
+			self._run(notifier, notifier.register_request({"port": "80", "path": "/", "protocol": "xml-rpc", "url1": "x"}, "127.0.0.1"))
+
+	def test_register_request_with_domain_is_challenged(self):
+		notifier = CloudNotifier()
+		self._register_request(notifier, "/challenge", "127.0.0.1")
+
+		self.assertTrue(self.base + "/challenge" in notifier.subscriptions["http://www.example.com/rss"])
+		self.assertEqual("/challenge", self.received[0][0])
+		self.assertEqual(["http://www.example.com/rss"], parse_qs(self.received[0][1])["url"])
+
+	def test_unverified_callbacks_are_not_registered(self):
+		notifier = CloudNotifier()
+		self.failures["/post"] = 1
+
+		with self.assertRaises(ValueError):
+			self._register_request(notifier, "/post")
+		with self.assertRaises(ValueError):
+			self._register_request(notifier, "/echo", "127.0.0.1")
+
+		self.assertEqual({}, notifier.subscriptions)
+
+	def test_callbacks_pointing_elsewhere_are_rejected(self):
+		notifier = CloudNotifier()
+		port = str(self.server.server_address[1])
+		for domain, callback_port, path in ((None, "1", "@127.0.0.1:%s/post" % port), (None, port, "post"), (None, "0", "/post"),
+			(None, "70000", "/post"), (None, "80x", "/post"), ("www.example.com@127.0.0.1", port, "/challenge"), (None, port, "/a b")):
+			parameters = {"port": callback_port, "path": path, "protocol": "http-post", "url1": "http://www.example.com/rss"}
+			if domain is not None:
+				parameters["domain"] = domain
+
+			with self.assertRaises(ValueError):
+				self._run(notifier, notifier.register_request(parameters, "203.0.113.9"))
+
+		self.assertEqual([], self.received)
+		self.assertEqual({}, notifier.subscriptions)
+
+	def test_close_resets_the_connections(self):
+		notifier = CloudNotifier()
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		self.assertEqual({self.base + "/post": True}, self._run(notifier, notifier.ping("http://www.example.com/rss")))
+		self.assertEqual(None, notifier._connections)
+		self.assertEqual({self.base + "/post": True}, self._run(notifier, notifier.ping("http://www.example.com/rss")))
+
+	def test_notify_coalesces_updates(self):
+		notifier = CloudNotifier(delay = 0.05)
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		async def notify():
+			return await asyncio.gather(*[notifier.notify("http://www.example.com/rss") for i in range(5)])
+
+		results = self._run(notifier, notify())
+
+		self.assertEqual(1, len(self.received))
+		self.assertEqual([{self.base + "/post": True}] * 5, results)
+
+	def test_connections_are_reused(self):
+		notifier = CloudNotifier()
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		async def ping():
+			await notifier.ping("http://www.example.com/rss")
+			await notifier.ping("http://www.example.com/rss")
+
+		self._run(notifier, ping())
+
+		self.assertEqual(2, len(self.received))
+		self.assertEqual(self.received[0][2], self.received[1][2])
+
+	def test_failed_notifications_are_retried(self):
+		self.failures["/post"] = 2
+		notifier = CloudNotifier(backoff = 0.01)
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		self.assertEqual({self.base + "/post": True}, self._run(notifier, notifier.ping("http://www.example.com/rss")))
+		self.assertEqual(3, len(self.received))
+
+		self.failures["/post"] = 5
+		del self.received[:]
+		notifier = CloudNotifier(retries = 1, backoff = 0.01)
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		self.assertEqual({self.base + "/post": False}, self._run(notifier, notifier.ping("http://www.example.com/rss")))
+		self.assertEqual(2, len(self.received))
+
+	def test_expired_subscriptions_are_dropped(self):
+		notifier = CloudNotifier(expiration = 0)
+		notifier.register("http://www.example.com/rss", self.base + "/post")
+
+		self.assertEqual({}, self._run(notifier, notifier.ping("http://www.example.com/rss")))
+		self.assertEqual([], self.received)
+
 class iTunesTestCase(BaseTestCase):
 
 	def test_namespace_is_added_to_the_feed(self):
@@ -423,6 +1969,67 @@ class iTunesTestCase(BaseTestCase):
 		rss = Feed('', '', '', extensions = [iTunes(categories = [iTunesCategory('123', '234'), iTunesCategory('345', '456')])]).rss()
 		self.assertTrue('<itunes:category text="123"><itunes:category text="234"></itunes:category></itunes:category><itunes:category text="345"><itunes:category text="456"></itunes:category></itunes:category>' in rss)
 
+class NamespaceTestCase(BaseTestCase):
+
+	itunes = 'xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd"'
+
+	def test_item_extension_namespaces_are_declared(self):
+		self.assertTrue(self.itunes in Feed('', '', '', items = [Item(title = '', extensions = [iTunesItem(author = 'svpino')])]).rss())
+
+	def test_namespaces_follow_items_and_extensions(self):
+		feed = Feed('', '', '')
+		self.assertFalse(self.itunes in feed.rss())
+		feed.items.append(Item(title = '', extensions = [iTunesItem()]))
+		self.assertTrue(self.itunes in feed.rss())
+		del feed.items[0]
+		self.assertFalse(self.itunes in feed.rss())
+		feed.add_extension(MockExtension1())
+		self.assertTrue('name="value"' in feed.rss())
+
+	def test_add_namespace_for_streamed_items(self):
+		feed = Feed('', '', '', items = (item for item in [Item(title = '', extensions = [iTunesItem()])]))
+		feed.add_namespace({'xmlns:itunes': 'http://www.itunes.com/dtds/podcast-1.0.dtd'})
+		self.assertTrue(self.itunes in feed.rss())
+
+	def test_extensions_changed_in_place_are_declared(self):
+		feed = Feed('', '', '')
+		self.assertFalse(self.itunes in feed.rss())
+		feed.extensions.append(iTunes())
+		self.assertTrue(self.itunes in feed.rss())
+		feed.extensions = [MockExtension1()]
+		self.assertFalse(self.itunes in feed.rss())
+		self.assertTrue('name="value"' in feed.rss())
+
+	def test_extensions_added_to_items_in_the_feed_are_declared(self):
+		item = Item(title = 'x')
+		feed = Feed('', '', '', items = [item])
+		self.assertFalse(self.itunes in feed.rss())
+		item.add_extension(iTunesItem(author = 'me'))
+		self.assertTrue(self.itunes in feed.rss())
+
+		item = Item(title = 'x', pubDate = datetime.datetime(2014, 12, 1))
+		feed = Feed('', '', '', items = BoundedItems([item], max_items = 2))
+		self.assertFalse(self.itunes in feed.rss())
+		item.add_extension(iTunesItem(author = 'me'))
+		self.assertTrue(self.itunes in feed.rss())
+
+	def test_item_containers_can_report_namespaces(self):
+		class Items(object):
+			_namespaces = {}
+
+			def __iter__(self):
+				return iter([Item(title = '', extensions = [iTunesItem(author = 'svpino')])])
+
+		items = Items()
+		feed = Feed('', '', '', items = items)
+		self.assertFalse(self.itunes in feed.rss())
+		items._namespaces = {'xmlns:itunes': 'http://www.itunes.com/dtds/podcast-1.0.dtd'}
+		self.assertTrue(self.itunes in feed.rss())
+
+	def test_attributes_are_computed_once(self):
+		feed = Feed('', '', '', extensions = [iTunes()])
+		self.assertTrue(feed._get_attributes() is feed._get_attributes())
+
 class iTunesItemTestCase(BaseTestCase):
 
 	def test_optional_elements(self):